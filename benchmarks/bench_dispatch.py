@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark: listener dispatch.
+
+Measures dispatching messages to listeners registered by type/payload
+index and by matcher function, with a growing number of listeners that do
+not match.
+
+Run from the repository root: python -m benchmarks.bench_dispatch
+"""
+
+import timeit
+
+from samsung import base, listener
+
+
+class _Receiver(listener._ListenerMixin):
+    """Listener registry without a connection."""
+
+
+def run(number: int = 100000, listeners: int = 50) -> dict:
+    """
+    Measure dispatch cost per message.
+
+    :param number: number of dispatched messages per measurement
+    :param listeners: number of non-matching listeners registered
+    :return: messages per second and seconds per message for each variant
+    """
+    msg = base.Message(base.ResponseType.STATE_CHANGE.value,
+                       base.ResponsePayload.STATUS_SHOWING_TV.value,
+                       'iapp.samsung')
+    noop = lambda m: None
+
+    indexed = _Receiver()
+    matched = _Receiver()
+    for i in range(listeners):
+        indexed.add_listener(noop, type_=0x80 + i)
+        matched.add_listener(noop, lambda m, t=0x80 + i: m.type == t)
+    indexed.add_listener(noop, type_=base.ResponseType.STATE_CHANGE)
+    matched.add_listener(noop, lambda m: m.type == msg.type)
+
+    results = {}
+    for (name, receiver) in (('indexed', indexed), ('matcher', matched)):
+        seconds = min(timeit.repeat(lambda: receiver._dispatch(msg),
+                                    number=number, repeat=5)) / number
+        results[name] = {'seconds': seconds, 'messages_per_sec': 1 / seconds,
+                         'listeners': listeners + 1}
+    return results
+
+
+def main():
+    for (name, result) in run().items():
+        print('%-10s %3d listeners %8.3f us/msg %12.0f msg/s' % (
+            name, result['listeners'], result['seconds'] * 1e6,
+            result['messages_per_sec']))
+
+
+if __name__ == '__main__':
+    main()
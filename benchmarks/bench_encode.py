@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark: cost of encoding a key event message.
+
+Compares building the message from scratch for every key (as send_key did
+before) with looking it up in a samsung.base.FrameCache, and measures the
+sstv_string and sstv_base64 helpers.
+
+Run from the repository root: python -m benchmarks.bench_encode
+"""
+
+import timeit
+
+from samsung import base
+
+
+def run(number: int = 100000) -> dict:
+    """
+    Measure per-key encode cost.
+
+    :param number: number of encodes per measurement
+    :return: seconds per call for each variant
+    """
+    keys = ['KEY_VOLUP', 'KEY_MENU', 'KEY_0', 'KEY_ENTER']
+    cache = base.FrameCache('benchmark')
+
+    def build():
+        for key in keys:
+            base.build_key_message('benchmark', key)
+
+    def cached():
+        for key in keys:
+            cache[key]
+
+    count = number // len(keys)
+    return {
+        'sstv_string': min(timeit.repeat(
+            lambda: base.sstv_string('benchmark.iapp.samsung'),
+            number=number, repeat=5)) / number,
+        'sstv_base64': min(timeit.repeat(
+            lambda: base.sstv_base64('KEY_VOLUP'),
+            number=number, repeat=5)) / number,
+        'build_key_message': min(timeit.repeat(build, number=count,
+                                               repeat=5)) / number,
+        'frame_cache': min(timeit.repeat(cached, number=count,
+                                         repeat=5)) / number,
+    }
+
+
+def main():
+    results = run()
+    for (name, seconds) in results.items():
+        print('%-20s %8.3f us/call' % (name, seconds * 1e6))
+    print('speedup %.1fx' % (results['build_key_message'] /
+                             results['frame_cache']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Benchmark: import time of the command line tools.
+
+Hook scripts start a new interpreter for every invocation, so importing
+samsung.cli must stay cheap and must not change the process (logging
+configuration, MAC detection, heavy modules like asyncio). Every sample
+imports it in a fresh interpreter, the best sample is compared against
+BUDGET_SECONDS and the side effects are checked.
+
+Run from the repository root: python -m benchmarks.bench_import
+"""
+
+import json
+import subprocess
+import sys
+
+
+# measured about 0.05s, importing asyncio and detecting the MAC address
+# on import took about 0.1s
+BUDGET_SECONDS = 0.075
+
+_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import %s
+elapsed = time.perf_counter() - start
+import logging
+from samsung import base
+print(json.dumps({
+    'seconds': elapsed,
+    'logging_configured': bool(logging.getLogger().handlers),
+    'logging_enabled': base._logger is not None,
+    'mac_detected': base._local_mac is not None,
+    'modules': sorted(m for m in ('uuid', 'asyncio', 'multiprocessing')
+                      if m in sys.modules),
+}))
+'''
+
+
+def _sample(module: str) -> dict:
+    """Import module in a new interpreter and return the probe result."""
+    output = subprocess.check_output([sys.executable, '-c', _PROBE % module])
+    return json.loads(output)
+
+
+def run(samples: int = 5, module: str = 'samsung.cli') -> dict:
+    """
+    Measure the import time.
+
+    :param samples: number of interpreters to start
+    :param module: module to import
+    :return: best import time in seconds, the budget, the side effects and
+             whether the import is within budget and free of side effects
+    """
+    results = [_sample(module) for _ in range(samples)]
+    best = min(results, key=lambda r: r['seconds'])
+    clean = not (best['logging_configured'] or best['logging_enabled'] or
+                 best['mac_detected'] or best['modules'])
+    return dict(best, budget=BUDGET_SECONDS,
+                ok=clean and best['seconds'] <= BUDGET_SECONDS)
+
+
+def main():
+    result = run()
+    print('import %8.3f ms (budget %.3f ms)' % (
+        result['seconds'] * 1e3, result['budget'] * 1e3))
+    for name in ('logging_configured', 'logging_enabled', 'mac_detected'):
+        if result[name]:
+            print('side effect: %s' % name)
+    for name in result['modules']:
+        print('side effect: imported %s' % name)
+    sys.exit(0 if result['ok'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark: parsing received messages.
+
+Measures parse_sstv_string, Message.parse and FrameDecoder.feed on a
+buffer of coalesced STATE_CHANGE messages, and classifying a parsed
+message by its raw payload.
+
+Run from the repository root: python -m benchmarks.bench_parse
+"""
+
+import timeit
+
+from samsung import base, fake
+
+
+def run(number: int = 100000) -> dict:
+    """
+    Measure parser throughput.
+
+    :param number: number of messages parsed per measurement
+    :return: seconds per message and messages per second for each parser
+    """
+    message = fake.encode_response(base.ResponseType.STATE_CHANGE,
+                                   base.ResponsePayload.STATUS_SHOWING_TV)
+    string = message[1:]
+    batch = 1000
+    stream = message * batch
+    decoder = base.FrameDecoder()
+    parsed = base.Message.parse(message)
+
+    results = {}
+    for (name, func, count) in (
+            ('parse_sstv_string', lambda: base.parse_sstv_string(string), 1),
+            ('Message.parse', lambda: base.Message.parse(message), 1),
+            ('FrameDecoder.feed', lambda: decoder.feed(stream), batch),
+            ('response_payload', lambda: parsed.response_payload, 1)):
+        seconds = min(timeit.repeat(func, number=max(number // count, 1),
+                                    repeat=5)) / (number // count * count)
+        results[name] = {'seconds': seconds, 'messages_per_sec': 1 / seconds}
+    return results
+
+
+def main():
+    for (name, result) in run().items():
+        print('%-20s %8.3f us/msg %12.0f msg/s' % (
+            name, result['seconds'] * 1e6, result['messages_per_sec']))
+
+
+if __name__ == '__main__':
+    main()
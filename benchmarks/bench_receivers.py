@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Benchmark: thread-per-device ThreadReceiver vs. MultiReceiver.
+
+Connects a number of simulated devices (clients of one
+samsung.fake.FakeSmartTV), floods each with STATE_CHANGE messages and
+measures the time until all messages reached the listeners, the number of
+threads used and the time needed to shut the receivers down.
+
+Run from the repository root: python -m benchmarks.bench_receivers
+"""
+
+import threading
+import time
+
+from samsung import base, fake, listener
+
+
+def _wait(condition, timeout: float = 60.0) -> None:
+    """Poll until condition() is true."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError('benchmark condition not reached')
+        time.sleep(0.001)
+
+
+def _flood(server: fake.FakeSmartTV, received, devices: int,
+           messages: int) -> float:
+    """Flood all clients and return seconds until everything arrived."""
+    start = time.perf_counter()
+    server.flood(messages)
+    _wait(lambda: received() >= devices * messages)
+    return time.perf_counter() - start
+
+
+def run_thread(devices: int, messages: int) -> dict:
+    """
+    Measure ThreadReceiver with one thread per device.
+
+    :param devices: number of simulated devices
+    :param messages: number of messages sent to each device
+    :return: measurements
+    """
+    threads = threading.active_count()
+    with fake.FakeSmartTV() as server:
+        receivers = []
+        for i in range(devices):
+            receiver = listener.ThreadReceiver('benchmark', *server.address)
+            received = []
+            receiver.add_listener(received.append)
+            receiver.received = received
+            receiver.start()
+            receivers.append(receiver)
+        _wait(lambda: all(r._sock is not None and r._sock.gettimeout() ==
+                          r._recv_timeout for r in receivers))
+        used = threading.active_count() - threads - server.clients - 1
+        seconds = _flood(server, lambda: sum(len(r.received)
+                                             for r in receivers),
+                         devices, messages)
+        start = time.perf_counter()
+        for receiver in receivers:
+            receiver.stop()
+        for receiver in receivers:
+            receiver.join()
+        stop = time.perf_counter() - start
+    return {'threads': used, 'seconds': seconds,
+            'messages_per_sec': devices * messages / seconds,
+            'shutdown_seconds': stop}
+
+
+def run_multi(devices: int, messages: int) -> dict:
+    """
+    Measure MultiReceiver with one thread for all devices.
+
+    :param devices: number of simulated devices
+    :param messages: number of messages sent to each device
+    :return: measurements
+    """
+    threads = threading.active_count()
+    with fake.FakeSmartTV() as server:
+        receiver = listener.MultiReceiver()
+        received = []
+        receiver.add_listener(lambda msg, device: received.append(msg))
+        receiver.start()
+        for i in range(devices):
+            receiver.add_device(base.SmartTV('benchmark', *server.address))
+        used = threading.active_count() - threads - server.clients - 1
+        seconds = _flood(server, lambda: len(received), devices, messages)
+        start = time.perf_counter()
+        receiver.join()
+        stop = time.perf_counter() - start
+    return {'threads': used, 'seconds': seconds,
+            'messages_per_sec': devices * messages / seconds,
+            'shutdown_seconds': stop}
+
+
+def run(devices=(1, 10, 100, 1000), messages: int = 100) -> dict:
+    """
+    Compare both receivers for several device counts.
+
+    :param devices: device counts to measure
+    :param messages: number of messages sent to each device
+    :return: measurements by receiver and device count
+    """
+    results = {'ThreadReceiver': {}, 'MultiReceiver': {}}
+    for count in devices:
+        results['ThreadReceiver'][count] = run_thread(count, messages)
+        results['MultiReceiver'][count] = run_multi(count, messages)
+    return results
+
+
+def main():
+    for (name, results) in run().items():
+        for (count, result) in results.items():
+            print('%-15s %5d devices %5d threads %10.0f msg/s '
+                  'shutdown %.3fs' % (name, count, result['threads'],
+                                      result['messages_per_sec'],
+                                      result['shutdown_seconds']))
+
+
+if __name__ == '__main__':
+    main()
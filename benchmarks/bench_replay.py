@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Benchmark: replaying captured traffic.
+
+Measures parsing and dispatching the received messages of a capture file
+as fast as possible. Without an argument a synthetic capture of
+STATE_CHANGE storms read in 2048 byte chunks is generated, pass a capture
+recorded with samsung.capture.Recorder to measure real traffic.
+
+Run from the repository root: python -m benchmarks.bench_replay [capture]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from samsung import base, capture, fake, state
+
+
+def _synthetic(path: str, messages: int, streams: int) -> None:
+    """Write a capture of STATE_CHANGE messages received on streams."""
+    frames = [fake.encode_response(base.ResponseType.STATE_CHANGE, p)
+              for p in (base.ResponsePayload.STATUS_SHOWING_OVERLAY,
+                        base.ResponsePayload.STATUS_SHOWING_TV)]
+    data = b''.join(frames[i % 2] for i in range(messages // streams))
+    sources = [object() for _ in range(streams)]
+    with capture.Recorder(path) as recorder:
+        for offset in range(0, len(data), 2048):
+            for source in sources:
+                recorder.received(data[offset:offset + 2048], source)
+
+
+def run(messages: int = 100000, streams: int = 10,
+        path: Optional[str] = None) -> dict:
+    """
+    Measure replay throughput.
+
+    :param messages: number of messages in the synthetic capture
+    :param streams: number of connections in the synthetic capture
+    :param path: capture file to replay instead of a synthetic one
+    :return: seconds per message and messages per second
+    """
+    tmp = None
+    if path is None:
+        (fd, tmp) = tempfile.mkstemp(suffix='.sstvcap')
+        os.close(fd)
+        os.unlink(tmp)
+        _synthetic(tmp, messages, streams)
+        path = tmp
+    try:
+        replayer = capture.Replayer(streams=True)
+        replayer.add_listener(state.DeviceStates(),
+                              type_=base.ResponseType.STATE_CHANGE)
+        with capture.Capture(path) as cap:
+            best = None
+            for _ in range(3):
+                start = time.perf_counter()
+                count = replayer.replay(cap)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+    finally:
+        if tmp is not None:
+            os.unlink(tmp)
+    seconds = best / max(count, 1)
+    return {'messages': count, 'seconds': seconds,
+            'messages_per_sec': 1 / seconds if seconds else 0.0}
+
+
+def main():
+    result = run(path=sys.argv[1] if len(sys.argv) > 1 else None)
+    print('%d messages %8.3f us/msg %12.0f msg/s' % (
+        result['messages'], result['seconds'] * 1e6,
+        result['messages_per_sec']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark: key-to-ack latency and memory per connection.
+
+Sends key events to a samsung.fake.FakeSmartTV on loopback, waits for the
+acknowledgement of each and reports latency percentiles. Memory per
+connection is measured with tracemalloc over many authenticated
+connections to a fake device running in a separate process, so the
+allocations of the server side are not counted.
+
+Run from the repository root: python -m benchmarks.bench_roundtrip
+"""
+
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Tuple
+
+from samsung import base, fake
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Get a percentile of a list of values.
+
+    :param values: measured values
+    :param fraction: percentile as fraction, eG 0.99
+    :return: value at the given percentile
+    """
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def _server_process() -> Tuple[subprocess.Popen, tuple]:
+    """Start a fake device in a subprocess, return it and its address."""
+    process = subprocess.Popen(
+        [sys.executable, '-u', '-m', 'samsung.fake', '-p', '0'],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    # "listening on host:port"
+    (host, port) = process.stdout.readline().split()[-1].rsplit(':', 1)
+    return (process, (host, int(port)))
+
+
+def run(keys: int = 2000, connections: int = 100) -> dict:
+    """
+    Measure round trip latency and connection memory.
+
+    :param keys: number of key events to send
+    :param connections: number of connections for the memory measurement
+    :return: latency percentiles in seconds and bytes per connection
+    """
+    results = {}
+    with fake.FakeSmartTV() as server:
+        device = base.SmartTV('benchmark', *server.address)
+        device.connect()
+        latencies = []
+        for i in range(keys):
+            start = time.perf_counter()
+            device.send_key('KEY_VOLUP')
+            while not any(map(base.is_key_ack, device.recv_messages())):
+                pass
+            latencies.append(time.perf_counter() - start)
+        device.disconnect()
+        results['key_ack_latency'] = {
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'keys_per_sec': len(latencies) / sum(latencies),
+        }
+
+    (process, address) = _server_process()
+    try:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        devices = [base.SmartTV('benchmark', *address)
+                   for i in range(connections)]
+        for device in devices:
+            device.connect()
+            device.send_key('KEY_VOLUP')
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        size = sum(s.size_diff for s in after.compare_to(before, 'filename'))
+        results['memory_per_connection'] = size / connections
+        for device in devices:
+            device.disconnect()
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def main():
+    results = run()
+    latency = results['key_ack_latency']
+    print('key->ack p50 %.1f us, p99 %.1f us, %.0f keys/s' % (
+        latency['p50'] * 1e6, latency['p99'] * 1e6, latency['keys_per_sec']))
+    print('memory per connection: %.0f bytes' %
+          results['memory_per_connection'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Run all benchmarks and emit the results as JSON.
+
+Run from the repository root:
+
+    python -m benchmarks.run [--quick] [--json results.json]
+
+All timings are in seconds. The JSON document contains one entry per
+benchmark module plus the python version and platform, so results of
+different runs can be compared to gate releases.
+"""
+
+from argparse import ArgumentParser
+import json
+import platform
+import sys
+import time
+
+from benchmarks import (bench_dispatch, bench_encode, bench_import,
+                        bench_parse, bench_receivers, bench_replay,
+                        bench_roundtrip)
+
+
+def run(quick: bool = False) -> dict:
+    """
+    Run all benchmarks.
+
+    :param quick: use fewer iterations and devices for a fast smoke run
+    :return: results by benchmark name
+    """
+    number = 10000 if quick else 100000
+    devices = (1, 10, 100) if quick else (1, 10, 100, 1000)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'import': bench_import.run(3 if quick else 10),
+        'encode': bench_encode.run(number),
+        'parse': bench_parse.run(number),
+        'dispatch': bench_dispatch.run(number),
+        'replay': bench_replay.run(number),
+        'roundtrip': bench_roundtrip.run(keys=200 if quick else 2000),
+        'receivers': bench_receivers.run(devices,
+                                         messages=10 if quick else 100),
+    }
+
+
+def main():
+    p = ArgumentParser(description='Run pySamsung benchmarks.')
+    p.add_argument('--quick', action='store_true',
+                   help='fewer iterations and devices')
+    p.add_argument('--json', dest='json', default='-',
+                   help='file to write results to (default: stdout)')
+    args = p.parse_args()
+    results = run(args.quick)
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.json, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
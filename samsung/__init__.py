@@ -4,6 +4,20 @@ Library to communicate with Samsung entertainment devices.
 Modules in this package:
     base: message parsing, constructing and basic communication class
     listener: receivers for events generated by the device
+    aio: asyncio based connector
+    pool: connection pool to control many devices
+    keycodes: list of known key codes
+    session: persistent sessions with background reconnects
+    fake: emulated device for tests and benchmarks
+    metrics: optional counters and histograms with Prometheus export
+    state: cached device state from status messages
+    discovery: network scanner for devices
+    daemon: control socket server holding device connections
+    macro: scenes of keys, texts and waits compiled to frames
+    capture: record and replay raw traffic
+    sendqueue: rate limited send queue per connection
+    fleet: devices sharded over worker processes
+    stream: deduplicating and debouncing listener stage
 """
 
 
@@ -0,0 +1,229 @@
+"""
+asyncio based communication with Samsung Smart TVs.
+
+AsyncSmartTV speaks the same protocol as samsung.base.SmartTV but uses
+asyncio streams instead of blocking sockets, so a single event loop can
+control and listen to many devices without a thread per connection.
+"""
+
+import asyncio
+import collections
+import logging
+from typing import Callable, List, Optional, Union
+
+from samsung import base
+from samsung.base import _log
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('AsyncSmartTV',)
+
+
+class AsyncSmartTV:
+    """
+    asyncio connector for samsung SmartTV devices.
+
+    Provides the same functionality as samsung.base.SmartTV with coroutines.
+    Received messages can be consumed using "async for", an optional filter
+    function given to the constructor drops all messages that are not of
+    interest.
+
+    :ivar app_label: application name (will be used in authentication)
+    :ivar recorder: optional samsung.capture.Recorder instance to write
+                    all traffic to (default: None = disabled)
+    """
+    recorder = None
+
+    def __init__(self, app_label: str, host: str, port: int = 55000,
+                 auth_timeout: Union[int, float] = 20.0,
+                 filter_: Callable = lambda x: True):
+        """
+        Create a new connection.
+
+        :param app_label: application label to use for authentication and
+                          data transmission
+        :param host: ip address or hostname of the device
+        :param port: tcp port for remote control connection (default:
+                     55000)
+        :param auth_timeout: authentication timeout in seconds (
+                             default: 20.0, None=wait forever)
+        :param filter_: optional filter method for received messages
+        """
+        self._sock_args = (host, port)
+        self.app_label = app_label
+        self.filter = filter_
+        self._auth_timeout = auth_timeout
+        self._auth_tries = 3
+        self._pending_confirmation = False
+        self._auth_answered = False
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._decoder = base.FrameDecoder()
+        self._pending = collections.deque()
+
+    def __repr__(self) -> str:
+        return '%s(%r, %r, %r, %r)' % (self.__class__.__name__,
+                                       self.app_label, self._sock_args[0],
+                                       self._sock_args[1], self._auth_timeout)
+
+    @property
+    def connected(self) -> bool:
+        """True if the connection is established."""
+        return self._writer is not None
+
+    async def connect(self) -> None:
+        """Connect to device and authenticate."""
+        _log(logging.DEBUG, 'Connecting to %s:%d', self._sock_args[0],
+             self._sock_args[1])
+        self._decoder.reset()
+        self._pending.clear()
+        if self.recorder is not None:
+            self.recorder.connected(self)
+        (self._reader, self._writer) = await asyncio.wait_for(
+            asyncio.open_connection(*self._sock_args), self._auth_timeout)
+        try:
+            await self._authenticate()
+        except BaseException:
+            await self.disconnect()
+            raise
+
+    async def _authenticate(self) -> bool:
+        """
+        Authenticate with samsung device.
+
+        Uses the same handshake as samsung.base.SmartTV._authenticate.
+        Messages received after the authentication response are kept for
+        the message iterator.
+
+        :return: True if authentication was successful
+        :raises: AuthenticationError, OSError
+        """
+        socket_name = self._writer.get_extra_info('sockname')[0]
+        auth = base.build_auth_message(self.app_label, socket_name)
+        _log(logging.DEBUG, 'sending %r', auth)
+        self._writer.write(auth)
+        await self._writer.drain()
+        if self.recorder is not None:
+            self.recorder.sent(auth, self)
+
+        self._auth_answered = False
+        for i in range(self._auth_tries):
+            try:
+                responses = await asyncio.wait_for(self.recv_messages(),
+                                                   self._auth_timeout)
+            except asyncio.TimeoutError:
+                _log(logging.DEBUG, 'AUTH2 timeout')
+                continue
+            while responses:
+                self._auth_answered = True
+                status = base.parse_auth_response(responses.pop(0))
+                self._pending_confirmation = status is None
+                if status:
+                    self._pending.extend(responses)
+                    return True
+                elif status is False:
+                    raise base.AuthenticationError(
+                        'access denied by remote device')
+        raise base.AuthenticationError('access denied by remote device')
+
+    async def disconnect(self) -> None:
+        """Close the connection."""
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = None
+        self._writer = None
+
+    async def recv(self) -> bytes:
+        """
+        Receive raw data from the TV.
+
+        :return: received data
+        :raise: ConnectionError if the connection was closed by the device
+        """
+        data = await self._reader.read(2048)
+        if not data:
+            raise ConnectionError('Received 0 bytes -- disconnected?')
+        _log(logging.DEBUG, 'received %r', data)
+        if self.recorder is not None:
+            self.recorder.received(data, self)
+        return data
+
+    async def recv_messages(self) -> List[base.Message]:
+        """
+        Receive data from the TV and return all messages completed by it.
+
+        :return: list of parsed messages, might be empty
+        :raise: ConnectionError if the connection was closed by the device
+        """
+        return self._decoder.feed(await self.recv())
+
+    async def send(self, data: bytes) -> int:
+        """
+        Send raw data to remote device.
+
+        If the connection to the remote device is not established,
+        self.connect is called before sending the data.
+
+        :param data: binary data to send
+        :return: number of bytes transmitted
+        """
+        if self._writer is None:
+            await self.connect()
+        _log(logging.DEBUG, 'sending %r', data)
+        self._writer.write(data)
+        await self._writer.drain()
+        if self.recorder is not None:
+            self.recorder.sent(data, self)
+        return len(data)
+
+    async def send_key(self, key: str) -> int:
+        """
+        Send a key event to the device.
+
+        :param key: key code to send. must start with "KEY_"
+        :return: number of bytes transmitted
+        """
+        return await self.send(base.build_key_message(self.app_label, key))
+
+    async def send_text(self, text: str) -> int:
+        """
+        Send a text to the device.
+
+        :param text: text to send
+        :return: number of bytes transmitted
+        """
+        return await self.send(base.build_text_message(self.app_label, text))
+
+    def __aiter__(self) -> 'AsyncSmartTV':
+        """aiter(self)"""
+        return self
+
+    async def __anext__(self) -> base.Message:
+        """anext(self)"""
+        if self._writer is None:
+            await self.connect()
+        while True:
+            while self._pending:
+                msg = self._pending.popleft()
+                if self.filter(msg):
+                    return msg
+            try:
+                self._pending.extend(await self.recv_messages())
+            except ConnectionError:
+                await self.disconnect()
+                raise StopAsyncIteration
+
+    async def __aenter__(self) -> 'AsyncSmartTV':
+        """Connect when used as async context manager."""
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Disconnect when leaving the context."""
+        await self.disconnect()
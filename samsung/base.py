@@ -3,24 +3,76 @@ Base functionality to communicate with Samsung Smart TVs.
 """
 
 import base64
+import collections
+from concurrent.futures import Future, wait as wait_futures
 import enum
+import functools
 import logging
+import os
+import select
 import socket
+import struct
+import threading
 import time
-from typing import Optional, Tuple, Union
-import uuid  # used for mac detection
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from samsung import keycodes
 
 
 __version__ = '0.4.0'
 __author__ = 'David Poisl <david@poisl.at>'
 
 __all__ = ('sstv_string', 'sstv_base64', 'SmartTV', 'Message',
-           'parse_sstv_string', 'AuthenticationError')
+           'FrameDecoder', 'FrameCache', 'AckTracker', 'parse_sstv_string',
+           'unpack_sstv_string', 'build_message',
+           'build_key_message', 'build_text_message', 'build_auth_message',
+           'parse_auth_response', 'is_key_ack', 'AuthenticationError',
+           'local_mac', 'set_local_mac')
 
 
 _logger: Optional[logging.Logger] = None
-_mac = '%012x' % uuid.getnode()
-LOCAL_MAC = ':'.join(_mac[i:i + 2] for i in range(0, 12, 2))
+_local_mac: Optional[str] = None
+
+
+def local_mac() -> str:
+    """
+    Get the MAC address sent with authentication requests.
+
+    Taken from set_local_mac, SAMSUNG_MAC in the environment or detected
+    with uuid.getnode(), which might scan interfaces or run external
+    programs. Detection happens on first use only, the result is cached.
+
+    :return: MAC address as colon separated hex digits
+    """
+    global _local_mac
+    if _local_mac is None:
+        if 'LOCAL_MAC' in globals():
+            # assigned by older code to override the detection
+            return globals()['LOCAL_MAC']
+        try:
+            _local_mac = os.environ['SAMSUNG_MAC']
+        except KeyError:
+            import uuid
+            mac = '%012x' % uuid.getnode()
+            _local_mac = ':'.join(mac[i:i + 2] for i in range(0, 12, 2))
+    return _local_mac
+
+
+def set_local_mac(mac: Optional[str]) -> None:
+    """
+    Override the MAC address sent with authentication requests.
+
+    :param mac: MAC address, eG '00:11:22:33:44:55' (None = detect again)
+    """
+    global _local_mac
+    _local_mac = mac
+
+
+def __getattr__(name: str):
+    """Provide LOCAL_MAC, detected on first access."""
+    if name == 'LOCAL_MAC':
+        return local_mac()
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
 
 
 class AuthenticationError(Exception):
@@ -77,6 +129,14 @@ class ResponsePayload(enum.Enum):
     STATUS_SHOWING_OVERLAY = '\x10\x00\x18\x00\x00\x00'
 
 
+# payloads are binary, latin-1 maps every byte to the code point of the same
+# value so the str values of ResponsePayload round trip to the raw bytes
+_PAYLOAD_ENCODING = 'latin-1'
+_RESPONSE_TYPES = {t.value: t for t in ResponseType}
+_RESPONSE_PAYLOADS = {p.value.encode(_PAYLOAD_ENCODING): p
+                      for p in ResponsePayload}
+
+
 def set_logging(active: bool = True, logger_name: str = 'samsung.base'):
     """
     Activate debug messages.
@@ -114,6 +174,30 @@ def _log(level: int, message: str, *args, **kwargs) -> None:
         return _logger.log(level, message, *args, **kwargs)
 
 
+def _wait_readable(objects: List, timeout: Optional[float]) -> List:
+    """
+    Wait until some of the given sockets (or objects with fileno) are
+    readable.
+
+    Uses poll where available, unlike select it handles file descriptors
+    above FD_SETSIZE (1024), which are common with many connections.
+    Errors and hangups count as readable, the following recv reports them.
+
+    :param objects: sockets or objects with a fileno method
+    :param timeout: maximum seconds to wait (None = forever)
+    :return: the readable objects
+    :raise: ValueError if an object is closed
+    """
+    if not hasattr(select, 'poll'):
+        return select.select(objects, [], [], timeout)[0]
+    poller = select.poll()
+    for obj in objects:
+        poller.register(obj, select.POLLIN)
+    ready = {fd for (fd, _) in poller.poll(
+        None if timeout is None else timeout * 1000)}
+    return [obj for obj in objects if obj.fileno() in ready]
+
+
 def sstv_string(string: Union[str, bytes]) -> bytes:
     """
     Convert a string to Samsungs string format.
@@ -142,6 +226,32 @@ def sstv_base64(string: str) -> bytes:
     return sstv_string(base64.b64encode(string.encode("ASCII")))
 
 
+_LENGTH = struct.Struct('<H')
+_HEADER = struct.Struct('<BH')
+
+
+def unpack_sstv_string(buffer: Union[bytes, bytearray, memoryview],
+                       offset: int = 0) -> Tuple[str, int]:
+    """
+    Parse a string at a given offset of a buffer without copying the rest.
+
+    :param buffer: source data
+    :param offset: position of the length prefix in buffer
+    :return: the parsed string and the offset right after it
+    :raises: ValueError if buffer does not contain the complete string
+    """
+    try:
+        (length,) = _LENGTH.unpack_from(buffer, offset)
+    except struct.error:
+        raise ValueError('missing length at offset %d' % offset) from None
+    start = offset + 2
+    end = start + length
+    if len(buffer) < end:
+        raise ValueError('missing %d bytes at offset %d' % (
+            end - len(buffer), offset))
+    return str(buffer[start:end], 'ASCII'), end
+
+
 def parse_sstv_string(data: bytes) -> Tuple[str, bytes]:
     """
     Parse a string as returned by samsung devices.
@@ -153,36 +263,200 @@ def parse_sstv_string(data: bytes) -> Tuple[str, bytes]:
     :param data: source data
     :return: the parsed string and potentially remaining data
     """
-    _log(logging.DEBUG, 'Parsing sstv_string %r', data)
-    length = data[0] + data[1] * 256
-    if len(data) < length + 2:
-        raise ValueError('missing %d bytes in %r' % (length, data))
-    _log(logging.DEBUG, 'Length %d, payload %r, remainder %r',
-         length, data[2:length + 2], data[length + 2:])
-    return data[2:length + 2].decode('ASCII'), data[length + 2:]
+    (string, end) = unpack_sstv_string(data)
+    if _logger is not None:
+        _log(logging.DEBUG, 'Parsed sstv_string %r, remainder %r',
+             string, data[end:])
+    return string, data[end:]
+
+
+def build_message(app_label: str, mode: int, payload: bytes) -> bytes:
+    """
+    Build a message to send to the device.
+
+    :param app_label: application label used for authentication
+    :param mode: message mode (\x00 = keycode, \x01 = text)
+    :param payload: message payload
+    :return: encoded message
+    """
+    return bytes((mode,)) + sstv_string(app_label + '.iapp.samsung') \
+        + sstv_string(payload)
+
+
+def build_key_message(app_label: str, key: str) -> bytes:
+    """
+    Build a key event message.
+
+    :param app_label: application label used for authentication
+    :param key: key code to send. must start with "KEY_"
+    :return: encoded message
+    """
+    return build_message(app_label, 0x00, b'\x00\x00\x00' + sstv_base64(key))
+
+
+def build_text_message(app_label: str, text: str) -> bytes:
+    """
+    Build a text input message.
+
+    :param app_label: application label used for authentication
+    :param text: text to send
+    :return: encoded message
+    """
+    return build_message(app_label, 0x01, b'\x01\x00' + sstv_base64(text))
+
+
+def build_auth_message(app_label: str, address: str,
+                       mac: Optional[str] = None) -> bytes:
+    """
+    Build the authentication request sent after connecting.
+
+    :param app_label: application label to authenticate
+    :param address: local ip address of the connection
+    :param mac: local mac address (default: local_mac())
+    :return: encoded authentication message
+    """
+    auth_content = b'\x64\x00' + sstv_base64(address) + \
+        sstv_base64(mac or local_mac()) + sstv_base64(app_label)
+    return b'\x00' + sstv_string(app_label + '.iapp.samsung') + \
+        sstv_string(auth_content)
+
+
+def parse_auth_response(parsed: 'Message') -> Optional[bool]:
+    """
+    Evaluate the response to an authentication request.
+
+    :param parsed: message received after sending the authentication request
+    :return: True if access was granted, False if it was denied and None if
+             the device is still waiting for confirmation by the user
+    :raises: AuthenticationError on timeouts, ValueError for unknown responses
+    """
+    payload = parsed.response_payload
+    if payload is ResponsePayload.AUTH_OK:
+        _log(logging.DEBUG, 'Authentication successful')
+        return True
+    elif payload is ResponsePayload.AUTH_ACCESS_DENIED:
+        _log(logging.DEBUG, 'Authentication response: Access Denied')
+        return False
+    elif payload is ResponsePayload.AUTH_NEED_CONFIRMATION:
+        _log(logging.DEBUG, 'Authentication response: waiting for '
+             'confirmation on device')
+        return None
+    elif payload is ResponsePayload.AUTH_TIMEOUT:
+        _log(logging.DEBUG, 'Authentication response: Timeout')
+        raise AuthenticationError('timeout')
+    else:
+        _log(logging.DEBUG, 'Unknown authentication response')
+        raise ValueError('unknown auth response: %r' % parsed)
+
+
+_KEY_ACK_TYPES = frozenset((ResponseType.KEY_CONFIRM.value,
+                            ResponseType.KEY_CONFIRM_MENU.value))
+_KEY_OK = ResponsePayload.KEY_OK.value.encode(_PAYLOAD_ENCODING)
+
+
+def is_key_ack(message: 'Message') -> bool:
+    """
+    Check if a message confirms a key event or text sent to the device.
+
+    :param message: received message
+    :return: True for KEY_CONFIRM and KEY_CONFIRM_MENU messages with KEY_OK
+    """
+    return message.type in _KEY_ACK_TYPES and message.raw_payload == _KEY_OK
 
 
 class Message:
     """
     A message sent by a samsung device.
 
+    Payload and sender are kept as received, payload and sender are
+    decoded to str on first access only. response_type and
+    response_payload classify a message with a dict lookup on the raw
+    values, so status messages can be handled without decoding them.
+
     :ivar type: message type
-    :ivar payload: message payload
-    :ivar sender: name of the sending device
+    :ivar raw_payload: message payload as received
+    :ivar raw_sender: name of the sending device as received
     """
 
-    def __init__(self, type_: int, payload: str, sender: Optional[str] = None):
+    __slots__ = ('type', 'raw_payload', 'raw_sender', '_payload', '_sender')
+
+    def __init__(self, type_: int, payload: Union[str, bytes],
+                 sender: Union[str, bytes, None] = None):
         """
         Constructor.
 
         :param int type_: message type
-        :param str payload: message payload
-        :param str sender: optional sender indicator
+        :param payload: message payload
+        :param sender: optional sender indicator
         """
         self.type = type_
         self.payload = payload
         self.sender = sender
 
+    @classmethod
+    def from_raw(cls, type_: int, payload: bytes,
+                 sender: Optional[bytes] = None) -> 'Message':
+        """
+        Create a message from received bytes without decoding them.
+
+        :param type_: message type
+        :param payload: raw payload
+        :param sender: raw sender name
+        :return: new message
+        """
+        msg = cls.__new__(cls)
+        msg.type = type_
+        msg.raw_payload = payload
+        msg.raw_sender = sender
+        msg._payload = None
+        msg._sender = None
+        return msg
+
+    @property
+    def payload(self) -> str:
+        """Message payload, decoded on first access."""
+        payload = self._payload
+        if payload is None:
+            payload = self._payload = self.raw_payload.decode(
+                _PAYLOAD_ENCODING)
+        return payload
+
+    @payload.setter
+    def payload(self, payload: Union[str, bytes]) -> None:
+        if isinstance(payload, str):
+            self._payload = payload
+            self.raw_payload = payload.encode(_PAYLOAD_ENCODING)
+        else:
+            self._payload = None
+            self.raw_payload = bytes(payload)
+
+    @property
+    def sender(self) -> Optional[str]:
+        """Name of the sending device, decoded on first access."""
+        sender = self._sender
+        if sender is None and self.raw_sender is not None:
+            sender = self._sender = self.raw_sender.decode(_PAYLOAD_ENCODING)
+        return sender
+
+    @sender.setter
+    def sender(self, sender: Union[str, bytes, None]) -> None:
+        if isinstance(sender, str):
+            self._sender = sender
+            self.raw_sender = sender.encode(_PAYLOAD_ENCODING)
+        else:
+            self._sender = None
+            self.raw_sender = None if sender is None else bytes(sender)
+
+    @property
+    def response_type(self) -> Optional[ResponseType]:
+        """Known ResponseType of the message or None."""
+        return _RESPONSE_TYPES.get(self.type)
+
+    @property
+    def response_payload(self) -> Optional[ResponsePayload]:
+        """Known ResponsePayload of the message or None."""
+        return _RESPONSE_PAYLOADS.get(self.raw_payload)
+
     @classmethod
     def parse(cls, message: bytes) -> 'Message':
         """
@@ -191,13 +465,42 @@ class Message:
         :param message: payload received on socket
         :return: Message instance with parsed type, payload and sender
         """
-        type_ = message[0]
-        (sender, remaining) = parse_sstv_string(message[1:])
-        (payload, remaining) = parse_sstv_string(remaining)
-        if remaining:
+        parsed = cls.parse_frame(message)
+        if parsed is None:
+            raise ValueError('Parser error: incomplete message %r' % message)
+        (msg, end) = parsed
+        if end != len(message):
             raise ValueError('Parser error: message %r, remaining data: %r' % (
-                             message, remaining))
-        return cls(type_, payload, sender)
+                             message, message[end:]))
+        return msg
+
+    @classmethod
+    def parse_frame(cls, buffer: Union[bytes, bytearray], offset: int = 0
+                    ) -> Optional[Tuple['Message', int]]:
+        """
+        Parse a single message starting at offset in a receive buffer.
+
+        Unlike parse this does not require the buffer to hold exactly one
+        message: data after the message is left alone and an incomplete
+        message is reported by returning None instead of raising.
+
+        :param buffer: buffer holding received data
+        :param offset: position of the message type byte in buffer
+        :return: tuple of the parsed Message and the offset right after it or
+                 None if buffer does not contain a complete message yet
+        """
+        try:
+            (type_, sender_length) = _HEADER.unpack_from(buffer, offset)
+            sender_end = offset + 3 + sender_length
+            (payload_length,) = _LENGTH.unpack_from(buffer, sender_end)
+        except struct.error:
+            return None
+        payload_start = sender_end + 2
+        payload_end = payload_start + payload_length
+        if len(buffer) < payload_end:
+            return None
+        return cls.from_raw(type_, bytes(buffer[payload_start:payload_end]),
+                            bytes(buffer[offset + 3:sender_end])), payload_end
 
     def __repr__(self) -> str:
         """textual representation"""
@@ -214,7 +517,8 @@ class Message:
         if isinstance(other, bytes):
             return self.__eq__(Message.parse(other))
         elif isinstance(other, Message):
-            return self.type == other.type and self.payload == other.payload
+            return self.type == other.type and \
+                self.raw_payload == other.raw_payload
         else:
             return NotImplemented
     
@@ -226,6 +530,255 @@ class Message:
         return not self.__eq__(other)
 
 
+class FrameDecoder:
+    """
+    Incremental decoder for the message stream sent by samsung devices.
+
+    TCP does not preserve message boundaries, so a single read from the
+    socket can contain several messages or only part of one. Complete
+    messages are parsed in place from the received data using a read
+    cursor, incomplete tails are kept until the rest of the message arrives
+    with one of the next reads.
+
+    The buffer is an immutable bytes object, so the raw payloads of parsed
+    messages are plain slices of it, and in the common case of reads
+    ending on a message boundary received data is parsed without copying
+    it into a buffer first.
+
+    :ivar message_class: class used to parse messages (default: Message)
+    """
+
+    def __init__(self, message_class: type = None):
+        """
+        Constructor.
+
+        :param message_class: optional Message subclass to create
+        """
+        self.message_class = message_class or Message
+        self._buffer = b''
+
+    def __len__(self) -> int:
+        """Number of buffered bytes not yet parsed."""
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> List['Message']:
+        """
+        Add received data and return all messages completed by it.
+
+        :param data: data as received from the socket
+        :return: list of zero or more parsed messages
+        """
+        buffer = self._buffer + data if self._buffer else bytes(data)
+        parse_frame = self.message_class.parse_frame
+        messages = []
+        pos = 0
+        while True:
+            parsed = parse_frame(buffer, pos)
+            if parsed is None:
+                break
+            (msg, pos) = parsed
+            messages.append(msg)
+        self._buffer = buffer[pos:] if pos else buffer
+        return messages
+
+    def reset(self) -> None:
+        """Drop all buffered data, eG after reconnecting."""
+        self._buffer = b''
+
+
+@functools.lru_cache(maxsize=32)
+def _known_key_frames(app_label: str) -> Dict[str, bytes]:
+    """
+    Encoded messages for all known key codes, shared between connections.
+
+    :param app_label: application label to build messages for
+    :return: encoded messages by key code
+    """
+    return {key: build_key_message(app_label, key) for key in keycodes.KEYS}
+
+
+class FrameCache:
+    """
+    Precompiled key event messages for one application label.
+
+    Encoding a key event takes several base64 and length prefix steps while
+    the set of keys used is small and fixed. Messages for the preseeded
+    keys are encoded once (and shared between all caches with the same
+    app_label if the default key list is used), other keys are kept in a
+    bounded LRU table, so sending a key is a dict lookup.
+
+    :ivar app_label: application label the messages are built for
+    :ivar maxsize: maximum number of cached messages for other keys
+    """
+
+    def __init__(self, app_label: str, maxsize: int = 512,
+                 preseed: Optional[Iterable[str]] = None):
+        """
+        Constructor.
+
+        :param app_label: application label to build messages for
+        :param maxsize: maximum number of cached messages for keys not
+                        in preseed
+        :param preseed: key codes to encode right away (default: all known
+                        key codes)
+        """
+        self.app_label = app_label
+        self.maxsize = maxsize
+        if preseed is None:
+            self._static = _known_key_frames(app_label)
+        else:
+            self._static = {key: build_key_message(app_label, key)
+                            for key in preseed}
+        self._frames = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._static) + len(self._frames)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._static or key in self._frames
+
+    def __getitem__(self, key: str) -> bytes:
+        """
+        Get the encoded message for a key event.
+
+        :param key: key code. must start with "KEY_"
+        :return: encoded message as built by build_key_message
+        """
+        try:
+            return self._static[key]
+        except KeyError:
+            pass
+        frames = self._frames
+        try:
+            frame = frames[key]
+        except KeyError:
+            frame = frames[key] = build_key_message(self.app_label, key)
+            if len(frames) > self.maxsize:
+                frames.popitem(last=False)
+        else:
+            frames.move_to_end(key)
+        return frame
+
+
+class AckTracker:
+    """
+    Correlates key and text acknowledgements with sent messages.
+
+    The device confirms every key event and text with a KEY_CONFIRM or
+    KEY_CONFIRM_MENU message with KEY_OK payload but does not say which
+    message it confirms, so acknowledgements are matched to the pending
+    requests in FIFO order. Requests which are not acknowledged within
+    their timeout fail with TimeoutError; an acknowledgement arriving after
+    that is matched to the next pending request. Timeouts are checked in
+    the same order, a request expires once all earlier requests did.
+
+    After close() new requests fail immediately instead of waiting for a
+    reader that is gone, reopen() accepts requests again.
+
+    :ivar wakeup: optional callable notifying the reading thread that the
+                  first request after an idle period was registered
+    """
+
+    def __init__(self):
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self.wakeup: Optional[Callable[[], None]] = None
+
+    def __len__(self) -> int:
+        """Number of pending requests."""
+        return len(self._pending)
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """Error given to close(), None while requests are accepted."""
+        return self._error
+
+    def expect(self, timeout: Optional[float] = None) -> Future:
+        """
+        Register a request waiting for an acknowledgement.
+
+        :param timeout: seconds until the request fails (None = never)
+        :return: future resolving to the acknowledging Message
+        """
+        future = Future()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            error = self._error
+            if error is None:
+                idle = not self._pending
+                self._pending.append((future, deadline))
+        if error is not None:
+            future.set_running_or_notify_cancel()
+            future.set_exception(error)
+            return future
+        if idle and self.wakeup is not None:
+            self.wakeup()
+        return future
+
+    def feed(self, message: 'Message') -> bool:
+        """
+        Process a received message.
+
+        :param message: received message
+        :return: True if message acknowledged a pending request
+        """
+        if not is_key_ack(message):
+            return False
+        with self._lock:
+            while self._pending:
+                (future, deadline) = self._pending.popleft()
+                if future.set_running_or_notify_cancel():
+                    future.set_result(message)
+                    return True
+        return False
+
+    def expire(self) -> None:
+        """Fail all requests whose timeout passed."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._pending and self._pending[0][1] is not None and \
+                    self._pending[0][1] <= now:
+                expired.append(self._pending.popleft()[0])
+        for future in expired:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(TimeoutError('no acknowledgement'))
+
+    def next_deadline(self) -> Optional[float]:
+        """time.monotonic() value of the next timeout or None."""
+        with self._lock:
+            return self._pending[0][1] if self._pending else None
+
+    def fail_all(self, error: BaseException) -> None:
+        """
+        Fail all pending requests, eG after the connection was lost.
+
+        :param error: exception to set on the futures
+        """
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        for (future, deadline) in pending:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def close(self, error: BaseException) -> None:
+        """
+        Fail all pending and future requests, the reader stopped.
+
+        :param error: exception to set on the futures
+        """
+        with self._lock:
+            self._error = error
+        self.fail_all(error)
+
+    def reopen(self) -> None:
+        """Accept requests again after close, a new reader started."""
+        with self._lock:
+            self._error = None
+
+
 class SmartTV:
     """
     Connector for samsung SmartTV devices.
@@ -235,7 +788,17 @@ class SmartTV:
     key codes or strings (eG for text input fields).
 
     :ivar app_label: application name (will be used in authentication)
+    :ivar metrics: optional samsung.metrics.Metrics instance to record
+                   traffic and timings to (default: None = disabled)
+    :ivar recorder: optional samsung.capture.Recorder instance to write
+                    all traffic to (default: None = disabled)
     """
+    metrics = None
+    recorder = None
+    # set if received messages are read (and fed to _acks) by someone else,
+    # eG a receiver, instead of an ack reader thread
+    _external_reader = False
+
     def __init__(self, app_label: str, host: str, port: int = 55000,
                  auth_timeout: Union[int, float] = 20.0,
                  recv_timeout: Union[int, float] = 2.0):
@@ -255,9 +818,17 @@ class SmartTV:
         self._sock_args = (host, port)
         self.app_label = app_label
         self._sock = None
+        self._decoder = FrameDecoder()
+        self._frames: Optional[FrameCache] = None
+        self._acks = AckTracker()
+        self._ack_reader: Optional[threading.Thread] = None
+        self._ack_sock: Optional[socket.socket] = None
         self._auth_timeout = auth_timeout
         self._recv_timeout = recv_timeout
         self._auth_tries = 3
+        # successful writes, tells whether a failed action reached the
+        # device (see SmartTVPool.call)
+        self._writes = 0
 
     def __repr__(self) -> str:
         return '%s(%r, %r, %r, %r, %r)' % (self.__class__.__name__,
@@ -268,23 +839,43 @@ class SmartTV:
     
     def connect(self) -> None:
         """Connect to device and authenticate."""
+        metrics = self.metrics
+        if metrics is None:
+            self._connect()
+            self._authenticate()
+            return
+        start = time.perf_counter()
         self._connect()
         self._authenticate()
+        metrics.observe('auth_seconds', time.perf_counter() - start)
+        metrics.inc('connects')
     
     def _connect(self) -> None:
         """
         Connect to the device socket.
 
+        The host is resolved to IPv4 and IPv6 addresses, which are tried in
+        the order the resolver returns them.
+
         :raises: socket.error
         """
         _log(logging.DEBUG, 'Connecting to %s:%d', self._sock_args[0],
              self._sock_args[1])
-        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._sock.settimeout(self._auth_timeout)
-        try:
-            self._sock.connect(self._sock_args)
-        except socket.error:
-            raise
+        self._decoder.reset()
+        if self.recorder is not None:
+            self.recorder.connected(self)
+        addresses = socket.getaddrinfo(*self._sock_args,
+                                       type=socket.SOCK_STREAM)
+        for (i, (family, type_, proto, _, address)) in enumerate(addresses):
+            self._sock = socket.socket(family, type_, proto)
+            self._sock.settimeout(self._auth_timeout)
+            try:
+                self._sock.connect(address)
+                return
+            except socket.error:
+                if i == len(addresses) - 1:
+                    raise
+                self._sock.close()
 
     def _authenticate(self) -> bool:
         """
@@ -298,34 +889,38 @@ class SmartTV:
         :raises: AuthenticationError, socket.error
         """
         socket_name = self._sock.getsockname()[0]
-        auth_content = b'\x64\x00' + sstv_base64(socket_name) + \
-                       sstv_base64(LOCAL_MAC) + sstv_base64(self.app_label)
-        auth = b'\x00' + sstv_string(self.app_label + '.iapp.samsung') + \
-               sstv_string(auth_content)
+        auth = build_auth_message(self.app_label, socket_name)
 
         _log(logging.DEBUG, 'sending %r', auth)
         self._sock.send(auth)
+        if self.recorder is not None:
+            self.recorder.sent(auth, self)
         status = None
 
         for i in range(self._auth_tries):
             try:
                 _log(logging.DEBUG, 'AUTH2 WAIT')
-                response = self.recv()
-                _log(logging.DEBUG, 'AUTH2 Response: %r' % response)
+                responses = self.recv_messages()
+                _log(logging.DEBUG, 'AUTH2 Response: %r', responses)
             except socket.timeout:
                 _log(logging.DEBUG, 'AUTH2 timeout')
             else:
-                status = self._parse_auth_response(response)
-                _log(logging.DEBUG, '2nd AUTH RESPONSE: %r', status)
+                for response in responses:
+                    status = self._parse_auth_response(response)
+                    _log(logging.DEBUG, '2nd AUTH RESPONSE: %r', status)
+                    if status is not None:
+                        break
             if status:
                 _log(logging.DEBUG, 'OK')
                 self._sock.settimeout(self._recv_timeout)
                 return True
-        else:
-            _log(logging.DEBUG, 'ERROR')
-            raise AuthenticationError('access denied by remote device')
+            elif status is False:
+                break
+        _log(logging.DEBUG, 'ERROR')
+        raise AuthenticationError('access denied by remote device')
 
-    def _parse_auth_response(self, response: bytes) -> Optional[bool]:
+    def _parse_auth_response(self, response: Union[bytes, 'Message']
+                             ) -> Optional[bool]:
         """
         Parse authentication response.
 
@@ -333,36 +928,28 @@ class SmartTV:
         success as boolean. If the device is still waiting for a
         confirmation from the user, None is returned instead.
     
-        :param response: authentication response as string
+        :param response: authentication response as string or Message
         :return: None if no response received or we should wait, else
                  authentication result
         """
         if response is None:
             _log(logging.DEBUG, 'got no response')
             return None
-        parsed = Message.parse(response)
-        if parsed.payload == ResponsePayload.AUTH_OK:
-            _log(logging.DEBUG, 'Authentication successful')
-            return True
-        elif parsed.payload == ResponsePayload.AUTH_ACCESS_DENIED:
-            _log(logging.DEBUG, 'Authentication response: Access Denied')
+        if not isinstance(response, Message):
+            response = Message.parse(response)
+        status = parse_auth_response(response)
+        if status is False:
             self._sock.close()
-            return False
-        elif parsed.payload == ResponsePayload.AUTH_NEED_CONFIRMATION:
-            _log(logging.DEBUG, 'Authentication response: waiting for '
-                 'confirmation on device')
-            return None
-        elif parsed.payload == ResponsePayload.AUTH_TIMEOUT:
-            _log(logging.DEBUG, 'Authentication response: Timeout')
-            raise AuthenticationError('timeout')
-        else:
-            _log(logging.DEBUG, 'Unknown authentication response')
-            raise ValueError('unknown auth response: %r' % parsed)
+        return status
 
     def disconnect(self) -> None:
         """Disconnect socket."""
         self._sock.close()
         self._sock = None
+        self._decoder.reset()
+        self._acks.fail_all(ConnectionError('disconnected'))
+        if self._acks.wakeup is not None:
+            self._acks.wakeup()
     
     def recv(self) -> bytes:
         """
@@ -388,8 +975,28 @@ class SmartTV:
         else:
             _log(logging.DEBUG, 'received %r  (timeout: %r)', data,
                  self._sock.gettimeout())
+        if self.metrics is not None:
+            self.metrics.inc('bytes_received', len(data))
+        if self.recorder is not None:
+            self.recorder.received(data, self)
         return data
 
+    def recv_messages(self) -> List['Message']:
+        """
+        Receive data from the TV and return all messages completed by it.
+
+        Data is collected by a FrameDecoder so messages coalesced into one
+        read as well as messages split over several reads are handled. The
+        result can be empty if only part of a message was received.
+
+        :return: list of parsed messages
+        :raise: socket.timeout or socket.error
+        """
+        messages = self._decoder.feed(self.recv())
+        if self.metrics is not None:
+            self.metrics.inc('messages_parsed', len(messages))
+        return messages
+
     def send(self, data: bytes) -> int:
         """
         Send raw data to remote device.
@@ -405,7 +1012,20 @@ class SmartTV:
             self.connect()
         try:
             _log(logging.DEBUG, 'sending %r', data)
-            return self._sock.send(data)
+            if self.metrics is None and self.recorder is None:
+                sent = self._sock.send(data)
+                self._writes += 1
+                return sent
+            start = time.perf_counter()
+            sent = self._sock.send(data)
+            self._writes += 1
+            if self.metrics is not None:
+                self.metrics.observe('send_seconds',
+                                     time.perf_counter() - start)
+                self.metrics.inc('bytes_sent', sent)
+            if self.recorder is not None:
+                self.recorder.sent(data[:sent], self)
+            return sent
         except socket.timeout:
             _log(logging.WARNING, 'Timeout when sending')
             raise
@@ -413,17 +1033,180 @@ class SmartTV:
             _log(logging.WARNING, 'Error in connection')
             raise
     
-    def send_key(self, key: str) -> int:
+    def sendall(self, data: bytes) -> None:
+        """
+        Send all of data to remote device.
+
+        Like send but retries until everything is transmitted, which
+        matters for larger batches of messages.
+
+        :param data: binary data to send
+        :raise: socket.timeout or socket.error
+        """
+        if self._sock is None:
+            self.connect()
+        try:
+            _log(logging.DEBUG, 'sending %r', data)
+            if self.metrics is None:
+                self._sock.sendall(data)
+                self._writes += 1
+            else:
+                start = time.perf_counter()
+                self._sock.sendall(data)
+                self._writes += 1
+                self.metrics.observe('send_seconds',
+                                     time.perf_counter() - start)
+                self.metrics.inc('bytes_sent', len(data))
+            # only record what was sent, a failed sendall is not in the
+            # capture
+            if self.recorder is not None:
+                self.recorder.sent(data, self)
+        except socket.timeout:
+            _log(logging.WARNING, 'Timeout when sending')
+            raise
+        except socket.error:
+            _log(logging.WARNING, 'Error in connection')
+            raise
+
+    def _recv_until(self, deadline: float) -> List['Message']:
+        """
+        Receive messages until data arrives or deadline passes.
+
+        :param deadline: time.monotonic() value to stop waiting at
+        :return: list of parsed messages, empty if nothing was received
+        :raise: ConnectionError if the device closed the connection,
+                socket.error
+        """
+        if not _wait_readable([self._sock],
+                              max(deadline - time.monotonic(), 0.0)):
+            return []
+        try:
+            return self.recv_messages()
+        except socket.timeout:
+            # readable but nothing to read: closed by the device
+            raise ConnectionError('connection closed by device')
+
+    def _acks_read_elsewhere(self) -> bool:
+        """True if a receiver or the ack reader thread reads the socket."""
+        return self._external_reader or (
+            self._ack_sock is self._sock and self._ack_reader is not None
+            and self._ack_reader.is_alive())
+
+    def _await_acks(self, deadline: float, futures: List[Future] = (),
+                    reads: bool = True) -> None:
+        """
+        Wait until deadline or until all futures are done (if given).
+
+        :param deadline: time.monotonic() value to stop waiting at
+        :param futures: acknowledgement requests to wait for
+        :param reads: read and match acknowledgements, False if another
+                      thread reads the socket
+        """
+        while not futures or not all(f.done() for f in futures):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if reads:
+                for msg in self._recv_until(deadline):
+                    self._acks.feed(msg)
+                self._acks.expire()
+            elif futures:
+                wait_futures(futures, remaining)
+            else:
+                time.sleep(remaining)
+
+    def send_keys(self, keys: Iterable[str], pacing: float = 0.0,
+                  ack_timeout: Optional[float] = None) -> int:
+        """
+        Send a sequence of key events to the device.
+
+        All messages are encoded up front. Without pacing they are written
+        with a single sendall call, otherwise key i is sent at i * pacing
+        seconds after the first one (scheduled on the monotonic clock, so
+        time spent sending does not add up).
+
+        Every key is registered with the AckTracker, so acknowledgements
+        are matched in order and late ones for earlier messages are not
+        counted. If no receiver or ack reader thread reads the connection,
+        already received messages are consumed first and acknowledgements
+        are read while waiting for the next slot instead of sleeping;
+        other messages are discarded then.
+
+        :param keys: key codes to send. must start with "KEY_"
+        :param pacing: minimum interval between key presses in seconds
+        :param ack_timeout: seconds to wait for outstanding acknowledgements
+                            after the last key (default: recv_timeout,
+                            0 = don't wait)
+        :return: number of keys acknowledged by the device
+        """
+        frames = [self._key_frame(k) for k in keys]
+        if ack_timeout is None:
+            ack_timeout = self._recv_timeout or 0.0
+        if not frames:
+            return 0
+        if self._sock is None:
+            self.connect()
+        reads = not self._acks_read_elsewhere()
+        if reads:
+            # acknowledgements of earlier messages, eG texts
+            while _wait_readable([self._sock], 0.0):
+                for msg in self._recv_until(time.monotonic()):
+                    self._acks.feed(msg)
+        # unanswered keys stay pending at least recv_timeout, so their late
+        # acknowledgements are not taken for later keys
+        timeout = max(ack_timeout, self._recv_timeout or 0.0) or None
+        futures = []
+        try:
+            if pacing:
+                start = time.monotonic()
+                for (i, frame) in enumerate(frames):
+                    self._await_acks(start + i * pacing, reads=reads)
+                    futures.append(self._acks.expect(timeout))
+                    self.sendall(frame)
+            else:
+                futures = [self._acks.expect(timeout) for _ in frames]
+                self.sendall(b''.join(frames))
+        except (socket.timeout, socket.error) as e:
+            self._acks.fail_all(e)
+            raise
+        self._await_acks(time.monotonic() + ack_timeout, futures, reads)
+        return sum(1 for f in futures
+                   if f.done() and not f.cancelled() and f.exception() is None)
+
+    def send_key(self, key: str, ack: bool = False,
+                 timeout: Optional[float] = None) -> Union[int, Future]:
         """
         Send a key event to the device.
 
         :param key: key code to send. must start with "KEY_"
-        :return: number of bytes transmitted via socket
+        :param ack: return a future for the acknowledgement instead of the
+                    number of bytes sent
+        :param timeout: seconds to wait for the acknowledgement (default:
+                        recv_timeout)
+        :return: number of bytes transmitted via socket, or with ack=True a
+                 concurrent.futures.Future resolving to the acknowledging
+                 Message
         """
-        msg = self._build_message(0x00, b'\x00\x00\x00' + sstv_base64(key))
-        return self.send(msg)
+        if ack:
+            return self._send_acked(self._key_frame(key), timeout)
+        return self.send(self._key_frame(key))
 
-    def send_text(self, text: str) -> int:
+    def _key_frame(self, key: str) -> bytes:
+        """
+        Get the encoded message for a key event from the frame cache.
+
+        The cache is created on first use and rebuilt if app_label changed.
+
+        :param key: key code. must start with "KEY_"
+        :return: encoded message
+        """
+        frames = self._frames
+        if frames is None or frames.app_label != self.app_label:
+            frames = self._frames = FrameCache(self.app_label)
+        return frames[key]
+
+    def send_text(self, text: str, ack: bool = False,
+                  timeout: Optional[float] = None) -> Union[int, Future]:
         """
         Send a text to the device.
 
@@ -431,11 +1214,108 @@ class SmartTV:
         interface, eG password and user name fields, search fields, etc.
 
         :param text: text to send
-        :return: number of bytes transmitted via socket
+        :param ack: return a future for the acknowledgement instead of the
+                    number of bytes sent
+        :param timeout: seconds to wait for the acknowledgement (default:
+                        recv_timeout)
+        :return: number of bytes transmitted via socket, or with ack=True a
+                 concurrent.futures.Future resolving to the acknowledging
+                 Message
         """
-        msg = self._build_message(0x01, b'\x01\x00' + sstv_base64(text))
+        msg = build_text_message(self.app_label, text)
+        if ack:
+            return self._send_acked(msg, timeout)
         return self.send(msg)
-    
+
+    def _send_acked(self, data: bytes, timeout: Optional[float]) -> Future:
+        """
+        Send data and return a future for its acknowledgement.
+
+        Unless a receiver reads from the connection, a daemon thread is
+        started which reads all received messages and matches the
+        acknowledgements. Other messages are discarded by it.
+
+        :param data: encoded key event or text message
+        :param timeout: seconds to wait for the acknowledgement
+        :return: future resolving to the acknowledging Message
+        """
+        if self._sock is None:
+            self.connect()
+        if not self._external_reader and (
+                self._ack_sock is not self._sock or
+                not self._ack_reader.is_alive()):
+            self._acks.reopen()
+            self._ack_sock = self._sock
+            self._ack_reader = threading.Thread(
+                target=self._read_acks, args=(self._sock,), daemon=True,
+                name='acks-%s' % self._sock_args[0])
+            self._ack_reader.start()
+        future = self._acks.expect(self._recv_timeout if timeout is None
+                                   else timeout)
+        try:
+            self.sendall(data)
+        except (socket.timeout, socket.error) as e:
+            self._acks.fail_all(e)
+        return future
+
+    def _read_acks(self, sock: socket.socket) -> None:
+        """
+        Ack reader thread: match acknowledgements until sock is replaced.
+
+        poll is used to wait for data, so the socket timeout shared with
+        the sending thread is never changed. A socket pair wakes the thread
+        when a request is registered while it waits without a deadline.
+        If reading fails the tracker is closed, so requests registered
+        afterwards fail instead of waiting for this thread.
+
+        :param sock: socket to read from
+        """
+        acks = self._acks
+        (wakeup_r, wakeup_w) = socket.socketpair()
+        wakeup_r.setblocking(False)
+        wakeup_w.setblocking(False)
+
+        def wakeup():
+            try:
+                wakeup_w.send(b'\x00')
+            except OSError:
+                pass
+
+        acks.wakeup = wakeup
+        try:
+            while self._sock is sock:
+                deadline = acks.next_deadline()
+                wait = None if deadline is None else \
+                    max(deadline - time.monotonic(), 0.0)
+                try:
+                    readable = _wait_readable([sock, wakeup_r], wait)
+                    if wakeup_r in readable:
+                        wakeup_r.recv(4096)
+                    if self._sock is not sock:
+                        return
+                    if sock in readable:
+                        for msg in self.recv_messages():
+                            if not acks.feed(msg):
+                                _log(logging.DEBUG, 'ack reader: ignoring %r',
+                                     msg)
+                except socket.timeout:
+                    # readable but nothing to read: closed by the device
+                    if self._sock is sock:
+                        acks.close(ConnectionError(
+                            'connection closed by device'))
+                    return
+                except (OSError, ValueError, AttributeError) as e:
+                    # AttributeError: disconnected by another thread
+                    if self._sock is sock:
+                        acks.close(e)
+                    return
+                acks.expire()
+        finally:
+            if acks.wakeup is wakeup:
+                acks.wakeup = None
+            wakeup_r.close()
+            wakeup_w.close()
+
     def _build_message(self, mode: int, payload: bytes) -> bytes:
         """
         Internal helper - build message string.
@@ -444,8 +1324,7 @@ class SmartTV:
         :param payload: message payload
         :return: encoded message
         """
-        return bytes(mode) + sstv_string(self.app_label + '.iapp.samsung') \
-            + sstv_string(payload)
+        return build_message(self.app_label, mode, payload)
 
     def set_channel(self, channel: str, delay: float = 0.1) -> None:
         """
@@ -457,10 +1336,5 @@ class SmartTV:
         :param int channel: channel to switch to (0 .. 9999)
         :param float delay: delay between key presses sent
         """
-        map_ = {'0': 'KEY_0', '1': 'KEY_1', '2': 'KEY_2', '3': 'KEY_3',
-                '4': 'KEY_4', '5': 'KEY_5', '6': 'KEY_6', '7': 'KEY_7',
-                '8': 'KEY_8', '9': 'KEY_9'}
-        for digit in '%04d' % channel:
-            self.send_key(map_[digit])
-            if delay:
-                time.sleep(delay)
+        self.send_keys(['KEY_' + digit for digit in '%04d' % int(channel)],
+                       pacing=delay, ack_timeout=0)
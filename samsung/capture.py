@@ -0,0 +1,267 @@
+"""
+Record and replay raw protocol traffic.
+
+A Recorder set as recorder attribute of a SmartTV (or of the SmartTV class
+to capture all connections) writes everything sent and received to a
+capture file:
+
+    with Recorder('field.sstvcap') as recorder:
+        device.recorder = recorder
+        ...
+
+Capture files start with an 8 byte magic value followed by records of a
+17 byte little endian header (timestamp as double, direction byte, stream
+number and data length as unsigned ints) and the raw data. Recording
+appends to existing files, each connection gets its own stream number;
+SmartTV reports every new connection with Recorder.connected, so a
+reconnect starts a new stream. Files of the first format with 2 byte
+stream numbers can still be read.
+
+Capture reads capture files using mmap, Replayer feeds the received data
+back through a FrameDecoder per stream and dispatches the messages to its
+listeners, either with the original timing or as fast as possible.
+"""
+
+import mmap
+import struct
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+from samsung import base, listener
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('Recorder', 'Capture', 'Replayer', 'SENT', 'RECEIVED')
+
+
+MAGIC = b'SSTVCAP\x02'
+SENT = 0
+RECEIVED = 1
+
+_RECORD = struct.Struct('<dBII')
+# record headers by magic value of readable formats
+_FORMATS = {
+    MAGIC: _RECORD,
+    b'SSTVCAP\x01': struct.Struct('<dBHI'),
+}
+
+Record = Tuple[float, int, int, bytes]
+
+
+class Recorder:
+    """
+    Append traffic of SmartTV connections to a capture file.
+
+    :ivar path: capture file name
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a capture file for appending, creating it if necessary.
+
+        Stream numbers continue after the highest one already in the file,
+        so appended traffic is not mixed up with earlier connections.
+
+        :param path: capture file name
+        :raises: ValueError if the file exists but is no capture file of
+                 the current format
+        """
+        self.path = path
+        self._fp = open(path, 'ab+')
+        self._fp.seek(0)
+        magic = self._fp.read(len(MAGIC))
+        self._next_stream = 0
+        if not magic:
+            self._fp.write(MAGIC)
+        elif magic != MAGIC:
+            self._fp.close()
+            raise ValueError('%s is not a capture file of the current '
+                             'format' % path)
+        else:
+            with Capture(path) as capture:
+                self._next_stream = max((r[2] + 1 for r in capture),
+                                        default=0)
+        self._streams: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return '%s(%r)' % (self.__class__.__name__, self.path)
+
+    def __enter__(self) -> 'Recorder':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def record(self, direction: int, data: bytes,
+               source: object = None) -> None:
+        """
+        Append a record.
+
+        :param direction: SENT or RECEIVED
+        :param data: raw data
+        :param source: connection the data belongs to, used to assign the
+                       stream number
+        """
+        header = _RECORD.pack(time.time(), direction, self._stream(source),
+                              len(data))
+        with self._lock:
+            self._fp.write(header + data)
+
+    def _stream(self, source: object) -> int:
+        """Get the stream number of a connection."""
+        try:
+            return self._streams[id(source)]
+        except KeyError:
+            with self._lock:
+                if id(source) not in self._streams:
+                    self._streams[id(source)] = self._next_stream
+                    self._next_stream += 1
+                return self._streams[id(source)]
+
+    def connected(self, source: object) -> None:
+        """
+        Start a new stream for a source, called on every new connection.
+
+        Data of a reconnect is not mixed with the tail of the previous
+        connection, neither is a new source that reuses the id of a
+        garbage collected one.
+
+        :param source: connection the following data belongs to
+        """
+        with self._lock:
+            self._streams[id(source)] = self._next_stream
+            self._next_stream += 1
+
+    def sent(self, data: bytes, source: object = None) -> None:
+        """Record data sent to a device, see record."""
+        self.record(SENT, data, source)
+
+    def received(self, data: bytes, source: object = None) -> None:
+        """Record data received from a device, see record."""
+        self.record(RECEIVED, data, source)
+
+    def flush(self) -> None:
+        """Write buffered records to the file."""
+        with self._lock:
+            self._fp.flush()
+
+    def close(self) -> None:
+        """Flush and close the capture file."""
+        with self._lock:
+            self._fp.close()
+
+
+class Capture:
+    """
+    Read-only view of a capture file.
+
+    The file is memory-mapped, iterating yields (timestamp, direction,
+    stream, data) tuples. A truncated last record, eG from a recorder that
+    is still writing, is ignored.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a capture file.
+
+        :param path: capture file name
+        :raises: ValueError if the file is no capture file
+        """
+        self.path = path
+        with open(path, 'rb') as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._record = _FORMATS[self._map[:len(MAGIC)]]
+        except KeyError:
+            self._map.close()
+            raise ValueError('%s is not a capture file' % path)
+
+    def __repr__(self) -> str:
+        return '%s(%r)' % (self.__class__.__name__, self.path)
+
+    def __enter__(self) -> 'Capture':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Record]:
+        buffer = self._map
+        size = len(buffer)
+        header_size = self._record.size
+        unpack = self._record.unpack_from
+        offset = len(MAGIC)
+        while offset + header_size <= size:
+            (timestamp, direction, stream, length) = unpack(buffer, offset)
+            start = offset + header_size
+            offset = start + length
+            if offset > size:
+                return
+            yield (timestamp, direction, stream, buffer[start:offset])
+
+    def close(self) -> None:
+        """Unmap the file."""
+        self._map.close()
+
+
+class Replayer(listener._ListenerMixin):
+    """
+    Dispatch messages from a capture to listeners.
+
+    Listeners are added like for the receivers and get called with the
+    message, or with the message and the stream number if streams is set.
+    """
+
+    def __init__(self, streams: bool = False,
+                 callback_pool: Optional[listener.CallbackPool] = None):
+        """
+        Constructor.
+
+        :param streams: pass the stream number to listeners
+        :param callback_pool: optional CallbackPool to run listeners in
+        """
+        super().__init__(callback_pool)
+        self.streams = streams
+
+    def replay(self, capture: Capture, speed: Optional[float] = None,
+               direction: int = RECEIVED) -> int:
+        """
+        Parse the captured traffic and dispatch all messages.
+
+        :param capture: capture to replay
+        :param speed: replay speed relative to the recording, eG 1.0 for
+                      the original timing (default: None = as fast as
+                      possible)
+        :param direction: traffic to replay, RECEIVED (default) or SENT
+        :return: number of messages dispatched
+        """
+        decoders: Dict[int, base.FrameDecoder] = {}
+        dispatch = self._dispatch
+        streams = self.streams
+        count = 0
+        first = None
+        for (timestamp, direction_, stream, data) in capture:
+            if direction_ != direction:
+                continue
+            if speed is not None:
+                if first is None:
+                    first = (timestamp, time.monotonic())
+                delay = first[1] + (timestamp - first[0]) / speed - \
+                    time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                decoder = decoders[stream]
+            except KeyError:
+                decoder = decoders[stream] = base.FrameDecoder()
+            for msg in decoder.feed(data):
+                if streams:
+                    dispatch(msg, stream)
+                else:
+                    dispatch(msg)
+                count += 1
+        return count
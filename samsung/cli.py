@@ -4,14 +4,19 @@ __author__ = 'David Poisl <david@poisl.at>'
 __version__ = '1.0.0'
 
 
-from argparse import ArgumentParser
+from argparse import ArgumentParser, FileType
 import datetime
+import functools
+import json
 import os
+import sys
+import threading
 import time
 
-from samsung import listener, base
+from samsung import base
 
-base.set_logging(True)
+# the entry points import further modules when they need them, so short
+# lived invocations only pay for what they use
 
 
 def debug_print(message):
@@ -23,10 +28,32 @@ def debug_print(message):
     print('--- %s ---\n%r\n' % (str(datetime.datetime.now()), message))
 
 
+def inventory_device():
+    """
+    Get the device to use from the inventory written by sstv_discover.
+
+    The inventory file is taken from SAMSUNG_INVENTORY in the environment
+    (default: sstv_inventory.json), approved devices are preferred.
+
+    :return: (host, port) tuple or None if no device is known
+    """
+    from samsung import discovery
+    devices = discovery.load_inventory(
+        os.environ.get('SAMSUNG_INVENTORY', discovery.DEFAULT_INVENTORY))
+    found = discovery.hosts(devices, approved_only=True) or \
+        discovery.hosts(devices)
+    return found[0] if found else None
+
+
 def listen():
     """Basic listener."""
+    from samsung import listener
     base.set_logging(True)
-    l = listener.ThreadReceiver('pyremote', '192.168.1.120')
+    if 'SAMSUNG_DEVICE' in os.environ:
+        device = (os.environ['SAMSUNG_DEVICE'], 55000)
+    else:
+        device = inventory_device() or ('192.168.1.120', 55000)
+    l = listener.ThreadReceiver('pyremote', *device)
     l.add_listener(debug_print)
     l.start()
     try:
@@ -49,39 +76,330 @@ text (eG usable for password fields, etc.).'''
     p = ArgumentParser(description=description)
     p.add_argument('-i', '--ip', dest='ip',
                    help='Device IP (mandatory if you don\'t set '
-                        'SAMSUNG_DEVICE in your environment)')
+                        'SAMSUNG_DEVICE in your environment or have an '
+                        'inventory file from sstv_discover)')
     p.add_argument('-p', '--port', dest='port', action='store', type=int,
                    default='55000', help='Device Port (default %(default)s')
     p.add_argument('-d', '--delay', dest='delay', action='store', type=float,
                    default='0.5', help='Delay between commands in seconds ('
                                        'default: %(default)s')
-    p.add_argument('keys', nargs='+')
+    p.add_argument('-n', '--no-daemon', dest='use_daemon',
+                   action='store_false',
+                   help='connect directly even if sstv_daemon is running')
+    p.add_argument('-v', '--verbose', action='store_true',
+                   help='print debug messages')
+    p.add_argument('-f', '--file', dest='file', type=FileType('r'),
+                   help='read "host[:port] command" lines from a file (- '
+                        'for stdin) and print the results as JSON lines')
+    p.add_argument('-j', '--jobs', dest='jobs', type=int, default=32,
+                   help='devices handled in parallel with --file (default '
+                        '%(default)s)')
+    p.add_argument('-t', '--ack-timeout', dest='ack_timeout', type=float,
+                   default=2.0, help='seconds to wait for each key to be '
+                                     'acknowledged with --file (default '
+                                     '%(default)s)')
+    p.add_argument('keys', nargs='*')
     args = p.parse_args()
+    if args.file is not None:
+        if args.keys:
+            p.error('commands are read from %s, don\'t pass any\n'
+                    % args.file.name)
+        return args
     if args.ip is None:
         try:
             args.ip = os.environ['SAMSUNG_DEVICE']
         except KeyError:
-            p.error('Either set SAMSUNG_DEVICE in the environment or specify '
-                    'the device IP\n')
+            device = inventory_device()
+            if device is None:
+                p.error('Either set SAMSUNG_DEVICE in the environment, run '
+                        'sstv_discover or specify the device IP\n')
+            (args.ip, args.port) = device
     if len(args.keys) == 0:
         p.error('Please specify one or more commands to send\n')
     return args
 
 
-def remote():
-    """Entry point to remote control a TV"""
-    (options, args) = parse_remote_options()
-    device = base.SmartTV('pyremote', host=options.ip, port=options.port)
-    for arg in args:
+def command_steps(commands):
+    """
+    Convert command line arguments to steps for daemon.run_steps.
+
+    Consecutive key codes and channels (eG CH101) are sent as one batch of
+    keys, everything else is sent as text.
+
+    :param commands: command line arguments
+    :return: list of steps
+    """
+    steps = []
+    keys = []
+    for arg in commands:
         if arg.startswith('KEY_'):
-            print('%r' % device.send_key(arg))
+            keys.append(arg)
         elif arg.startswith('CH'):
-            for digit in '%04d' % int(arg[2:]):
-                device.send_key('KEY_' + digit)
+            keys.extend('KEY_' + digit for digit in '%04d' % int(arg[2:]))
         else:
-            print('%r' % device.send_text(arg))
-        time.sleep(options.delay)
-        print('%r' % base.Message.parse(device.recv()))
-        print('%r' % base.Message.parse(device.recv()))
-        print('%r' % base.Message.parse(device.recv()))
-    device.disconnect()
+            if keys:
+                steps.append(['keys', keys])
+                keys = []
+            steps.append(['text', arg])
+    if keys:
+        steps.append(['keys', keys])
+    return steps
+
+
+def parse_command_line(line, port=55000):
+    """
+    Parse a line of a command file.
+
+    Lines consist of a host, optionally with a port (eG 10.0.0.5:55000,
+    IPv6 addresses in brackets: [fe80::1]:55000), and a command as
+    accepted by sstv_remote: a key code, a channel (eG CH101) or a text,
+    which may contain spaces.
+
+    :param line: line to parse
+    :param port: port if the line has none
+    :return: ((host, port), command) tuple, None for empty lines and
+             comments (starting with #)
+    :raise: ValueError if the line has no command or an invalid host
+    """
+    line = line.rstrip('\r\n').lstrip()
+    if not line.strip() or line.startswith('#'):
+        return None
+    parts = line.split(None, 1)
+    if len(parts) < 2:
+        raise ValueError('no command for %s' % parts[0])
+    (host, command) = parts
+    if host.startswith('['):
+        (host, bracket, rest) = host[1:].partition(']')
+        if not bracket or rest and not rest.startswith(':'):
+            raise ValueError('invalid host %s' % parts[0])
+        if rest:
+            port = int(rest[1:])
+    elif host.count(':') > 1:
+        raise ValueError('IPv6 address %s needs brackets, eG [%s]:%d' % (
+            host, host, port))
+    elif ':' in host:
+        (host, port) = host.split(':')
+        port = int(port)
+    return ((host, port), command)
+
+
+def command_action(command):
+    """
+    Create a pool action sending a command, paced by acknowledgements.
+
+    Every key is sent after the previous one was acknowledged or its
+    acknowledgement timed out.
+
+    :param command: key code, channel or text, see command_steps
+    :return: callable taking a SmartTV and returning the number of keys or
+             texts acknowledged and the number sent
+    """
+    steps = command_steps([command])
+
+    def action(tv):
+        acked = 0
+        sent = 0
+        for step in steps:
+            if step[0] == 'keys':
+                futures = (tv.send_key(key, ack=True) for key in step[1])
+            else:
+                futures = (tv.send_text(step[1], ack=True),)
+            for future in futures:
+                sent += 1
+                try:
+                    future.result()
+                    acked += 1
+                except TimeoutError:
+                    pass
+        return (acked, sent)
+    return action
+
+
+def remote_bulk(options):
+    """
+    Send the commands of a command file, see parse_command_line.
+
+    Lines are streamed to a SmartTVPool, so commands start as soon as they
+    are read. Every device keeps one connection, its commands are sent in
+    order while devices are handled in parallel. One JSON object is
+    printed per command with the line number, host, port, command,
+    acked and sent counts, ok, seconds and error.
+
+    :param options: parsed command line options
+    :return: exit status, 1 if any command failed
+    """
+    from samsung import pool
+    output_lock = threading.Lock()
+    failures = []
+
+    def report(result):
+        with output_lock:
+            if not result['ok']:
+                failures.append(result)
+            print(json.dumps(result), flush=True)
+
+    def done(number, device, command, future):
+        outcome = future.result()
+        (acked, sent) = outcome.result or (0, 0)
+        report({'line': number, 'host': device[0], 'port': device[1],
+                'command': command, 'acked': acked, 'sent': sent,
+                'ok': outcome.error is None and acked == sent,
+                'seconds': round(outcome.latency, 6),
+                'error': None if outcome.error is None else '%s: %s' % (
+                    outcome.error.__class__.__name__, outcome.error)})
+
+    fp = options.file
+    futures = []
+    with pool.SmartTVPool('pyremote', options.port, options.jobs,
+                          recv_timeout=options.ack_timeout) as devices:
+        try:
+            for (number, line) in enumerate(fp, 1):
+                try:
+                    parsed = parse_command_line(line, options.port)
+                    if parsed is None:
+                        continue
+                    (device, command) = parsed
+                    action = command_action(command)
+                except ValueError as e:
+                    report({'line': number, 'ok': False,
+                            'error': 'ValueError: %s' % e})
+                    continue
+                future = devices.submit(device, action)
+                future.add_done_callback(functools.partial(
+                    done, number, device, command))
+                futures.append(future)
+        finally:
+            if fp is not sys.stdin:
+                fp.close()
+            for future in futures:
+                future.exception()
+    return 1 if failures else 0
+
+
+def remote():
+    """Entry point to remote control a TV"""
+    from samsung import daemon
+    options = parse_remote_options()
+    base.set_logging(options.verbose)
+    if options.file is not None:
+        return remote_bulk(options)
+    steps = command_steps(options.keys)
+    for step in steps:
+        if step[0] == 'keys':
+            step.append(options.delay)
+    client = None
+    if options.use_daemon:
+        client = daemon.DaemonClient()
+        try:
+            client.connect()
+        except OSError:
+            # no daemon running, connect directly
+            client = None
+    if client is not None:
+        # the daemon might have sent the keys already when a request
+        # fails, so don't fall back to a direct connection
+        with client:
+            try:
+                results = client.send(options.ip, options.port, steps)
+            except (OSError, daemon.DaemonError) as e:
+                print('sstv_daemon: %s' % e, file=sys.stderr)
+                return 1
+    else:
+        device = base.SmartTV('pyremote', host=options.ip, port=options.port)
+        try:
+            results = daemon.run_steps(device, steps)
+        except (OSError, base.AuthenticationError) as e:
+            print('sstv_remote: %s:%d: %s' % (options.ip, options.port, e),
+                  file=sys.stderr)
+            return 1
+        finally:
+            if device._sock is not None:
+                device.disconnect()
+    for (step, result) in zip(steps, results):
+        if step[0] == 'keys':
+            print('%d/%d keys confirmed' % (result, len(step[1])))
+        else:
+            print('%r' % result)
+
+
+def scene():
+    """Entry point to run a scene on one or many devices."""
+    from samsung import discovery, macro, pool
+    p = ArgumentParser(description='Run a scene (JSON or YAML file, see '
+                                   'samsung.macro) on devices.')
+    p.add_argument('scene', help='scene file')
+    p.add_argument('-i', '--ip', dest='ips', action='append',
+                   help='Device IP, may be given multiple times (default: '
+                        'SAMSUNG_DEVICE or all approved devices of the '
+                        'inventory)')
+    p.add_argument('-p', '--port', type=int, default=55000,
+                   help='Device Port (default %(default)s)')
+    args = p.parse_args()
+    if args.ips:
+        devices = [(ip, args.port) for ip in args.ips]
+    elif 'SAMSUNG_DEVICE' in os.environ:
+        devices = [(os.environ['SAMSUNG_DEVICE'], args.port)]
+    else:
+        devices = discovery.hosts(discovery.load_inventory(
+            os.environ.get('SAMSUNG_INVENTORY', discovery.DEFAULT_INVENTORY)),
+            approved_only=True)
+    if not devices:
+        p.error('no devices given and none found in the inventory')
+    compiled = macro.compile_scene(macro.load_scene(args.scene), 'pyremote')
+    with pool.SmartTVPool('pyremote', args.port) as devices_pool:
+        result = compiled.run_many(devices_pool, devices)
+    for (device, error) in result.failed.items():
+        print('%s:%d failed: %s' % (device[0], device[1], error))
+    print('%d/%d devices done in %.3fs' % (len(result.succeeded),
+                                           len(result.results),
+                                           result.elapsed))
+
+
+def run_daemon():
+    """Entry point for the daemon holding device connections."""
+    from samsung import daemon
+    p = ArgumentParser(description='Keep device connections open and '
+                                   'execute commands from sstv_remote.')
+    p.add_argument('-s', '--socket', default=daemon.socket_path(),
+                   help='control socket (default %(default)s)')
+    p.add_argument('-v', '--verbose', action='store_true',
+                   help='print debug messages')
+    args = p.parse_args()
+    base.set_logging(args.verbose)
+    server = daemon.ControlServer(args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def discover():
+    """Entry point to scan a network for devices."""
+    import asyncio
+    from samsung import discovery
+    p = ArgumentParser(description='Find Samsung devices in a network and '
+                                   'write them to an inventory file.')
+    p.add_argument('network', help='network to scan, eG 192.168.0.0/22')
+    p.add_argument('-p', '--port', type=int, default=55000,
+                   help='Device Port (default %(default)s)')
+    p.add_argument('-o', '--output',
+                   default=os.environ.get('SAMSUNG_INVENTORY',
+                                          discovery.DEFAULT_INVENTORY),
+                   help='inventory file (default %(default)s)')
+    p.add_argument('-a', '--authenticate', action='store_true',
+                   help='try to authenticate with each device found')
+    p.add_argument('-c', '--concurrency', type=int, default=512,
+                   help='concurrent connection attempts (default '
+                        '%(default)s)')
+    p.add_argument('-t', '--timeout', type=float, default=0.5,
+                   help='connect timeout in seconds (default %(default)s)')
+    args = p.parse_args()
+    devices = asyncio.run(discovery.scan(
+        args.network, args.port, args.concurrency, args.timeout,
+        args.authenticate))
+    for device in devices:
+        print('%s:%d %s' % (device['host'], device['port'],
+                            device.get('auth', '')))
+    discovery.save_inventory(args.output, devices)
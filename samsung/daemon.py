@@ -0,0 +1,267 @@
+"""
+Long running daemon holding authenticated device connections.
+
+The daemon keeps a SmartTVPool of connections and accepts commands on a
+Unix socket, so short lived clients like sstv_remote don't pay the connect
+and authentication cost (or an on-screen confirmation) on every call.
+
+The protocol is one JSON object per line in both directions. A request
+names an operation and its arguments, the reply contains "ok" and either
+"result" or "error":
+
+    {"op": "send", "host": "10.0.0.5", "port": 55000,
+     "steps": [["keys", ["KEY_MUTE"], 0.5], ["text", "hello"]]}
+    {"ok": true, "result": [1, 33]}
+
+Operations are "send", "ping", "status" and "shutdown".
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from typing import Iterable, List, Optional, Sequence
+
+from samsung import base, pool
+from samsung.base import _log
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('ControlServer', 'DaemonClient', 'DaemonError', 'socket_path',
+           'run_steps')
+
+
+class DaemonError(Exception):
+    """Error reported by the daemon."""
+    pass
+
+
+def socket_path() -> str:
+    """
+    Get the control socket path.
+
+    Taken from SAMSUNG_DAEMON_SOCKET in the environment, defaults to
+    sstv_daemon.sock in XDG_RUNTIME_DIR or a per-user file in /tmp.
+
+    :return: path of the Unix socket
+    """
+    try:
+        return os.environ['SAMSUNG_DAEMON_SOCKET']
+    except KeyError:
+        pass
+    try:
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'sstv_daemon.sock')
+    except KeyError:
+        return '/tmp/sstv_daemon-%d.sock' % os.getuid()
+
+
+def run_steps(device: base.SmartTV, steps: Iterable[Sequence]) -> List[int]:
+    """
+    Execute command steps on a connected device.
+
+    Steps are ["keys", [key, ...], pacing] to send key events with
+    SmartTV.send_keys or ["text", text] to send a text.
+
+    :param device: connected SmartTV instance
+    :param steps: steps to execute in order
+    :return: per step the number of keys acknowledged or bytes sent
+    """
+    results = []
+    for step in steps:
+        if step[0] == 'keys':
+            results.append(device.send_keys(step[1], pacing=step[2]))
+        elif step[0] == 'text':
+            results.append(device.send_text(step[1]))
+        else:
+            raise ValueError('unknown step %r' % (step[0],))
+    return results
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handle the requests of one control connection."""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                reply = {'ok': True,
+                         'result': self.server.execute(request)}
+            except Exception as e:
+                _log(logging.INFO, 'daemon request failed: %r', e)
+                reply = {'ok': False, 'error': '%s: %s' % (
+                    e.__class__.__name__, e)}
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class ControlServer(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    """
+    Unix socket server forwarding commands to pooled connections.
+
+    :ivar pool: SmartTVPool holding the device connections
+    """
+    daemon_threads = True
+
+    def __init__(self, path: Optional[str] = None,
+                 device_pool: Optional[pool.SmartTVPool] = None):
+        """
+        Constructor.
+
+        Refuses to start if another daemon is listening on path, a stale
+        socket file left by a crashed daemon is removed.
+
+        :param path: socket path (default: socket_path())
+        :param device_pool: pool to use (default: new pool with the
+                            'pyremote' application label)
+        :raises: DaemonError if a daemon is already running
+        """
+        self.path = socket_path() if path is None else path
+        self.pool = pool.SmartTVPool('pyremote') if device_pool is None \
+            else device_pool
+        if os.path.exists(self.path):
+            with DaemonClient(self.path) as client:
+                running = client.running()
+            if running:
+                raise DaemonError('daemon already running on %s' % self.path)
+            os.unlink(self.path)
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(self.path, _Handler)
+        finally:
+            os.umask(old_umask)
+
+    def execute(self, request: dict) -> object:
+        """
+        Execute a single request.
+
+        :param request: decoded request object
+        :return: result to send to the client
+        """
+        op = request.get('op')
+        if op == 'send':
+            device = (request['host'], request.get('port', self.pool.port))
+            return self.pool.call(device,
+                                  lambda tv: run_steps(tv, request['steps']))
+        elif op == 'ping':
+            return 'pong'
+        elif op == 'status':
+            with self.pool._lock:
+                connections = list(self.pool._connections.items())
+            return [{'host': k[0], 'port': k[1], 'app_label': k[2],
+                     'connected': tv._sock is not None}
+                    for (k, tv) in connections]
+        elif op == 'shutdown':
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return True
+        raise ValueError('unknown operation %r' % (op,))
+
+    def server_close(self) -> None:
+        """Close the socket, remove the socket file and all connections."""
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self.pool.close()
+
+
+class DaemonClient:
+    """
+    Client for the daemon control socket.
+
+    :ivar path: socket path
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 timeout: Optional[float] = None):
+        """
+        Constructor.
+
+        :param path: socket path (default: socket_path())
+        :param timeout: socket timeout in seconds (default: None=forever)
+        """
+        self.path = socket_path() if path is None else path
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._rfile = None
+
+    def __enter__(self) -> 'DaemonClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def connect(self) -> None:
+        """
+        Connect to the daemon.
+
+        :raises: OSError if no daemon is running
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._rfile = sock.makefile('rb')
+
+    def close(self) -> None:
+        """Close the connection to the daemon."""
+        if self._sock is not None:
+            self._rfile.close()
+            self._sock.close()
+        self._sock = None
+        self._rfile = None
+
+    def running(self) -> bool:
+        """True if a daemon accepts connections on self.path."""
+        try:
+            self.request('ping')
+        except (OSError, DaemonError):
+            return False
+        return True
+
+    def request(self, op: str, **kwargs) -> object:
+        """
+        Send a request and wait for the reply.
+
+        :param op: operation name
+        :param kwargs: arguments of the operation
+        :return: result of the operation
+        :raises: OSError if the daemon is not reachable, DaemonError if the
+                 operation failed
+        """
+        if self._sock is None:
+            self.connect()
+        kwargs['op'] = op
+        try:
+            self._sock.sendall(json.dumps(kwargs).encode('utf-8') + b'\n')
+            line = self._rfile.readline()
+        except OSError:
+            self.close()
+            raise
+        if not line:
+            self.close()
+            raise ConnectionError('daemon closed the connection')
+        reply = json.loads(line)
+        if not reply['ok']:
+            raise DaemonError(reply['error'])
+        return reply['result']
+
+    def send(self, host: str, port: int, steps: List[Sequence]) -> List[int]:
+        """
+        Execute command steps on a device, see run_steps.
+
+        :param host: device address
+        :param port: device port
+        :param steps: steps to execute
+        :return: per step the number of keys acknowledged or bytes sent
+        """
+        return self.request('send', host=host, port=port, steps=steps)
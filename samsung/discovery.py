@@ -0,0 +1,157 @@
+"""
+Discover Samsung devices in a network.
+
+scan() probes all addresses of a network for an open remote control port
+using asyncio, with a limit on concurrent connection attempts. Devices
+found can optionally be fingerprinted with the authentication handshake.
+Results are stored in a JSON inventory file which can be loaded by the
+command line tools and fleet code:
+
+    devices = asyncio.run(scan('192.168.0.0/22'))
+    save_inventory('devices.json', devices)
+    pool.send_key(hosts(load_inventory('devices.json')), 'KEY_MUTE')
+"""
+
+import asyncio
+import ipaddress
+import json
+import logging
+import time
+from typing import Iterable, List, Optional
+
+from samsung import aio, base
+from samsung.base import _log
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('probe', 'fingerprint', 'scan', 'load_inventory',
+           'save_inventory', 'hosts', 'DEFAULT_INVENTORY')
+
+
+DEFAULT_INVENTORY = 'sstv_inventory.json'
+
+
+async def probe(host: str, port: int = 55000,
+                timeout: float = 0.5) -> bool:
+    """
+    Check if a TCP port accepts connections.
+
+    :param host: address to probe
+    :param port: port to probe
+    :param timeout: connect timeout in seconds
+    :return: True if the port is open
+    """
+    try:
+        (reader, writer) = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def fingerprint(host: str, port: int = 55000,
+                      app_label: str = 'pyremote',
+                      timeout: float = 2.0) -> str:
+    """
+    Try the authentication handshake with a device.
+
+    :param host: device address
+    :param port: remote control port
+    :param app_label: application label to authenticate with
+    :param timeout: seconds to wait for the authentication response
+    :return: 'approved', 'denied', 'unconfirmed' (the device waits for a
+             confirmation by the user), 'timeout' (no authentication
+             response within timeout) or 'error'
+    """
+    device = aio.AsyncSmartTV(app_label, host, port, auth_timeout=timeout)
+    device._auth_tries = 1
+    try:
+        await device.connect()
+    except base.AuthenticationError:
+        if device._pending_confirmation:
+            return 'unconfirmed'
+        return 'denied' if device._auth_answered else 'timeout'
+    except (OSError, ValueError, asyncio.TimeoutError) as e:
+        _log(logging.DEBUG, 'fingerprint %s:%d failed: %r', host, port, e)
+        return 'error'
+    await device.disconnect()
+    return 'approved'
+
+
+async def scan(network: str, port: int = 55000, concurrency: int = 512,
+               timeout: float = 0.5, authenticate: bool = False,
+               app_label: str = 'pyremote') -> List[dict]:
+    """
+    Find devices with an open remote control port in a network.
+
+    :param network: network in CIDR notation, eG '192.168.0.0/22', or a
+                    single address
+    :param port: remote control port
+    :param concurrency: maximum number of concurrent connection attempts,
+                        including authentication handshakes
+    :param timeout: connect timeout per address in seconds
+    :param authenticate: also try the authentication handshake
+    :param app_label: application label for the handshake
+    :return: inventory entries (dicts with host, port, seen and, with
+             authenticate, auth) for all devices found, sorted by address
+    """
+    net = ipaddress.ip_network(network, strict=False)
+    addresses = list(net.hosts()) or [net.network_address]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(address) -> Optional[dict]:
+        host = str(address)
+        async with semaphore:
+            if not await probe(host, port, timeout):
+                return None
+            entry = {'host': host, 'port': port, 'seen': time.time()}
+            if authenticate:
+                entry['auth'] = await fingerprint(host, port, app_label)
+            return entry
+
+    results = await asyncio.gather(*(check(a) for a in addresses))
+    return [r for r in results if r is not None]
+
+
+def load_inventory(path: str) -> List[dict]:
+    """
+    Load an inventory file written by save_inventory.
+
+    :param path: file name
+    :return: inventory entries, empty if the file does not exist
+    """
+    try:
+        with open(path) as fp:
+            return json.load(fp)['devices']
+    except FileNotFoundError:
+        return []
+
+
+def save_inventory(path: str, devices: Iterable[dict]) -> None:
+    """
+    Write an inventory file.
+
+    :param path: file name
+    :param devices: inventory entries as returned by scan
+    """
+    with open(path, 'w') as fp:
+        json.dump({'version': 1, 'devices': list(devices)}, fp, indent=1)
+
+
+def hosts(devices: Iterable[dict], approved_only: bool = False) -> list:
+    """
+    Get (host, port) tuples from inventory entries.
+
+    :param devices: inventory entries
+    :param approved_only: skip devices that did not approve authentication
+    :return: list of (host, port) tuples
+    """
+    return [(d['host'], d['port']) for d in devices
+            if not approved_only or d.get('auth') == 'approved']
@@ -0,0 +1,341 @@
+"""
+Fake Samsung Smart TV for testing and benchmarking.
+
+FakeSmartTV is a local TCP server speaking the remote control protocol of
+port 55000: it answers authentication requests, acknowledges key events
+and texts and can send floods of STATE_CHANGE messages, either coalesced
+into few TCP segments or split into small pieces. This allows exercising
+SmartTV and the receivers without a device.
+
+Run "python -m samsung.fake" to start a server from the command line.
+"""
+
+from argparse import ArgumentParser
+import logging
+import socket
+import threading
+import time
+from typing import Iterable, List, Optional, Sequence, Union
+
+from samsung import base
+from samsung.base import _log, ResponsePayload, ResponseType
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('FakeSmartTV', 'encode_response')
+
+
+def encode_response(type_: Union[ResponseType, int],
+                    payload: Union[ResponsePayload, str, bytes],
+                    sender: str = 'iapp.samsung') -> bytes:
+    """
+    Encode a message as sent by a device.
+
+    :param type_: response type
+    :param payload: response payload
+    :param sender: sender name
+    :return: encoded message
+    """
+    if isinstance(type_, ResponseType):
+        type_ = type_.value
+    if isinstance(payload, ResponsePayload):
+        payload = payload.value
+    return bytes((type_,)) + base.sstv_string(sender) + \
+        base.sstv_string(payload)
+
+
+class _Client:
+    """Connection of a single client to the fake device."""
+
+    def __init__(self, sock: socket.socket, address: tuple):
+        self.sock = sock
+        self.address = address
+        self.authenticated = False
+        self.lock = threading.Lock()
+
+    def sendall(self, data: bytes, segment_size: Optional[int] = None,
+                segment_delay: float = 0.0) -> None:
+        """
+        Send data, optionally split into segments of segment_size bytes.
+
+        :param data: data to send
+        :param segment_size: maximum bytes per send call
+        :param segment_delay: pause between segments in seconds
+        """
+        with self.lock:
+            if not segment_size:
+                self.sock.sendall(data)
+                return
+            for start in range(0, len(data), segment_size):
+                self.sock.sendall(data[start:start + segment_size])
+                if segment_delay:
+                    time.sleep(segment_delay)
+
+
+class FakeSmartTV:
+    """
+    Local server emulating a Samsung Smart TV.
+
+    Authentication requests are answered with the payloads in
+    auth_responses, one message each, so eG (AUTH_NEED_CONFIRMATION,
+    AUTH_OK) emulates a user confirming on screen. If the last response is
+    AUTH_ACCESS_DENIED or AUTH_TIMEOUT the connection is closed afterwards.
+
+    Key events and texts are acknowledged with a KEY_CONFIRM message.
+    All client messages are counted and the last max_history of them are
+    kept in received.
+
+    :ivar received: messages received from clients
+    :ivar keys_received: number of key events and texts received
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 auth_responses: Sequence[ResponsePayload] = (
+                     ResponsePayload.AUTH_OK,),
+                 auth_delay: float = 0.0, ack_keys: bool = True,
+                 ack_delay: float = 0.0, max_history: int = 1000):
+        """
+        Constructor.
+
+        :param host: IPv4 or IPv6 address to listen on (default: 127.0.0.1)
+        :param port: port to listen on (default: 0 = choose a free port)
+        :param auth_responses: payloads to answer authentication with
+        :param auth_delay: delay between authentication responses in seconds
+        :param ack_keys: acknowledge key events and texts
+        :param ack_delay: delay before acknowledging in seconds
+        :param max_history: number of received messages to keep
+        """
+        self.auth_responses = tuple(auth_responses)
+        self.auth_delay = auth_delay
+        self.ack_keys = ack_keys
+        self.ack_delay = ack_delay
+        self.max_history = max_history
+        self.received: List[base.Message] = []
+        self.keys_received = 0
+        self._clients: List[_Client] = []
+        self._lock = threading.Lock()
+        (family, type_, proto, _, address) = socket.getaddrinfo(
+            host, port, type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE)[0]
+        self._server = socket.socket(family, type_, proto)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(address)
+        self._server.listen(128)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def __repr__(self) -> str:
+        return '%s(%r, %r)' % (self.__class__.__name__, *self.address)
+
+    def __enter__(self) -> 'FakeSmartTV':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def address(self) -> tuple:
+        """(host, port) the server listens on."""
+        return self._server.getsockname()[:2]
+
+    @property
+    def clients(self) -> int:
+        """Number of connected clients."""
+        return len(self._clients)
+
+    @property
+    def authenticated_clients(self) -> int:
+        """Number of clients that passed authentication."""
+        with self._lock:
+            return sum(1 for c in self._clients if c.authenticated)
+
+    def start(self) -> None:
+        """Start accepting connections in a background thread."""
+        self._stopping = False
+        self._thread = threading.Thread(target=self._accept, daemon=True,
+                                        name='%r' % self)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Close the server and all client connections."""
+        self._stopping = True
+        try:
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            self._close(client)
+        if self._thread is not None:
+            self._thread.join()
+
+    def disconnect_clients(self) -> int:
+        """
+        Close all client connections but keep accepting new ones.
+
+        :return: number of connections closed
+        """
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            self._close(client)
+        return len(clients)
+
+    def _accept(self) -> None:
+        """Accept loop."""
+        while not self._stopping:
+            try:
+                (sock, address) = self._server.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(sock, address)
+            with self._lock:
+                self._clients.append(client)
+            threading.Thread(target=self._serve, args=(client,),
+                             daemon=True).start()
+
+    def _close(self, client: _Client) -> None:
+        """Close and forget a client connection."""
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        try:
+            client.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        client.sock.close()
+
+    def _serve(self, client: _Client) -> None:
+        """Handle messages of a single client."""
+        decoder = base.FrameDecoder()
+        try:
+            while not self._stopping:
+                data = client.sock.recv(4096)
+                if not data:
+                    break
+                for msg in decoder.feed(data):
+                    if not self._handle(client, msg):
+                        return
+        except OSError:
+            pass
+        finally:
+            self._close(client)
+
+    def _handle(self, client: _Client, msg: base.Message) -> bool:
+        """
+        React to a message from a client.
+
+        :param client: sending client
+        :param msg: received message
+        :return: False if the connection should be closed
+        """
+        with self._lock:
+            self.received.append(msg)
+            del self.received[:-self.max_history]
+        if not client.authenticated:
+            return self._authenticate(client)
+        with self._lock:
+            self.keys_received += 1
+        if self.ack_keys:
+            if self.ack_delay:
+                time.sleep(self.ack_delay)
+            client.sendall(encode_response(ResponseType.KEY_CONFIRM,
+                                           ResponsePayload.KEY_OK))
+        return True
+
+    def _authenticate(self, client: _Client) -> bool:
+        """
+        Send the configured authentication responses.
+
+        :param client: client that sent the authentication request
+        :return: False if authentication failed
+        """
+        denied = self.auth_responses and self.auth_responses[-1] in (
+            ResponsePayload.AUTH_ACCESS_DENIED, ResponsePayload.AUTH_TIMEOUT)
+        # mark the client before answering, so a flood sent right after the
+        # client saw the response also reaches it
+        client.authenticated = not denied
+        for (i, response) in enumerate(self.auth_responses):
+            if i and self.auth_delay:
+                time.sleep(self.auth_delay)
+            client.sendall(encode_response(ResponseType.KEY_CONFIRM,
+                                           response))
+        if denied:
+            _log(logging.DEBUG, 'fake: rejected %r', client.address)
+            return False
+        return True
+
+    def broadcast(self, data: bytes, segment_size: Optional[int] = None,
+                  segment_delay: float = 0.0) -> int:
+        """
+        Send raw data to all authenticated clients.
+
+        :param data: data to send
+        :param segment_size: split data into sends of this many bytes
+        :param segment_delay: pause between segments in seconds
+        :return: number of clients the data was sent to
+        """
+        with self._lock:
+            clients = [c for c in self._clients if c.authenticated]
+        for client in clients:
+            try:
+                client.sendall(data, segment_size, segment_delay)
+            except OSError:
+                self._close(client)
+        return len(clients)
+
+    def flood(self, count: int,
+              payloads: Iterable[ResponsePayload] = (
+                  ResponsePayload.STATUS_SHOWING_OVERLAY,
+                  ResponsePayload.STATUS_SHOWING_TV),
+              coalesce: bool = True, segment_size: Optional[int] = None,
+              segment_delay: float = 0.0) -> int:
+        """
+        Send count STATE_CHANGE messages to all clients.
+
+        :param count: number of messages to send
+        :param payloads: payloads to cycle through
+        :param coalesce: send all messages with one call instead of one call
+                         per message
+        :param segment_size: split the data into sends of this many bytes,
+                             eG 1 to send every byte on its own
+        :param segment_delay: pause between segments in seconds
+        :return: number of clients the messages were sent to
+        """
+        frames = [encode_response(ResponseType.STATE_CHANGE, p)
+                  for p in payloads]
+        messages = [frames[i % len(frames)] for i in range(count)]
+        if coalesce or segment_size:
+            return self.broadcast(b''.join(messages), segment_size,
+                                  segment_delay)
+        sent = 0
+        for message in messages:
+            sent = self.broadcast(message)
+        return sent
+
+
+def main():
+    """Run a fake device until interrupted."""
+    p = ArgumentParser(description='Emulate a Samsung Smart TV.')
+    p.add_argument('-H', '--host', default='127.0.0.1',
+                   help='address to listen on (default %(default)s)')
+    p.add_argument('-p', '--port', type=int, default=55000,
+                   help='port to listen on (default %(default)s)')
+    args = p.parse_args()
+    server = FakeSmartTV(args.host, args.port)
+    print('listening on %s:%d' % server.address)
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,458 @@
+"""
+Control large fleets of devices from several processes.
+
+Parsing, dispatching and logging for thousands of connections saturate a
+single core. Fleet spreads the connections over worker processes, devices
+are assigned to workers by consistent hashing of the host name, so adding
+workers only moves a fraction of the devices. Each worker receives from
+its devices with a MultiReceiver and sends the messages back over a pipe
+in batches; the parent dispatches them to listeners added with
+add_listener, which get called with the Message and the (host, port)
+tuple of the device:
+
+    with Fleet('pyremote', workers=4) as fleet:
+        fleet.add_listener(print)
+        wait([fleet.add_device(host) for host in hosts])
+        fleet.send_key('10.0.0.5', 'KEY_MUTE').result()
+
+Commands return concurrent.futures.Future instances resolved with the
+result from the worker. Commands for the same device are executed in the
+order they were issued.
+"""
+
+import bisect
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import itertools
+import logging
+import multiprocessing
+from multiprocessing.connection import wait as wait_connections
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from samsung import base, listener
+from samsung.base import _log
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('Fleet', 'HashRing', 'WorkerError')
+
+
+Device = Tuple[str, int]
+
+
+class WorkerError(Exception):
+    """Command failed in a worker process."""
+    pass
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping host names to shards.
+
+    Every shard is placed on the ring replicas times, a host belongs to the
+    first shard point following its own hash.
+    """
+
+    def __init__(self, shards: int, replicas: int = 64):
+        """
+        Constructor.
+
+        :param shards: number of shards
+        :param replicas: points per shard on the ring
+        """
+        points = sorted((self._hash('%d-%d' % (shard, i)), shard)
+                        for shard in range(shards) for i in range(replicas))
+        self._hashes = [p[0] for p in points]
+        self._shards = [p[1] for p in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8],
+                              'little')
+
+    def shard(self, host: str) -> int:
+        """
+        Get the shard of a host.
+
+        :param host: host name or address
+        :return: shard number
+        """
+        i = bisect.bisect(self._hashes, self._hash(host))
+        return self._shards[i % len(self._shards)]
+
+
+class _Worker:
+    """Worker process state, see _worker_main."""
+
+    def __init__(self, conn, app_label: str, auth_timeout: float,
+                 recv_timeout: float, threads: int):
+        self.conn = conn
+        self.app_label = app_label
+        self.auth_timeout = auth_timeout
+        self.recv_timeout = recv_timeout
+        self.devices: Dict[Device, base.SmartTV] = {}
+        self.receiver = listener.MultiReceiver(name='fleet-receiver')
+        self.receiver.add_listener(self.on_message)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        # commands waiting per device, executed in order
+        self.queues: Dict[Device, collections.deque] = {}
+        self.queues_cond = threading.Condition()
+        self.events = []
+        self.send_lock = threading.Lock()
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def on_message(self, msg: base.Message, device: base.SmartTV) -> None:
+        """Queue a message for the parent."""
+        with self.cond:
+            self.events.append((device._sock_args[0], device._sock_args[1],
+                                msg.type, msg.raw_payload, msg.raw_sender))
+            self.cond.notify()
+
+    def send(self, item: tuple) -> None:
+        with self.send_lock:
+            self.conn.send(item)
+
+    def flush_loop(self) -> None:
+        """Send queued messages to the parent in batches."""
+        while True:
+            with self.cond:
+                while not self.events and not self.closed:
+                    self.cond.wait()
+                if not self.events:
+                    return
+                (events, self.events) = (self.events, [])
+            self.send(('events', events))
+
+    def run(self) -> None:
+        """Execute commands until the parent stops the worker."""
+        self.receiver.start()
+        flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        flusher.start()
+        while True:
+            try:
+                command = self.conn.recv()
+            except EOFError:
+                break
+            if command[0] == 'stop':
+                break
+            self.submit(command)
+        with self.queues_cond:
+            self.queues_cond.wait_for(lambda: not self.queues)
+        self.executor.shutdown(wait=True)
+        self.receiver.join()
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        flusher.join()
+        self.send(('stopped',))
+
+    def submit(self, command: tuple) -> None:
+        """
+        Queue a command, commands for the same device run in order.
+
+        Devices take turns on the executor threads like in
+        SmartTVPool.submit.
+        """
+        if command[2] is None:
+            self.executor.submit(self.execute, command)
+            return
+        device = tuple(command[2])
+        with self.queues_cond:
+            queue = self.queues.get(device)
+            idle = queue is None
+            if idle:
+                queue = self.queues[device] = collections.deque()
+            queue.append(command)
+        if idle:
+            self.executor.submit(self.run_queued, device)
+
+    def run_queued(self, device: Device) -> None:
+        """Execute the next command of a device, then requeue it."""
+        with self.queues_cond:
+            command = self.queues[device].popleft()
+        self.execute(command)
+        with self.queues_cond:
+            if not self.queues[device]:
+                del self.queues[device]
+                self.queues_cond.notify_all()
+                return
+        self.executor.submit(self.run_queued, device)
+
+    def execute(self, command: tuple) -> None:
+        """Execute a command and send its result to the parent."""
+        (op, request_id, device) = command[:3]
+        try:
+            result = getattr(self, 'op_' + op)(device, *command[3:])
+        except Exception as e:
+            self.send(('result', request_id, None,
+                       '%s: %s' % (e.__class__.__name__, e)))
+        else:
+            self.send(('result', request_id, result, None))
+
+    def op_add(self, device: Device) -> bool:
+        if device in self.devices:
+            return False
+        tv = base.SmartTV(self.app_label, device[0], device[1],
+                          self.auth_timeout, self.recv_timeout)
+        self.receiver.add_device(tv)
+        self.devices[device] = tv
+        return True
+
+    def op_remove(self, device: Device) -> bool:
+        tv = self.devices.pop(device, None)
+        if tv is None:
+            return False
+        self.receiver.remove_device(tv)
+        return True
+
+    def _device(self, device: Device) -> base.SmartTV:
+        try:
+            tv = self.devices[device]
+        except KeyError:
+            raise KeyError('%s:%d is not added' % device)
+        if tv._sock is None:
+            # dropped by the receiver after a connection error, reconnect
+            # and receive its events again
+            self.receiver.add_device(tv)
+        return tv
+
+    def op_key(self, device: Device, key: str) -> int:
+        return self._device(device).send_key(key)
+
+    def op_keys(self, device: Device, keys: List[str], pacing: float) -> int:
+        tv = self._device(device)
+        sent = 0
+        for key in keys:
+            if sent:
+                time.sleep(pacing)
+            sent += tv.send_key(key)
+        return sent
+
+    def op_text(self, device: Device, text: str) -> int:
+        return self._device(device).send_text(text)
+
+    def op_devices(self, device: None) -> List[Device]:
+        return [d for (d, tv) in list(self.devices.items())
+                if tv._sock is not None]
+
+
+def _worker_main(conn, app_label: str, auth_timeout: float,
+                 recv_timeout: float, threads: int) -> None:
+    """Entry point of the worker processes."""
+    _Worker(conn, app_label, auth_timeout, recv_timeout, threads).run()
+
+
+class Fleet(listener._ListenerMixin):
+    """
+    Devices spread over worker processes, see module documentation.
+
+    :ivar workers: number of worker processes
+    """
+
+    def __init__(self, app_label: str, workers: Optional[int] = None,
+                 port: int = 55000, auth_timeout: Union[int, float] = 20.0,
+                 recv_timeout: Union[int, float] = 2.0,
+                 threads: int = 32, start_method: Optional[str] = None,
+                 callback_pool: Optional[listener.CallbackPool] = None):
+        """
+        Constructor, starts the worker processes.
+
+        :param app_label: application label for all connections
+        :param workers: number of worker processes (default: CPU count)
+        :param port: default device port
+        :param auth_timeout: authentication timeout of the connections
+        :param recv_timeout: receive timeout of the connections
+        :param threads: threads per worker executing commands
+        :param start_method: multiprocessing start method (default: the
+                             platform default)
+        :param callback_pool: optional CallbackPool to run listeners in
+        """
+        super().__init__(callback_pool)
+        self.workers = workers or os.cpu_count() or 1
+        self.port = port
+        self._ring = HashRing(self.workers)
+        self._ids = itertools.count()
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._send_locks = [threading.Lock() for _ in range(self.workers)]
+        context = multiprocessing.get_context(start_method)
+        self._conns = []
+        self._processes = []
+        for i in range(self.workers):
+            (parent, child) = context.Pipe()
+            process = context.Process(
+                target=_worker_main, name='fleet-worker-%d' % i, daemon=True,
+                args=(child, app_label, auth_timeout, recv_timeout, threads))
+            process.start()
+            child.close()
+            self._conns.append(parent)
+            self._processes.append(process)
+        self._reader = threading.Thread(target=self._read_loop, daemon=True,
+                                        name='fleet-reader')
+        self._reader.start()
+
+    def __repr__(self) -> str:
+        return '%s(workers=%d)' % (self.__class__.__name__, self.workers)
+
+    def __enter__(self) -> 'Fleet':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _device(self, host: Union[str, Device]) -> Device:
+        """Normalize a host name or (host, port) tuple."""
+        if isinstance(host, str):
+            return (host, self.port)
+        return (host[0], host[1])
+
+    def shard(self, host: Union[str, Device]) -> int:
+        """
+        Get the worker responsible for a device.
+
+        :param host: host name or (host, port) tuple
+        :return: worker number
+        """
+        return self._ring.shard(self._device(host)[0])
+
+    def _command(self, shard: int, op: str, device: Optional[Device],
+                 *args) -> Future:
+        """Send a command to a worker."""
+        future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            self._futures[request_id] = future
+        try:
+            with self._send_locks[shard]:
+                self._conns[shard].send((op, request_id, device) + args)
+        except OSError:
+            with self._lock:
+                del self._futures[request_id]
+            raise
+        return future
+
+    def _device_command(self, op: str, host: Union[str, Device],
+                        *args) -> Future:
+        device = self._device(host)
+        return self._command(self._ring.shard(device[0]), op, device, *args)
+
+    def add_device(self, host: Union[str, Device]) -> Future:
+        """
+        Connect a device in its worker and start receiving from it.
+
+        :param host: host name or (host, port) tuple
+        :return: future resolved to True, or False if already added
+        """
+        return self._device_command('add', host)
+
+    def remove_device(self, host: Union[str, Device]) -> Future:
+        """
+        Disconnect a device.
+
+        :param host: host name or (host, port) tuple
+        :return: future resolved to True, or False if unknown
+        """
+        return self._device_command('remove', host)
+
+    def send_key(self, host: Union[str, Device], key: str) -> Future:
+        """
+        Send a key event to a device.
+
+        :param host: host name or (host, port) tuple of an added device
+        :param key: key code to send. must start with "KEY_"
+        :return: future resolved to the number of bytes sent
+        """
+        return self._device_command('key', host, key)
+
+    def send_keys(self, host: Union[str, Device], keys: List[str],
+                  pacing: float = 0.0) -> Future:
+        """
+        Send a sequence of key events to a device.
+
+        :param host: host name or (host, port) tuple of an added device
+        :param keys: key codes to send
+        :param pacing: delay between key presses in seconds
+        :return: future resolved to the number of bytes sent
+        """
+        return self._device_command('keys', host, list(keys), pacing)
+
+    def send_text(self, host: Union[str, Device], text: str) -> Future:
+        """
+        Send a text to a device.
+
+        :param host: host name or (host, port) tuple of an added device
+        :param text: text to send
+        :return: future resolved to the number of bytes sent
+        """
+        return self._device_command('text', host, text)
+
+    def devices(self) -> List[Device]:
+        """
+        Get all connected devices of all workers.
+
+        :return: (host, port) tuples
+        """
+        futures = [self._command(i, 'devices', None)
+                   for i in range(self.workers)]
+        return sorted(d for f in futures for d in map(tuple, f.result()))
+
+    def _read_loop(self) -> None:
+        """Receive results and messages from the workers."""
+        conns = list(self._conns)
+        dispatch = self._dispatch
+        message = base.Message.from_raw
+        while conns:
+            for conn in wait_connections(conns):
+                try:
+                    item = conn.recv()
+                except (EOFError, OSError):
+                    conns.remove(conn)
+                    continue
+                if item[0] == 'events':
+                    for (host, port, type_, payload, sender) in item[1]:
+                        dispatch(message(type_, payload, sender),
+                                 (host, port))
+                elif item[0] == 'result':
+                    with self._lock:
+                        future = self._futures.pop(item[1], None)
+                    if future is None:
+                        continue
+                    if item[3] is None:
+                        future.set_result(item[2])
+                    else:
+                        future.set_exception(WorkerError(item[3]))
+                elif item[0] == 'stopped':
+                    conns.remove(conn)
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            future.set_exception(WorkerError('worker stopped'))
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """
+        Disconnect all devices and stop the workers.
+
+        :param timeout: seconds to wait for each worker
+        """
+        for (lock, conn) in zip(self._send_locks, self._conns):
+            try:
+                with lock:
+                    conn.send(('stop', None, None))
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                _log(logging.WARNING, 'terminating %s', process.name)
+                process.terminate()
+        self._reader.join(timeout)
+        for conn in self._conns:
+            conn.close()
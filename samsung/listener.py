@@ -4,17 +4,85 @@ Listen to samsung device events.
 Get notified when something happens on your TV.
 """
 
+import collections
+import functools
+import heapq
+import itertools
+import logging
+import selectors
 import socket
 import threading
-from typing import Callable, Union, Optional
+import time
+from typing import Callable, Dict, Tuple, Union, Optional
 
 from samsung import base
+from samsung.base import _log
 
 
 __version__ = '0.4.0'
 __author__ = 'David Poisl <david@poisl.at>'
 
 
+class _Wakeup:
+    """
+    Socket pair interrupting a select call from other threads.
+
+    Can be passed to select and selectors directly.
+    """
+
+    def __init__(self):
+        (self._r, self._w) = socket.socketpair()
+        self._r.setblocking(False)
+        self._w.setblocking(False)
+
+    def fileno(self) -> int:
+        return self._r.fileno()
+
+    def set(self) -> None:
+        """Make the read end readable, waking up select."""
+        try:
+            self._w.send(b'\x00')
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        """Drain pending wakeups."""
+        try:
+            while self._r.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        """Close both ends."""
+        self._r.close()
+        self._w.close()
+
+
+def _wait(device: base.SmartTV, wakeup: _Wakeup,
+          timeout: Optional[float]) -> bool:
+    """
+    Wait until a device socket is readable or wakeup is set.
+
+    Acknowledgements timed out are expired first and the wait is cut short
+    at the deadline of the next pending acknowledgement.
+
+    :param device: connected device
+    :param wakeup: wakeup to watch besides the socket
+    :param timeout: maximum seconds to wait (None = forever)
+    :return: True if the device socket is readable
+    """
+    device._acks.expire()
+    deadline = device._acks.next_deadline()
+    if deadline is not None:
+        remaining = max(deadline - time.monotonic(), 0.0)
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    readable = base._wait_readable([device._sock, wakeup], timeout)
+    if wakeup in readable:
+        wakeup.clear()
+    return device._sock in readable
+
+
 class IterReceiver(base.SmartTV):
     """
     Iterator-based receiver.
@@ -27,11 +95,23 @@ class IterReceiver(base.SmartTV):
     all messages that are not of interest. This function should be a callable
     taking a Message instance as its sole parameter and return True if the
     Message should be yielded, else False.
+
+    Iteration stops when the receiver is closed (close() may be called from
+    another thread and takes effect immediately), when the device closes
+    the connection or, if a timeout was given, when no message arrived
+    within timeout seconds. Errors connecting to or authenticating with
+    the device are raised. get() waits for a single message.
+
+    Acknowledgements for keys sent with ack=True are matched while
+    iterating.
     """
+    _external_reader = True
+
     def __init__(self, app_label: str, host: str, port: int = 55000,
                  auth_timeout: Union[float, int] = 20.0,
                  recv_timeout: Union[float, int] = 2.0,
-                 filter_: Callable = lambda x: True):
+                 filter_: Callable = lambda x: True,
+                 timeout: Optional[float] = None):
         """
         Constructor.
 
@@ -41,10 +121,17 @@ class IterReceiver(base.SmartTV):
         :param auth_timeout: timeout for authentication - default 20.0s
         :param recv_timeout: timeout for message receiving - default 2.0s
         :param filter_: optional filter method for messages
+        :param timeout: stop iterating if no message arrives within this
+                        many seconds - default None (wait forever)
         """
         super().__init__(app_label, host, port, auth_timeout, recv_timeout)
         self.filter = filter_
-        self._connected = False
+        self.timeout = timeout
+        self._closed = False
+        self._pending = collections.deque()
+        self._wakeup = _Wakeup()
+        self._reading = threading.Lock()
+        self._acks.wakeup = self._wakeup.set
 
     def __iter__(self):
         """iter(self)"""
@@ -52,22 +139,298 @@ class IterReceiver(base.SmartTV):
 
     def __next__(self):
         """next(self)"""
-        if not self._connected:
-            self.connect()
+        (msg, end) = self._get(self.timeout)
+        if end is not None:
+            raise StopIteration
+        return msg
+
+    def __enter__(self) -> 'IterReceiver':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get(self, timeout: Optional[float] = None) -> base.Message:
+        """
+        Wait for the next message passing the filter.
+
+        :param timeout: maximum seconds to wait (None = forever)
+        :return: received message
+        :raise: socket.timeout if no message arrived in time,
+                ConnectionError if the receiver was closed or the device
+                closed the connection, errors of connect() if not
+                connected yet
+        """
+        (msg, end) = self._get(timeout)
+        if end is not None:
+            raise end
+        return msg
+
+    def _get(self, timeout: Optional[float]
+             ) -> Tuple[Optional[base.Message], Optional[Exception]]:
+        """
+        Wait for the next message passing the filter.
+
+        Ending the stream (closed, disconnected by the device, no message
+        within timeout) is returned instead of raised, so iteration stops
+        only for these and not for connection errors.
+
+        :param timeout: maximum seconds to wait (None = forever)
+        :return: (message, None) or (None, exception ending the stream)
+        :raise: errors of connect()
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._reading:
+            if self._sock is None and not self._closed:
+                self.connect()
+            while True:
+                while self._pending:
+                    msg = self._pending.popleft()
+                    if self.filter(msg):
+                        return (msg, None)
+                if self._closed:
+                    self._shutdown()
+                    return (None, ConnectionError('receiver closed'))
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return (None, socket.timeout(
+                            'no message within %.3fs' % timeout))
+                if not _wait(self, self._wakeup, remaining):
+                    continue
+                try:
+                    messages = self.recv_messages()
+                except (socket.timeout, ConnectionResetError):
+                    # readable but nothing to read: closed by the device
+                    self._shutdown()
+                    return (None, ConnectionError(
+                        'connection closed by device'))
+                for msg in messages:
+                    self._acks.feed(msg)
+                self._pending.extend(messages)
+
+    def close(self) -> None:
+        """
+        Stop iterating and disconnect.
+
+        Can be called from any thread, a blocked get() returns immediately.
+        """
+        self._closed = True
+        self._wakeup.set()
+        if self._reading.acquire(blocking=False):
+            try:
+                self._shutdown()
+            finally:
+                self._reading.release()
+
+    def _shutdown(self) -> None:
+        """Disconnect if connected, called by the reading thread."""
+        if self._sock is not None:
+            self.disconnect()
+        if self._closed:
+            self._acks.wakeup = None
+            self._wakeup.close()
+
+
+class CallbackPool:
+    """
+    Worker threads running listener callbacks off the receiving thread.
+
+    Callbacks are queued in a bounded queue. If the queue is full the
+    overflow policy decides what happens: 'block' waits until a worker took
+    a callback from the queue (which stalls the receiving thread and
+    therefore applies backpressure to the socket), 'drop_oldest' discards the
+    oldest queued callback.
+
+    With the default single worker callbacks run in the order the messages
+    were received.
+
+    :ivar dropped: number of callbacks discarded by the drop_oldest policy
+    :ivar metrics: optional samsung.metrics.Metrics instance recording
+                   dropped messages and callback durations
+    """
+    metrics = None
+
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+
+    def __init__(self, workers: int = 1, maxsize: int = 1024,
+                 overflow: str = BLOCK):
+        """
+        Constructor.
+
+        :param workers: number of worker threads
+        :param maxsize: maximum number of queued callbacks
+        :param overflow: policy if the queue is full, 'block' or
+                         'drop_oldest'
+        """
+        if overflow not in (self.BLOCK, self.DROP_OLDEST):
+            raise ValueError('unknown overflow policy %r' % overflow)
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def __len__(self) -> int:
+        """Number of queued callbacks."""
+        return len(self._queue)
+
+    def submit(self, callback: Callable, *args) -> None:
+        """
+        Queue a callback.
+
+        :param callback: callable to run in a worker thread
+        :param args: arguments for callback
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('callback pool is closed')
+            while len(self._queue) >= self.maxsize:
+                if self.overflow == self.DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                    if self.metrics is not None:
+                        self.metrics.inc('messages_dropped')
+                else:
+                    self._cond.wait()
+            self._queue.append((callback, args))
+            self._cond.notify_all()
+
+    def _work(self) -> None:
+        """Worker thread main loop."""
         while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                (callback, args) = self._queue.popleft()
+                self._cond.notify_all()
             try:
-                data = self.recv()
-            except socket.timeout:
-                continue
-            except socket.error:
-                raise
+                if self.metrics is None:
+                    callback(*args)
+                else:
+                    start = time.perf_counter()
+                    callback(*args)
+                    self.metrics.observe('callback_seconds',
+                                         time.perf_counter() - start)
+            except Exception:
+                _log(logging.ERROR, 'Listener %r failed', callback,
+                     exc_info=True)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Run all queued callbacks and stop the workers.
+
+        :param timeout: optional timeout for joining each worker
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+class _ListenerMixin:
+    """
+    Listener registry shared by the threaded receivers.
+
+    Listeners subscribing by message type and/or payload are kept in a dict
+    indexed by (type, payload) with None as wildcard, so dispatching a
+    message costs four dict lookups no matter how many listeners there
+    are. Matcher functions are only called for listeners registered with
+    one.
+
+    If the metrics attribute is set, the time spent in listeners called
+    directly (not through a CallbackPool) is recorded as callback_seconds.
+    """
+    metrics = None
+
+    def __init__(self, callback_pool: Optional[CallbackPool] = None):
+        self._listeners: Dict[tuple, list] = {}
+        self.callback_pool = callback_pool
+
+    def add_listener(self, listener: Callable,
+                     matcher: Optional[Callable] = None,
+                     type_: Union[base.ResponseType, int, None] = None,
+                     payload: Union[base.ResponsePayload, str, bytes,
+                                    None] = None
+                     ) -> None:
+        """
+        Add another listener to the receiver.
+
+        the given listener will get notified for all Responses sent from the
+        Smart TV. It should be a callable taking a Message instance as its
+        only argument.
+        Listeners interested in specific messages only should pass type_
+        and/or payload, these are looked up in an index. For everything else
+        an optional matcher function can be given which should be a
+        callable taking a Message instance as its argument and return True
+        for responses that should be sent to the listener.
+
+        :param listener: callback for matching messages
+        :param matcher: matcher for this listener.
+        :param type_: only notify for messages of this type
+        :param payload: only notify for messages with this payload
+        """
+        if isinstance(type_, base.ResponseType):
+            type_ = type_.value
+        if isinstance(payload, base.ResponsePayload):
+            payload = payload.value
+        if isinstance(payload, str):
+            payload = base.Message(0, payload).raw_payload
+        self._listeners.setdefault((type_, payload), []).append(
+            (matcher, listener))
 
-            msg = base.Message.parse(data)
-            if self.filter(msg):
-                return msg
+    def remove_listener(self, listener: Callable) -> None:
+        """
+        Remove all registrations of a listener.
 
+        :param listener: previously added callback
+        """
+        for (key, entries) in list(self._listeners.items()):
+            entries = [e for e in entries if e[1] is not listener]
+            if entries:
+                self._listeners[key] = entries
+            else:
+                del self._listeners[key]
 
-class ThreadReceiver(base.SmartTV, threading.Thread):
+    def _dispatch(self, msg: base.Message, *args) -> None:
+        """
+        Notify all listeners matching a message.
+
+        :param msg: received message
+        :param args: additional arguments for the listeners
+        """
+        index = self._listeners
+        pool = self.callback_pool
+        payload = msg.raw_payload
+        for key in ((msg.type, payload), (msg.type, None),
+                    (None, payload), (None, None)):
+            entries = index.get(key)
+            if entries is None:
+                continue
+            for (matcher, listener) in entries:
+                if matcher is None or matcher(msg):
+                    if pool is not None:
+                        pool.submit(listener, msg, *args)
+                    elif self.metrics is None:
+                        listener(msg, *args)
+                    else:
+                        start = time.perf_counter()
+                        listener(msg, *args)
+                        self.metrics.observe('callback_seconds',
+                                             time.perf_counter() - start)
+
+
+class ThreadReceiver(_ListenerMixin, base.SmartTV, threading.Thread):
     """
     Threaded receiver.
 
@@ -77,12 +440,20 @@ class ThreadReceiver(base.SmartTV, threading.Thread):
     Use add_listener to add another receiver. The receiver should be a callable
     taking a Message instance as its only parameter. An optional second
     callable can be given as a filter for this listener.
+
+    Acknowledgements for keys sent with ack=True are matched by the
+    receiving thread (and still passed to the listeners).
+
+    The thread waits for data with select, so stop() takes effect
+    immediately instead of after the receive timeout.
     """
+    _external_reader = True
 
     def __init__(self, app_label: str, host: str, port: int = 55000,
                  auth_timeout: Union[float, int] = 20.0,
                  recv_timeout: Union[float, int] = 2.0,
-                 name: Optional[str] = None):
+                 name: Optional[str] = None,
+                 callback_pool: Optional[CallbackPool] = None):
         """
         constructor
 
@@ -92,61 +463,204 @@ class ThreadReceiver(base.SmartTV, threading.Thread):
         :param auth_timeout: timeout for authentication - default 20.0s
         :param recv_timeout: timeout for message receiving - default 2.0s
         :param name: optional thread name
+        :param callback_pool: optional CallbackPool to run listeners in
         """
-        self._listeners = []
+        _ListenerMixin.__init__(self, callback_pool)
         self._stopping = False
         base.SmartTV.__init__(self, app_label, host, port, auth_timeout,
                               recv_timeout)
         threading.Thread.__init__(self, name=name)
+        self._wakeup = _Wakeup()
+        self._acks.wakeup = self._wakeup.set
 
-    def add_listener(self, listener: Callable,
-                     matcher: Callable = lambda x: True) -> None:
+    def run(self) -> None:
+        """Main loop for the listener thread."""
+        try:
+            if not self._stopping:
+                self.connect()
+            while not self._stopping:
+                if not _wait(self, self._wakeup, None):
+                    continue
+                try:
+                    messages = self.recv_messages()
+                except socket.timeout:
+                    _log(logging.INFO, 'Connection closed by %r', self)
+                    break
+                for msg in messages:
+                    self._acks.feed(msg)
+                    self._dispatch(msg)
+        finally:
+            if self._sock is not None:
+                self.disconnect()
+            self._acks.wakeup = None
+            self._wakeup.close()
+
+    def stop(self) -> None:
+        """Stop thread, takes effect immediately."""
+        self._stopping = True
+        self._wakeup.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
         """
-        Add another listener to the receiver.
+        Stop and join thread.
 
-        the given listener will get notified for all Responses sent from the
-        Smart TV. It should be a callable taking a Message instance as its
-        only argument.
-        An optional matcher function can be given which should be a callable
-        taking a Message instance as its argument and return True for
-        responses that should be sent to the listener.
+        :param timeout: optional timeout for Thread.join()
+        """
+        self.stop()
+        super(ThreadReceiver, self).join(timeout)
 
-        :param listener: callback for matching messages
-        :param matcher: matcher for this listener.
+
+class MultiReceiver(_ListenerMixin, threading.Thread):
+    """
+    Receiver for many devices in a single thread.
+
+    Instead of a thread per device all sockets are watched by a single
+    selectors loop. Devices are added with add_device, listeners are added
+    with add_listener like for ThreadReceiver but get called with the
+    Message and the SmartTV instance it was received from.
+
+    stop() wakes the loop through a socket pair, so the thread terminates
+    immediately instead of waiting for a receive timeout.
+    """
+
+    def __init__(self, name: Optional[str] = None,
+                 callback_pool: Optional[CallbackPool] = None):
+        """
+        constructor
+
+        :param name: optional thread name
+        :param callback_pool: optional CallbackPool to run listeners in
+        """
+        _ListenerMixin.__init__(self, callback_pool)
+        threading.Thread.__init__(self, name=name)
+        self._selector = selectors.DefaultSelector()
+        self._devices: Dict[int, base.SmartTV] = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._waker = _Wakeup()
+        self._selector.register(self._waker, selectors.EVENT_READ)
+        # (deadline, sequence, device) of the first pending acknowledgement
+        # of devices, entries may be outdated and are checked when due
+        self._deadlines = []
+        self._sequence = itertools.count()
+
+    @property
+    def devices(self):
+        """Currently registered devices."""
+        with self._lock:
+            return list(self._devices.values())
+
+    def add_device(self, device: base.SmartTV) -> None:
+        """
+        Start receiving messages from a device.
+
+        The device is connected and authenticated first if necessary.
+
+        :param device: SmartTV instance to receive from
         """
-        self._listeners.append((matcher, listener))
+        if device._sock is None:
+            device.connect()
+        device._external_reader = True
+        device._acks.wakeup = functools.partial(self._ack_expected, device)
+        with self._lock:
+            self._devices[device._sock.fileno()] = device
+            self._selector.register(device._sock, selectors.EVENT_READ,
+                                    device)
+        self._ack_expected(device)
+
+    def remove_device(self, device: base.SmartTV,
+                      disconnect: bool = True) -> None:
+        """
+        Stop receiving messages from a device.
+
+        :param device: previously added SmartTV instance
+        :param disconnect: also close the connection (default: True)
+        """
+        with self._lock:
+            for (fd, known) in list(self._devices.items()):
+                if known is device:
+                    del self._devices[fd]
+                    self._selector.unregister(fd)
+        device._external_reader = False
+        device._acks.wakeup = None
+        if disconnect and device._sock is not None:
+            device.disconnect()
+
+    def _wakeup(self) -> None:
+        """Interrupt a running select call."""
+        self._waker.set()
+
+    def _ack_expected(self, device: base.SmartTV) -> None:
+        """Schedule the ack timeout of a device and wake the loop."""
+        deadline = device._acks.next_deadline()
+        if deadline is not None:
+            with self._lock:
+                heapq.heappush(self._deadlines,
+                               (deadline, next(self._sequence), device))
+        self._wakeup()
 
     def run(self) -> None:
         """Main loop for the listener thread."""
-        self._stopping = False
-        self.connect()
         while not self._stopping:
-            try:
-                data = self.recv()
-            except socket.timeout:
-                continue
+            for (key, events) in self._selector.select(self._ack_timeout()):
+                device = key.data
+                if device is None:
+                    self._waker.clear()
+                    continue
+                try:
+                    messages = device.recv_messages()
+                except (socket.timeout, socket.error, AttributeError,
+                        ValueError) as e:
+                    # AttributeError, ValueError: removed by another thread
+                    if device._sock is not None:
+                        _log(logging.INFO, 'Lost connection to %r: %r',
+                             device, e)
+                    self.remove_device(device)
+                    continue
+                for msg in messages:
+                    device._acks.feed(msg)
+                    self._dispatch(msg, device)
+        for device in self.devices:
+            self.remove_device(device)
+        self._selector.close()
+        self._waker.close()
 
-            try:
-                msg = base.Message.parse(data)
-            except ValueError:
-                print('!!! could not parse %r' % data)
-                continue
-            for (matcher, listener) in self._listeners:
-                if matcher(msg):
-                    listener(msg)
+    def _ack_timeout(self) -> Optional[float]:
+        """
+        Expire unacknowledged keys and get the time until the next expires.
 
-        self.disconnect()
-        self._stopping = False
+        Only devices with a due deadline are checked.
+
+        :return: seconds until the next ack timeout or None if no device
+                 waits for acknowledgements
+        """
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                due.append(heapq.heappop(self._deadlines)[2])
+        for device in due:
+            device._acks.expire()
+            deadline = device._acks.next_deadline()
+            if deadline is not None:
+                with self._lock:
+                    heapq.heappush(self._deadlines,
+                                   (deadline, next(self._sequence), device))
+        with self._lock:
+            if not self._deadlines:
+                return None
+            return max(self._deadlines[0][0] - time.monotonic(), 0.0)
 
     def stop(self) -> None:
-        """Stop thread gracefully."""
+        """Stop thread, disconnecting all devices."""
         self._stopping = True
+        self._wakeup()
 
     def join(self, timeout: Optional[float] = None) -> None:
         """
-        Join thread gracefully.
+        Stop and join thread.
 
         :param timeout: optional timeout for Thread.join()
         """
-        self._stopping = True
-        super(ThreadReceiver, self).join(timeout)
+        self.stop()
+        super(MultiReceiver, self).join(timeout)
@@ -0,0 +1,285 @@
+"""
+Scenes: declarative key sequences with timing and state conditions.
+
+A scene is a list of steps loaded from JSON or YAML (YAML needs PyYAML):
+
+    name: movie night
+    pacing: 0.2
+    steps:
+      - key: KEY_HDMI
+      - sleep: 1.5
+      - key: KEY_MENU
+      - wait_for: MENU
+        timeout: 3
+      - keys: [KEY_DOWN, KEY_DOWN, KEY_ENTER]
+      - text: netflix
+      - channel: 101
+
+Step types are key, keys and channel (key events, sent with the pacing of
+the step or the scene), text, sleep (seconds) and wait_for (a
+samsung.state.UIMode name, waits until the device reports it). Every step
+accepts "delay", a pause after the step; wait_for steps accept "timeout"
+and "optional" (don't fail if the mode isn't reached).
+
+Scenes are compiled once into pre-encoded frames for an application label
+and can then be run on a single connection or on many devices of a
+SmartTVPool concurrently, with all devices following the same schedule:
+
+    scene = compile_scene(load_scene('movie.yaml'), 'pyremote')
+    scene.run(tv)
+    scene.run_many(pool, ['10.0.0.5', '10.0.0.6'])
+"""
+
+import json
+import time
+from typing import Iterable, List, Optional
+
+from samsung import base, state
+from samsung.pool import FanoutResult, SmartTVPool
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('Scene', 'load_scene', 'compile_scene')
+
+
+DEFAULT_PACING = 0.1
+DEFAULT_WAIT_TIMEOUT = 5.0
+
+_SEND = 'send'
+_SLEEP = 'sleep'
+_WAIT = 'wait'
+
+
+def load_scene(path: str) -> dict:
+    """
+    Load a scene definition from a JSON or YAML file.
+
+    Files ending with .yaml or .yml are parsed with PyYAML, everything else
+    as JSON.
+
+    :param path: file name
+    :return: scene definition
+    :raises: ImportError if a YAML file is given and PyYAML is missing
+    """
+    with open(path) as fp:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(fp)
+        return json.load(fp)
+
+
+def compile_scene(definition: dict, app_label: str) -> 'Scene':
+    """
+    Compile a scene definition.
+
+    :param definition: scene definition (dict with "steps" and optional
+                       "name" and "pacing")
+    :param app_label: application label to encode the messages with
+    :return: compiled scene
+    :raises: ValueError for invalid steps
+    """
+    pacing = float(definition.get('pacing', DEFAULT_PACING))
+    ops = []
+    for (i, step) in enumerate(definition['steps']):
+        try:
+            ops.extend(_compile_step(step, app_label, pacing))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError('invalid step %d %r: %s' % (i, step, e))
+    return Scene(definition.get('name', ''), _merge(ops))
+
+
+def _compile_step(step: dict, app_label: str, pacing: float) -> List[tuple]:
+    """Compile a single step to a list of operations."""
+    pacing = float(step.get('pacing', pacing))
+    if 'key' in step:
+        ops = [(_SEND, [base.build_key_message(app_label, step['key'])], 0.0)]
+    elif 'keys' in step or 'channel' in step:
+        if 'keys' in step:
+            keys = step['keys']
+        else:
+            keys = ['KEY_' + d for d in '%04d' % int(step['channel'])]
+        ops = [(_SEND, [base.build_key_message(app_label, k) for k in keys],
+                pacing)]
+    elif 'text' in step:
+        ops = [(_SEND, [base.build_text_message(app_label, step['text'])],
+                0.0)]
+    elif 'sleep' in step:
+        ops = [(_SLEEP, float(step['sleep']))]
+    elif 'wait_for' in step:
+        ops = [(_WAIT, state.UIMode[step['wait_for'].upper()],
+                float(step.get('timeout', DEFAULT_WAIT_TIMEOUT)),
+                bool(step.get('optional', False)))]
+    else:
+        raise ValueError('unknown step type')
+    if step.get('delay'):
+        ops.append((_SLEEP, float(step['delay'])))
+    return ops
+
+
+def _merge(ops: List[tuple]) -> List[tuple]:
+    """
+    Join consecutive unpaced sends into single frames.
+
+    Key and text frames without pauses between them are written with one
+    sendall call when the scene runs.
+    """
+    merged = []
+    for op in ops:
+        if op[0] == _SEND:
+            frames = op[1] if op[2] else [b''.join(op[1])]
+            if merged and merged[-1][0] == _SEND and not op[2] and \
+                    len(merged[-1][1]) == 1:
+                frames = [merged.pop()[1][0] + frames[0]]
+            op = (_SEND, frames, op[2])
+        merged.append(op)
+    return merged
+
+
+class Scene:
+    """
+    Compiled scene, see module documentation.
+
+    :ivar name: name of the scene
+    :ivar ops: compiled operations
+    """
+
+    def __init__(self, name: str, ops: List[tuple]):
+        """
+        Constructor, use compile_scene to create scenes.
+
+        :param name: name of the scene
+        :param ops: compiled operations
+        """
+        self.name = name
+        self.ops = ops
+
+    def __repr__(self) -> str:
+        return '%s(%r, ops=%d)' % (self.__class__.__name__, self.name,
+                                   len(self.ops))
+
+    @property
+    def waits(self) -> bool:
+        """True if the scene contains state conditioned waits."""
+        return any(op[0] == _WAIT for op in self.ops)
+
+    def run(self, device: base.SmartTV,
+            device_state: Optional[state.DeviceState] = None,
+            start: Optional[float] = None) -> float:
+        """
+        Run the scene on a connected device.
+
+        Pauses are scheduled on the monotonic clock relative to start, so
+        time spent sending doesn't delay later steps. Connections without
+        a receiver thread read incoming messages while pausing and update
+        device_state from them; for receivers (eG ThreadReceiver) the state
+        has to be added as listener by the caller.
+
+        :param device: connected SmartTV instance
+        :param device_state: state used for wait_for steps (default: a new
+                             DeviceState, only for connections without a
+                             receiver)
+        :param start: time.monotonic() value to start the schedule at
+                      (default: now)
+        :return: seconds the scene took
+        :raises: TimeoutError if a required wait_for step timed out,
+                 ValueError if the scene waits for a state of a receiver
+                 and no device_state is given
+        """
+        reads = not device._acks_read_elsewhere()
+        if device_state is None:
+            if not reads and self.waits:
+                raise ValueError('device_state is required for receivers')
+            device_state = state.DeviceState()
+        now = time.monotonic()
+        at = now if start is None else max(start, now)
+        first = at
+        for op in self.ops:
+            if op[0] == _SEND:
+                for (i, frame) in enumerate(op[1]):
+                    if i:
+                        at += op[2]
+                    self._idle(device, device_state, reads, at)
+                    device.sendall(frame)
+            elif op[0] == _SLEEP:
+                at += op[1]
+                self._idle(device, device_state, reads, at)
+            else:
+                (_, mode, timeout, optional) = op
+                self._idle(device, device_state, reads, at)
+                if not self._wait(device, device_state, reads, mode,
+                                  time.monotonic() + timeout) \
+                        and not optional:
+                    raise TimeoutError('scene %r: %s not reached within '
+                                       '%.2fs' % (self.name, mode.name,
+                                                  timeout))
+                at = time.monotonic()
+        return time.monotonic() - first
+
+    @staticmethod
+    def _idle(device: base.SmartTV, device_state: state.DeviceState,
+              reads: bool, deadline: float) -> None:
+        """Wait until deadline, reading messages if the device allows."""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if reads:
+                for msg in device._recv_until(deadline):
+                    device_state.feed(msg)
+            else:
+                time.sleep(remaining)
+
+    @staticmethod
+    def _wait(device: base.SmartTV, device_state: state.DeviceState,
+              reads: bool, mode: state.UIMode, deadline: float) -> bool:
+        """Wait for a mode until deadline, return True if reached."""
+        if not reads:
+            return device_state.wait_for(
+                mode, max(deadline - time.monotonic(), 0.0))
+        while device_state.mode is not mode:
+            if time.monotonic() >= deadline:
+                return False
+            for msg in device._recv_until(deadline):
+                device_state.feed(msg)
+        return True
+
+    def run_many(self, device_pool: SmartTVPool,
+                 devices: Iterable,
+                 states: Optional[state.DeviceStates] = None,
+                 start_delay: float = 0.0) -> FanoutResult:
+        """
+        Run the scene on many devices concurrently.
+
+        All devices are connected first, then every device gets its own
+        thread and all follow the same schedule starting at the same time,
+        a slow device does not delay the others. Devices which could not be
+        connected are reported as failed without running the scene.
+
+        :param device_pool: pool providing the connections
+        :param devices: host names, (host, port) or (host, port,
+                        app_label) tuples
+        :param states: optional DeviceStates keyed by (host, port,
+                       app_label), updated with messages received while the
+                       scene runs
+        :param start_delay: seconds to delay the start after all devices
+                            are connected
+        :return: results (seconds the scene took) for all devices
+        """
+        started = time.monotonic()
+        connected = device_pool.fanout(devices, lambda tv: None)
+        ready = connected.succeeded
+        start = time.monotonic() + start_delay
+
+        def run(tv: base.SmartTV) -> float:
+            device_state = None
+            if states is not None:
+                device_state = states[(tv._sock_args[0], tv._sock_args[1],
+                                       tv.app_label)]
+            return self.run(tv, device_state, start)
+
+        ran = device_pool.fanout(ready, run, max_workers=max(len(ready), 1))
+        results = [ran.results.get(key, result)
+                   for (key, result) in connected.results.items()]
+        return FanoutResult(results, time.monotonic() - started)
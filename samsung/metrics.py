@@ -0,0 +1,246 @@
+"""
+Metrics for connections and receivers.
+
+SmartTV, the receivers and CallbackPool have a metrics attribute which is
+None by default, so no metrics are collected and the only cost is an
+attribute check. Assign a Metrics instance obtained from a MetricsRegistry
+to collect counters and histograms:
+
+    registry = MetricsRegistry()
+    tv = SmartTV('app', '192.168.1.120')
+    tv.metrics = registry.labels(host='192.168.1.120')
+    ...
+    print(prometheus_text(registry))
+
+Collected metrics:
+    bytes_received, bytes_sent: traffic on the socket
+    messages_parsed: messages decoded from received data
+    messages_dropped: messages discarded, eG by a full CallbackPool
+    keys_dropped: keys or texts discarded by a SendQueue
+    keys_coalesced: repeated keys merged into a queued SendQueue entry
+    connects, reconnects: established and re-established connections
+    auth_seconds: duration of connect and authentication
+    send_seconds: duration of socket send calls
+    callback_seconds: time spent in listener callbacks
+"""
+
+import bisect
+import threading
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('MetricsRegistry', 'Metrics', 'Counter', 'Histogram',
+           'prometheus_text')
+
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'bytes_received': 'Bytes received from devices',
+    'bytes_sent': 'Bytes sent to devices',
+    'messages_parsed': 'Messages parsed from received data',
+    'messages_dropped': 'Messages dropped before reaching listeners',
+    'keys_dropped': 'Keys and texts dropped by send queues',
+    'keys_coalesced': 'Repeated keys merged in send queues',
+    'connects': 'Connections established',
+    'reconnects': 'Connections re-established after errors',
+    'auth_seconds': 'Duration of connect and authentication',
+    'send_seconds': 'Duration of socket sends',
+    'callback_seconds': 'Time spent in listener callbacks',
+}
+
+HISTOGRAMS = frozenset(('auth_seconds', 'send_seconds', 'callback_seconds'))
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    """
+    Monotonic counter.
+
+    :ivar value: current value
+    """
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+
+class Histogram:
+    """
+    Histogram with fixed upper bounds.
+
+    :ivar buckets: upper bounds of the buckets
+    :ivar counts: number of observations per bucket (not cumulative), the
+                  last entry counts values above all bounds
+    :ivar sum: sum of all observed values
+    :ivar count: number of observations
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """
+    Storage for all metrics, grouped by name and labels.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Constructor.
+
+        :param buckets: upper bounds for histogram buckets in seconds
+        """
+        self.buckets = tuple(buckets)
+        self._metrics: Dict[Tuple[str, Labels], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels: str) -> 'Metrics':
+        """
+        Get a Metrics instance recording with the given labels.
+
+        :param labels: label names and values, eG host='192.168.1.120'
+        :return: Metrics instance for this registry
+        """
+        return Metrics(self, tuple(sorted((k, str(v))
+                                          for (k, v) in labels.items())))
+
+    def _get(self, name: str, labels: Labels):
+        """Get or create a metric."""
+        key = (name, labels)
+        try:
+            return self._metrics[key]
+        except KeyError:
+            metric = Histogram(self.buckets) if name in HISTOGRAMS \
+                else Counter()
+            return self._metrics.setdefault(key, metric)
+
+    def collect(self) -> Iterator[Tuple[str, Labels, object]]:
+        """
+        Iterate over all metrics.
+
+        :return: iterator of (name, labels, Counter or Histogram) tuples
+                 sorted by name and labels
+        """
+        with self._lock:
+            items = sorted(self._metrics.items())
+        for ((name, labels), metric) in items:
+            yield name, labels, metric
+
+    def value(self, name: str, **labels: str) -> Optional[object]:
+        """
+        Get a single metric, mainly for tests and quick checks.
+
+        :param name: metric name
+        :param labels: labels of the metric
+        :return: Counter value, Histogram instance or None if not recorded
+        """
+        metric = self._metrics.get((name, tuple(sorted(
+            (k, str(v)) for (k, v) in labels.items()))))
+        if isinstance(metric, Counter):
+            return metric.value
+        return metric
+
+
+class Metrics:
+    """
+    Recorder for one set of labels in a MetricsRegistry.
+    """
+    __slots__ = ('registry', 'labels')
+
+    def __init__(self, registry: MetricsRegistry, labels: Labels = ()):
+        """
+        Constructor.
+
+        :param registry: registry to record to
+        :param labels: label tuples for all recorded metrics
+        """
+        self.registry = registry
+        self.labels = labels
+
+    def inc(self, name: str, value: int = 1) -> None:
+        """
+        Increment a counter.
+
+        :param name: counter name
+        :param value: amount to add
+        """
+        registry = self.registry
+        with registry._lock:
+            registry._get(name, self.labels).value += value
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        Record a value in a histogram.
+
+        :param name: histogram name
+        :param value: observed value, eG a duration in seconds
+        """
+        registry = self.registry
+        with registry._lock:
+            histogram = registry._get(name, self.labels)
+            histogram.counts[bisect.bisect_left(histogram.buckets,
+                                                value)] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    """Format labels for the Prometheus text format."""
+    labels = labels + extra
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, v.replace('\\', '\\\\')
+                                          .replace('"', '\\"')
+                                          .replace('\n', '\\n'))
+                             for (k, v) in labels)
+
+
+def prometheus_text(registry: MetricsRegistry,
+                    prefix: str = 'samsung_') -> str:
+    """
+    Export all metrics in the Prometheus text exposition format.
+
+    :param registry: registry to export
+    :param prefix: prefix for all metric names
+    :return: metrics as text
+    """
+    lines = []
+    last = None
+    for (name, labels, metric) in registry.collect():
+        full_name = prefix + name
+        if isinstance(metric, Counter):
+            full_name += '_total'
+        if name != last:
+            kind = 'histogram' if isinstance(metric, Histogram) \
+                else 'counter'
+            lines.append('# HELP %s %s' % (full_name, HELP.get(name, name)))
+            lines.append('# TYPE %s %s' % (full_name, kind))
+            last = name
+        if isinstance(metric, Counter):
+            lines.append('%s%s %d' % (full_name, _format_labels(labels),
+                                      metric.value))
+            continue
+        cumulative = 0
+        for (bound, count) in zip(metric.buckets, metric.counts):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (
+                full_name, _format_labels(labels, (('le', repr(bound)),)),
+                cumulative))
+        lines.append('%s_bucket%s %d' % (
+            full_name, _format_labels(labels, (('le', '+Inf'),)),
+            metric.count))
+        lines.append('%s_sum%s %r' % (full_name, _format_labels(labels),
+                                      metric.sum))
+        lines.append('%s_count%s %d' % (full_name, _format_labels(labels),
+                                        metric.count))
+    return '\n'.join(lines) + '\n'
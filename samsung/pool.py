@@ -0,0 +1,352 @@
+"""
+Control many Samsung devices at once.
+
+SmartTVPool keeps authenticated connections open and sends key events or
+texts to many devices concurrently. Commands can also be streamed with
+submit(), which keeps the order per device.
+"""
+
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import socket
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from samsung import base
+from samsung.base import _log
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('SmartTVPool', 'DeviceResult', 'FanoutResult')
+
+
+DeviceKey = Tuple[str, int, str]
+
+
+DeviceResult = collections.namedtuple('DeviceResult',
+                                      ('device', 'result', 'error', 'latency'))
+DeviceResult.__doc__ = """
+Result of a command for a single device.
+
+:ivar device: (host, port, app_label) of the device
+:ivar result: return value of the command, None on errors
+:ivar error: exception raised by the command or None
+:ivar latency: time spent for the command in seconds
+"""
+
+
+class FanoutResult:
+    """
+    Aggregated results of a command sent to multiple devices.
+
+    :ivar results: DeviceResult instances by device key
+    :ivar elapsed: wall clock time for the whole fan-out in seconds
+    """
+
+    def __init__(self, results: List[DeviceResult], elapsed: float):
+        """
+        Constructor.
+
+        :param results: results of all devices
+        :param elapsed: wall clock time for the whole fan-out in seconds
+        """
+        self.results = collections.OrderedDict((r.device, r) for r in results)
+        self.elapsed = elapsed
+
+    def __repr__(self) -> str:
+        return '%s(devices=%d, failed=%d, elapsed=%.3f)' % (
+            self.__class__.__name__, len(self.results), len(self.failed),
+            self.elapsed)
+
+    @property
+    def failed(self) -> Dict[DeviceKey, BaseException]:
+        """Exceptions by device key for all failed devices."""
+        return {k: r.error for (k, r) in self.results.items()
+                if r.error is not None}
+
+    @property
+    def succeeded(self) -> List[DeviceKey]:
+        """Keys of all devices the command succeeded on."""
+        return [k for (k, r) in self.results.items() if r.error is None]
+
+    @property
+    def latency_mean(self) -> float:
+        """Mean per-device latency in seconds."""
+        if not self.results:
+            return 0.0
+        return sum(r.latency for r in self.results.values()) / \
+            len(self.results)
+
+    @property
+    def latency_max(self) -> float:
+        """Highest per-device latency in seconds."""
+        return max((r.latency for r in self.results.values()), default=0.0)
+
+
+class SmartTVPool:
+    """
+    Pool of authenticated SmartTV connections.
+
+    Connections are identified by (host, port, app_label), created on first
+    use and kept open for later commands. If a command fails because the
+    connection got lost before anything was sent the device is reconnected
+    once before the error is reported. Commands which already sent data are
+    not repeated, the device would get the keys twice.
+
+    Commands sent to multiple devices are executed concurrently by a thread
+    pool, each connection is only used by one thread at a time.
+    """
+
+    def __init__(self, app_label: str, port: int = 55000,
+                 max_workers: int = 32,
+                 auth_timeout: Union[int, float] = 20.0,
+                 recv_timeout: Union[int, float] = 2.0,
+                 factory: Callable = base.SmartTV):
+        """
+        Constructor.
+
+        :param app_label: default application label for new connections
+        :param port: default port for new connections
+        :param max_workers: maximum number of devices handled in parallel
+        :param auth_timeout: authentication timeout for new connections
+        :param recv_timeout: receive timeout for new connections
+        :param factory: callable creating connections, gets the same
+                        arguments as samsung.base.SmartTV
+        """
+        self.app_label = app_label
+        self.port = port
+        self._auth_timeout = auth_timeout
+        self._recv_timeout = recv_timeout
+        self._factory = factory
+        self._connections: Dict[DeviceKey, base.SmartTV] = {}
+        self._locks: Dict[DeviceKey, threading.Lock] = {}
+        self._queues: Dict[DeviceKey, collections.deque] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __repr__(self) -> str:
+        return '%s(%r, devices=%d)' % (self.__class__.__name__,
+                                       self.app_label, len(self._connections))
+
+    def __enter__(self) -> 'SmartTVPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _key(self, device: Union[str, DeviceKey]) -> DeviceKey:
+        """
+        Normalize a device specification.
+
+        :param device: host name, (host, port) or (host, port, app_label)
+                       tuple
+        :return: (host, port, app_label) tuple
+        """
+        if isinstance(device, str):
+            return (device, self.port, self.app_label)
+        elif len(device) == 2:
+            return (device[0], device[1], self.app_label)
+        return tuple(device)
+
+    def _entry(self, key: DeviceKey) -> Tuple[base.SmartTV, threading.Lock]:
+        """Get connection and lock for a device, creating them if needed."""
+        with self._lock:
+            try:
+                return (self._connections[key], self._locks[key])
+            except KeyError:
+                (host, port, app_label) = key
+                tv = self._factory(app_label, host, port, self._auth_timeout,
+                                   self._recv_timeout)
+                lock = threading.Lock()
+                self._connections[key] = tv
+                self._locks[key] = lock
+                return (tv, lock)
+
+    def get(self, device: Union[str, DeviceKey]) -> base.SmartTV:
+        """
+        Get the connection for a device, creating it if necessary.
+
+        The returned connection is not necessarily connected yet, this
+        happens lazily on the first send.
+
+        :param device: host name or (host, port, app_label) tuple
+        :return: SmartTV instance for the device
+        """
+        return self._entry(self._key(device))[0]
+
+    def call(self, device: Union[str, DeviceKey],
+             action: Callable[[base.SmartTV], object]) -> object:
+        """
+        Run an action on the connection of a single device.
+
+        The connection is established if necessary. If the action fails
+        with a socket error before it sent anything (eG the pooled
+        connection was closed by the device meanwhile) the connection is
+        re-established and the action is retried once. Errors after data
+        was sent are raised after closing the connection, actions are not
+        necessarily idempotent.
+
+        :param device: host name or (host, port, app_label) tuple
+        :param action: callable taking the SmartTV instance
+        :return: return value of action
+        """
+        key = self._key(device)
+        (tv, lock) = self._entry(key)
+        with lock:
+            if tv._sock is None:
+                self._connect(tv)
+            writes = tv._writes
+            try:
+                return action(tv)
+            except (socket.timeout, socket.error) as e:
+                self._drop(tv)
+                if tv._writes != writes:
+                    raise
+                _log(logging.INFO, 'Reconnecting to %s:%d after %r', key[0],
+                     key[1], e)
+                self._connect(tv)
+                if tv.metrics is not None:
+                    tv.metrics.inc('reconnects')
+                return action(tv)
+
+    @classmethod
+    def _connect(cls, tv: base.SmartTV) -> None:
+        """Connect and authenticate, leaving tv disconnected on errors."""
+        try:
+            tv.connect()
+        except Exception:
+            cls._drop(tv)
+            raise
+
+    @staticmethod
+    def _drop(tv: base.SmartTV) -> None:
+        """Close a broken connection, ignoring errors."""
+        if tv._sock is not None:
+            try:
+                tv.disconnect()
+            except socket.error:
+                tv._sock = None
+
+    def _timed_call(self, device: DeviceKey,
+                    action: Callable[[base.SmartTV], object]) -> DeviceResult:
+        """Run call() and wrap outcome and latency in a DeviceResult."""
+        start = time.monotonic()
+        try:
+            result = self.call(device, action)
+        except Exception as e:
+            return DeviceResult(device, None, e, time.monotonic() - start)
+        return DeviceResult(device, result, None, time.monotonic() - start)
+
+    def fanout(self, devices: Iterable[Union[str, DeviceKey]],
+               action: Callable[[base.SmartTV], object],
+               max_workers: Optional[int] = None) -> FanoutResult:
+        """
+        Run an action on many devices concurrently.
+
+        :param devices: host names or (host, port, app_label) tuples
+        :param action: callable taking a SmartTV instance
+        :param max_workers: run on a separate thread pool of this size
+                            instead of the pool's workers, eG one thread per
+                            device for actions that have to run at the same
+                            time everywhere
+        :return: results for all devices
+        """
+        keys = [self._key(d) for d in devices]
+        start = time.monotonic()
+        if max_workers is None:
+            futures = [self._executor.submit(self._timed_call, k, action)
+                       for k in keys]
+            results = [f.result() for f in futures]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(self._timed_call, k, action)
+                           for k in keys]
+                results = [f.result() for f in futures]
+        return FanoutResult(results, time.monotonic() - start)
+
+    def submit(self, device: Union[str, DeviceKey],
+               action: Callable[[base.SmartTV], object]) -> Future:
+        """
+        Queue an action for a device without waiting for it.
+
+        Actions for the same device run one after the other in the order
+        they were submitted, actions for different devices concurrently.
+        Devices take turns on the worker threads, so a long queue for one
+        device does not hold up the others. Wait for the futures before
+        closing the pool.
+
+        :param device: host name or (host, port, app_label) tuple
+        :param action: callable taking the SmartTV instance
+        :return: future resolving to a DeviceResult
+        """
+        key = self._key(device)
+        future = Future()
+        with self._lock:
+            queue = self._queues.get(key)
+            idle = queue is None
+            if idle:
+                queue = self._queues[key] = collections.deque()
+            queue.append((action, future))
+        if idle:
+            self._executor.submit(self._run_queued, key)
+        return future
+
+    def _run_queued(self, key: DeviceKey) -> None:
+        """Run the next queued action of a device, then requeue it."""
+        with self._lock:
+            (action, future) = self._queues[key].popleft()
+        if future.set_running_or_notify_cancel():
+            future.set_result(self._timed_call(key, action))
+        with self._lock:
+            if not self._queues[key]:
+                del self._queues[key]
+                return
+        self._executor.submit(self._run_queued, key)
+
+    def send_key(self, devices: Iterable[Union[str, DeviceKey]],
+                 key: str) -> FanoutResult:
+        """
+        Send a key event to many devices.
+
+        :param devices: host names or (host, port, app_label) tuples
+        :param key: key code to send. must start with "KEY_"
+        :return: results for all devices
+        """
+        return self.fanout(devices, lambda tv: tv.send_key(key))
+
+    def send_text(self, devices: Iterable[Union[str, DeviceKey]],
+                  text: str) -> FanoutResult:
+        """
+        Send a text to many devices.
+
+        :param devices: host names or (host, port, app_label) tuples
+        :param text: text to send
+        :return: results for all devices
+        """
+        return self.fanout(devices, lambda tv: tv.send_text(text))
+
+    def discard(self, device: Union[str, DeviceKey]) -> None:
+        """
+        Close and forget the connection of a device.
+
+        :param device: host name or (host, port, app_label) tuple
+        """
+        key = self._key(device)
+        with self._lock:
+            tv = self._connections.pop(key, None)
+            lock = self._locks.pop(key, None)
+        if tv is not None:
+            with lock:
+                self._drop(tv)
+
+    def close(self) -> None:
+        """Close all connections and stop the worker threads."""
+        with self._lock:
+            devices = list(self._connections)
+        for key in devices:
+            self.discard(key)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,301 @@
+"""
+Rate limited send queue per connection.
+
+Devices drop or reorder keys sent in fast bursts. A SendQueue sends key
+events and texts from a bounded queue in a background thread, limited by a
+token bucket, so keys go out as fast as the device handles them:
+
+    tv_queue = SendQueue(tv, model='UE40D5720')
+    for i in range(20):
+        tv_queue.put_key('KEY_VOLUP')
+    tv_queue.join()
+
+Repeated keys queued back to back share a single queue entry (and can be
+capped with max_repeat). If the queue is full the overflow policy decides
+whether producers block, the oldest entry or the new one is dropped.
+"""
+
+import collections
+import logging
+import queue
+import socket
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from samsung import base
+from samsung.base import _log
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('SendQueue', 'TokenBucket', 'RATE_LIMITS', 'rate_limit')
+
+
+# key events per second and burst size by model name prefix, the longest
+# matching prefix wins; add entries for devices with measured limits
+RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    '': (5.0, 3),
+}
+
+
+def rate_limit(model: Optional[str] = None) -> Tuple[float, int]:
+    """
+    Get the rate limit for a device model.
+
+    :param model: model name, eG 'UE40D5720' (default: None = generic)
+    :return: (keys per second, burst size) tuple
+    """
+    model = model or ''
+    prefix = max((p for p in RATE_LIMITS if model.startswith(p)), key=len)
+    return RATE_LIMITS[prefix]
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter.
+
+    Holds up to burst tokens, refilled with rate tokens per second. take()
+    reserves a token even if none is available and returns how long to
+    wait before using it.
+
+    :ivar rate: tokens added per second
+    :ivar burst: maximum number of tokens
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Constructor, the bucket starts full.
+
+        :param rate: tokens added per second
+        :param burst: maximum number of tokens
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def __repr__(self) -> str:
+        return '%s(%r, %r)' % (self.__class__.__name__, self.rate,
+                               self.burst)
+
+    def take(self) -> float:
+        """
+        Take a token.
+
+        :return: seconds to wait until the token may be used
+        """
+        now = time.monotonic()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+
+class SendQueue:
+    """
+    Bounded queue sending messages to a device in a background thread.
+
+    Entries are [key, frame, count] lists, key is None for texts. Send
+    errors are retried once after reconnecting, messages that still fail
+    are counted as dropped.
+
+    :ivar device: SmartTV instance messages are sent to
+    :ivar bucket: TokenBucket limiting the send rate
+    :ivar dropped: number of messages dropped by the overflow policy,
+                   max_repeat or send errors
+    :ivar coalesced: number of keys merged into an already queued entry
+    :ivar sent: number of messages sent
+    """
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+
+    def __init__(self, device: base.SmartTV, model: Optional[str] = None,
+                 rate: Optional[float] = None, burst: Optional[int] = None,
+                 maxsize: int = 64, overflow: str = BLOCK,
+                 coalesce: bool = True, max_repeat: Optional[int] = None):
+        """
+        Constructor, starts the sending thread.
+
+        :param device: SmartTV instance to send to, connected on first send
+                       if necessary
+        :param model: device model to take rate and burst from, see
+                      RATE_LIMITS
+        :param rate: messages per second, overrides the model setting
+        :param burst: messages sent without delay after idle periods,
+                      overrides the model setting
+        :param maxsize: maximum number of queue entries
+        :param overflow: policy if the queue is full: 'block' waits for
+                         space, 'drop_oldest' discards the oldest entry and
+                         'drop_newest' the new message
+        :param coalesce: merge a key into the last queue entry if it is the
+                         same key
+        :param max_repeat: maximum count of a merged entry, further repeats
+                           are dropped (default: None = unlimited)
+        """
+        if overflow not in (self.BLOCK, self.DROP_OLDEST, self.DROP_NEWEST):
+            raise ValueError('unknown overflow policy %r' % overflow)
+        (model_rate, model_burst) = rate_limit(model)
+        self.device = device
+        self.bucket = TokenBucket(model_rate if rate is None else rate,
+                                  model_burst if burst is None else burst)
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.coalesce = coalesce
+        self.max_repeat = max_repeat
+        self.dropped = 0
+        self.coalesced = 0
+        self.sent = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._work, daemon=True,
+            name='sendqueue-%s' % device._sock_args[0])
+        self._thread.start()
+
+    def __repr__(self) -> str:
+        return '%s(%r, queued=%d)' % (self.__class__.__name__, self.device,
+                                      len(self._queue))
+
+    def __len__(self) -> int:
+        """Number of queue entries."""
+        return len(self._queue)
+
+    def put_key(self, key: str, timeout: Optional[float] = None) -> bool:
+        """
+        Queue a key event.
+
+        :param key: key code to send. must start with "KEY_"
+        :param timeout: maximum seconds to block if the queue is full and
+                        the overflow policy is 'block'
+        :return: True if the key was queued, False if it was dropped
+        :raises: queue.Full if blocking timed out
+        """
+        with self._cond:
+            last = self._queue[-1] if self._queue else None
+            if self.coalesce and last is not None and last[0] == key:
+                if self.max_repeat is not None and \
+                        last[2] >= self.max_repeat:
+                    self._drop(1)
+                    return False
+                last[2] += 1
+                self.coalesced += 1
+                self._count('keys_coalesced')
+                return True
+        return self._put([key, self.device._key_frame(key), 1], timeout)
+
+    def put_text(self, text: str, timeout: Optional[float] = None) -> bool:
+        """
+        Queue a text.
+
+        :param text: text to send
+        :param timeout: maximum seconds to block if the queue is full and
+                        the overflow policy is 'block'
+        :return: True if the text was queued, False if it was dropped
+        :raises: queue.Full if blocking timed out
+        """
+        return self._put([None, base.build_text_message(
+            self.device.app_label, text), 1], timeout)
+
+    def _put(self, entry: list, timeout: Optional[float]) -> bool:
+        """Append an entry, applying the overflow policy."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('send queue is closed')
+            if len(self._queue) >= self.maxsize:
+                if self.overflow == self.DROP_NEWEST:
+                    self._drop(entry[2])
+                    return False
+                elif self.overflow == self.DROP_OLDEST:
+                    self._drop(self._queue.popleft()[2])
+                elif not self._cond.wait_for(
+                        lambda: len(self._queue) < self.maxsize or
+                        self._closed, timeout):
+                    raise queue.Full('%d entries queued for %r' % (
+                        len(self._queue), self.device))
+                elif self._closed:
+                    raise RuntimeError('send queue is closed')
+            self._queue.append(entry)
+            self._cond.notify_all()
+            return True
+
+    def _drop(self, count: int) -> None:
+        """Count dropped messages."""
+        self.dropped += count
+        self._count('keys_dropped', count)
+
+    def _count(self, name: str, value: int = 1) -> None:
+        """Increment a counter of the device metrics if enabled."""
+        if self.device.metrics is not None:
+            self.device.metrics.inc(name, value)
+
+    def _work(self) -> None:
+        """Sending thread main loop."""
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                entry = self._queue[0]
+                entry[2] -= 1
+                if entry[2] <= 0:
+                    self._queue.popleft()
+                self._busy = True
+                self._cond.notify_all()
+            delay = self.bucket.take()
+            if delay:
+                time.sleep(delay)
+            self._send(entry[1])
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _send(self, frame: bytes) -> None:
+        """Send a frame, reconnecting once on errors."""
+        for attempt in (0, 1):
+            try:
+                self.device.sendall(frame)
+                self.sent += 1
+                return
+            except (socket.timeout, socket.error,
+                    base.AuthenticationError) as e:
+                _log(logging.INFO, 'Sending to %r failed: %r', self.device, e)
+                if self.device._sock is not None:
+                    try:
+                        self.device.disconnect()
+                    except socket.error:
+                        self.device._sock = None
+        self._drop(1)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all queued messages are sent.
+
+        :param timeout: maximum seconds to wait (None = forever)
+        :return: True if the queue is empty, False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._queue and not self._busy, timeout)
+
+    def close(self, flush: bool = True) -> None:
+        """
+        Stop the sending thread.
+
+        :param flush: send queued messages first, otherwise they are
+                      discarded
+        """
+        with self._cond:
+            self._closed = True
+            if not flush:
+                self._queue.clear()
+            self._cond.notify_all()
+        self._thread.join()
@@ -0,0 +1,340 @@
+"""
+Persistent sessions with fast reconnects.
+
+A Session wraps a SmartTV connection. Lost connections are re-established
+in a background thread with exponential backoff while sends are queued,
+so callers never block on a reconnect. Devices that already approved the
+application are remembered in an ApprovalCache and re-authenticated with a
+short timeout instead of waiting for an on-screen confirmation.
+"""
+
+import collections
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+from typing import Iterable, Optional, Tuple, Union
+
+from samsung import base
+from samsung.base import _log
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('ApprovalCache', 'Session', 'approvals')
+
+
+ApprovalKey = Tuple[str, str, str]
+
+
+class ApprovalCache:
+    """
+    Set of (host, app_label, mac) tuples known to be approved by the device.
+
+    If a path is given the cache is loaded from and saved to a JSON file so
+    approvals survive restarts.
+
+    :ivar path: optional file name used for persistence
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Constructor.
+
+        :param path: optional JSON file to load and save approvals
+        """
+        self.path = path
+        self._approved = set()
+        self._lock = threading.Lock()
+        if path is not None:
+            self.load()
+
+    def __contains__(self, key: ApprovalKey) -> bool:
+        return tuple(key) in self._approved
+
+    def __len__(self) -> int:
+        return len(self._approved)
+
+    def __iter__(self) -> Iterable[ApprovalKey]:
+        return iter(list(self._approved))
+
+    def add(self, key: ApprovalKey) -> None:
+        """
+        Remember an approved device.
+
+        :param key: (host, app_label, mac) tuple
+        """
+        with self._lock:
+            if tuple(key) in self._approved:
+                return
+            self._approved.add(tuple(key))
+        self.save()
+
+    def discard(self, key: ApprovalKey) -> None:
+        """
+        Forget an approval, eG after the device denied access.
+
+        :param key: (host, app_label, mac) tuple
+        """
+        with self._lock:
+            if tuple(key) not in self._approved:
+                return
+            self._approved.discard(tuple(key))
+        self.save()
+
+    def load(self) -> None:
+        """Load approvals from self.path, a missing file is ignored."""
+        try:
+            with open(self.path) as fp:
+                entries = json.load(fp)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._approved.update(tuple(e) for e in entries)
+
+    def save(self) -> None:
+        """Save approvals to self.path if set."""
+        if self.path is None:
+            return
+        with self._lock:
+            entries = sorted(self._approved)
+        with open(self.path, 'w') as fp:
+            json.dump(entries, fp)
+
+
+approvals = ApprovalCache()
+
+
+class Session:
+    """
+    SmartTV connection that reconnects in the background.
+
+    The first connect() is blocking, it might need a confirmation on the
+    device. Afterwards a lost connection is re-established by a background
+    thread retrying with exponential backoff. Data sent meanwhile is queued
+    (up to max_queue messages) and transmitted in order once the
+    connection is back. A connection closed by the device is noticed
+    before sending, not only when a write fails.
+
+    :ivar device: the wrapped SmartTV instance
+    :ivar reconnects: number of successful reconnects
+    """
+
+    def __init__(self, device: base.SmartTV,
+                 approval_cache: Optional[ApprovalCache] = None,
+                 max_queue: int = 100,
+                 backoff: Tuple[float, float] = (0.05, 30.0),
+                 approved_auth_timeout: Union[int, float] = 2.0):
+        """
+        Constructor.
+
+        :param device: SmartTV instance to manage
+        :param approval_cache: cache of approved devices (default: the
+                               module level approvals)
+        :param max_queue: maximum number of messages queued while
+                          reconnecting
+        :param backoff: initial and maximum delay between reconnect
+                        attempts in seconds
+        :param approved_auth_timeout: authentication timeout used for
+                                      devices that approved us before
+        """
+        self.device = device
+        self.approvals = approvals if approval_cache is None \
+            else approval_cache
+        self.max_queue = max_queue
+        self.backoff = backoff
+        self.approved_auth_timeout = approved_auth_timeout
+        self.reconnects = 0
+        self._queue = collections.deque()
+        self._lock = threading.RLock()
+        self._connected = False
+        self._closed = threading.Event()
+        self._reconnector: Optional[threading.Thread] = None
+
+    def __repr__(self) -> str:
+        return '%s(%r)' % (self.__class__.__name__, self.device)
+
+    @property
+    def key(self) -> ApprovalKey:
+        """(host, app_label, mac) tuple of this session."""
+        return (self.device._sock_args[0], self.device.app_label,
+                base.local_mac())
+
+    @property
+    def connected(self) -> bool:
+        """True if the connection is currently established."""
+        return self._connected
+
+    @property
+    def queued(self) -> int:
+        """Number of messages waiting for a reconnect."""
+        return len(self._queue)
+
+    def connect(self) -> None:
+        """
+        Connect and authenticate, blocking until done.
+
+        :raises: AuthenticationError, socket.error
+        """
+        with self._lock:
+            self._closed.clear()
+            self._authenticate()
+            self._connected = True
+
+    def _authenticate(self) -> None:
+        """
+        Connect the device, using a short timeout for approved devices.
+
+        :raises: AuthenticationError, socket.error
+        """
+        device = self.device
+        approved = self.key in self.approvals
+        auth_settings = (device._auth_timeout, device._auth_tries)
+        if approved:
+            device._auth_timeout = self.approved_auth_timeout
+            device._auth_tries = 1
+        try:
+            device.connect()
+        except base.AuthenticationError:
+            self.approvals.discard(self.key)
+            self._close_device()
+            raise
+        except Exception:
+            self._close_device()
+            raise
+        finally:
+            (device._auth_timeout, device._auth_tries) = auth_settings
+        self.approvals.add(self.key)
+
+    def _close_device(self) -> None:
+        """Close the device socket, ignoring errors."""
+        if self.device._sock is not None:
+            try:
+                self.device.disconnect()
+            except socket.error:
+                self.device._sock = None
+
+    def send(self, data: bytes) -> bool:
+        """
+        Send data or queue it if the connection is down.
+
+        :param data: encoded message to send
+        :return: True if the data was sent right away, False if queued
+        :raises: queue.Full if the queue limit is reached
+        """
+        with self._lock:
+            if self._connected and not self._queue:
+                try:
+                    self._check_connection()
+                    self.device.sendall(data)
+                    return True
+                except (socket.timeout, socket.error) as e:
+                    self._lost(e)
+            if len(self._queue) >= self.max_queue:
+                raise queue.Full('%d messages queued for %r' % (
+                    len(self._queue), self.device))
+            self._queue.append(data)
+            self._start_reconnect()
+            return False
+
+    def _check_connection(self) -> None:
+        """
+        Notice a connection closed by the device before writing to it.
+
+        Writing to a connection the device closed still succeeds once (the
+        data is lost), so the socket is checked for EOF first. Messages
+        received meanwhile are consumed, unless a receiver or the ack
+        reader reads the socket; then their end of file tells.
+
+        :raises: ConnectionError if the device closed the connection
+        """
+        device = self.device
+        if device._acks_read_elsewhere():
+            if device._sock is None or device._acks.error is not None:
+                raise ConnectionError('connection closed by device')
+            return
+        if device._sock is None:
+            raise ConnectionError('not connected')
+        while base._wait_readable([device._sock], 0.0):
+            for msg in device._recv_until(time.monotonic()):
+                device._acks.feed(msg)
+
+    def send_key(self, key: str) -> bool:
+        """
+        Send a key event or queue it while reconnecting.
+
+        :param key: key code to send. must start with "KEY_"
+        :return: True if the key was sent right away, False if queued
+        """
+        return self.send(self.device._key_frame(key))
+
+    def send_text(self, text: str) -> bool:
+        """
+        Send a text or queue it while reconnecting.
+
+        :param text: text to send
+        :return: True if the text was sent right away, False if queued
+        """
+        return self.send(base.build_text_message(self.device.app_label,
+                                                 text))
+
+    def _lost(self, error: Exception) -> None:
+        """Handle a broken connection."""
+        _log(logging.INFO, 'Connection to %r lost: %r', self.device, error)
+        self._connected = False
+        self._close_device()
+
+    def _start_reconnect(self) -> None:
+        """Start the reconnect thread unless it is already running."""
+        if self._closed.is_set():
+            return
+        if self._reconnector is None or not self._reconnector.is_alive():
+            self._reconnector = threading.Thread(
+                target=self._reconnect_loop, daemon=True,
+                name='reconnect-%s' % self.device._sock_args[0])
+            self._reconnector.start()
+
+    def _reconnect_loop(self) -> None:
+        """Reconnect with exponential backoff and flush the queue."""
+        (delay, max_delay) = self.backoff
+        while not self._closed.is_set():
+            try:
+                self._authenticate()
+            except (socket.timeout, socket.error, base.AuthenticationError,
+                    ValueError) as e:
+                # ValueError: unexpected authentication response
+                _log(logging.INFO, 'Reconnect to %r failed: %r, retrying in '
+                     '%.2fs', self.device, e, delay)
+            else:
+                with self._lock:
+                    if self._closed.is_set():
+                        # closed while authenticating
+                        self._close_device()
+                        return
+                    try:
+                        while self._queue:
+                            self.device.sendall(self._queue[0])
+                            self._queue.popleft()
+                    except (socket.timeout, socket.error) as e:
+                        self._lost(e)
+                    else:
+                        self._connected = True
+                        self.reconnects += 1
+                        if self.device.metrics is not None:
+                            self.device.metrics.inc('reconnects')
+                        return
+            self._closed.wait(delay)
+            delay = min(delay * 2, max_delay)
+
+    def close(self) -> None:
+        """Stop reconnecting, drop queued data and disconnect."""
+        self._closed.set()
+        with self._lock:
+            self._queue.clear()
+            self._connected = False
+            self._close_device()
+        if self._reconnector is not None:
+            self._reconnector.join()
@@ -0,0 +1,197 @@
+"""
+Cached device state from STATE_CHANGE and TIMESHIFT messages.
+
+Devices report what they are showing (TV picture, menu, teletext,
+overlays) with STATE_CHANGE messages and timeshift with TIMESHIFT
+messages. DeviceState keeps the last reported mode so it can be read
+without a round trip to the device, and allows waiting for a specific
+mode:
+
+    state = DeviceState()
+    receiver.add_listener(state, type_=ResponseType.STATE_CHANGE)
+    receiver.add_listener(state, type_=ResponseType.TIMESHIFT)
+    receiver.send_key('KEY_MENU')
+    state.wait_for(UIMode.MENU, timeout=2.0)
+"""
+
+import enum
+import threading
+import time
+from typing import Dict, Optional, Union
+
+from samsung import base
+from samsung.base import ResponsePayload, ResponseType
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('UIMode', 'DeviceState', 'DeviceStates', 'ui_mode')
+
+
+class UIMode(enum.Enum):
+    """
+    What the device is showing, as far as known.
+
+    See docs/Responses.md for the observed status payloads.
+    """
+    UNKNOWN = 0
+    TV = 1
+    MENU = 2
+    TTX = 3
+    OVERLAY = 4
+    TIMESHIFT = 5
+
+
+_PAYLOAD_MODES = {
+    ResponsePayload.STATUS_SHOWING_TV: UIMode.TV,
+    ResponsePayload.STATUS_SHOWING_MENU: UIMode.MENU,
+    ResponsePayload.STATUS_SHOWING_TTX: UIMode.TTX,
+    ResponsePayload.STATUS_SHOWING_OVERLAY: UIMode.OVERLAY,
+}
+
+# the third payload byte carries the mode bits, the first byte differs
+# between devices (see docs/Responses.md)
+_MODE_BITS = {0x01: UIMode.TV, 0x02: UIMode.MENU, 0x0c: UIMode.TTX,
+              0x18: UIMode.OVERLAY, 0x04: UIMode.TIMESHIFT}
+
+
+def ui_mode(message: base.Message) -> Optional[UIMode]:
+    """
+    Get the mode a STATE_CHANGE or TIMESHIFT message reports.
+
+    :param message: received message
+    :return: reported mode, UIMode.UNKNOWN for unknown status payloads or
+             None if message is not a status message
+    """
+    if message.type == ResponseType.TIMESHIFT.value:
+        return UIMode.TIMESHIFT
+    if message.type != ResponseType.STATE_CHANGE.value:
+        return None
+    try:
+        return _PAYLOAD_MODES[message.response_payload]
+    except KeyError:
+        pass
+    if len(message.raw_payload) > 2:
+        return _MODE_BITS.get(message.raw_payload[2], UIMode.UNKNOWN)
+    return UIMode.UNKNOWN
+
+
+class DeviceState:
+    """
+    Current UI mode of a device, updated from received messages.
+
+    Instances are callables taking a Message (and ignoring further
+    arguments), so they can be added as listener to any receiver.
+
+    :ivar mode: last reported UIMode
+    :ivar changed_at: time.monotonic() of the last mode change or None
+    :ivar updated_at: time.monotonic() of the last status message or None
+    :ivar last_message: last status message received
+    """
+
+    def __init__(self):
+        self.mode = UIMode.UNKNOWN
+        self.changed_at: Optional[float] = None
+        self.updated_at: Optional[float] = None
+        self.last_message: Optional[base.Message] = None
+        self._changed = threading.Condition()
+
+    def __repr__(self) -> str:
+        return '%s(mode=%s)' % (self.__class__.__name__, self.mode.name)
+
+    def __call__(self, message: base.Message, *args) -> None:
+        """Listener interface, see feed."""
+        self.feed(message)
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last mode change or None."""
+        if self.changed_at is None:
+            return None
+        return time.monotonic() - self.changed_at
+
+    def feed(self, message: base.Message) -> bool:
+        """
+        Update the state from a received message.
+
+        :param message: received message, non status messages are ignored
+        :return: True if the mode changed
+        """
+        mode = ui_mode(message)
+        if mode is None:
+            return False
+        now = time.monotonic()
+        with self._changed:
+            self.last_message = message
+            self.updated_at = now
+            if mode is self.mode:
+                return False
+            self.mode = mode
+            self.changed_at = now
+            self._changed.notify_all()
+        return True
+
+    def wait_for(self, mode: UIMode, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the device reports a mode.
+
+        Returns immediately if the device already is in this mode.
+
+        :param mode: mode to wait for
+        :param timeout: maximum seconds to wait (None = forever)
+        :return: True if the mode was reached, False on timeout
+        """
+        with self._changed:
+            return self._changed.wait_for(lambda: self.mode is mode, timeout)
+
+    def wait_change(self, timeout: Optional[float] = None) -> Optional[UIMode]:
+        """
+        Wait for the next mode change.
+
+        :param timeout: maximum seconds to wait (None = forever)
+        :return: the new mode or None on timeout
+        """
+        with self._changed:
+            changed_at = self.changed_at
+            if self._changed.wait_for(lambda: self.changed_at != changed_at,
+                                      timeout):
+                return self.mode
+        return None
+
+
+class DeviceStates:
+    """
+    DeviceState per device for receivers handling many devices.
+
+    Can be added as listener to a MultiReceiver, which calls listeners with
+    the message and the device it came from.
+    """
+
+    def __init__(self):
+        self._states: Dict[object, DeviceState] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, message: base.Message, device: object) -> None:
+        """Listener interface, update the state of device."""
+        self[device].feed(message)
+
+    def __getitem__(self, device: object) -> DeviceState:
+        """
+        Get the state of a device, creating it if necessary.
+
+        :param device: device as passed by the receiver
+        :return: DeviceState of the device
+        """
+        try:
+            return self._states[device]
+        except KeyError:
+            with self._lock:
+                return self._states.setdefault(device, DeviceState())
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def modes(self) -> Dict[object, UIMode]:
+        """Current mode of all known devices."""
+        return {d: s.mode for (d, s) in list(self._states.items())}
@@ -0,0 +1,217 @@
+"""
+Reduce the event stream of noisy devices.
+
+Devices repeat STATE_CHANGE messages and flap between states (eG overlay
+and TV) while a user navigates. An EventStream is added to a receiver like
+any listener and passes a reduced stream on to its own listeners:
+
+    stream = EventStream(debounce=0.3, snapshot_interval=5.0)
+    stream.add_listener(on_change)
+    stream.add_snapshot_listener(publish_dashboard)
+    receiver.add_listener(stream)
+
+For the message types it handles (default: STATE_CHANGE) exact repeats of
+the last delivered message are dropped and, with debounce, all messages
+within the window opened by the first one are reduced to the last of
+them. Messages are tracked per type and per further listener argument,
+so with a MultiReceiver every device is handled on its own. Other message
+types are passed through unchanged.
+
+Snapshot listeners get a dict of the latest message by (type, *args) key
+every snapshot_interval seconds if anything changed.
+
+Debounced messages and snapshots are delivered from a background thread.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from samsung import base
+from samsung.base import _log
+
+
+__version__ = '0.4.0'
+__author__ = 'David Poisl <david@poisl.at>'
+
+__all__ = ('EventStream',)
+
+
+class EventStream:
+    """
+    Deduplicating, debouncing and snapshotting listener stage.
+
+    :ivar received: number of messages received
+    :ivar delivered: number of messages passed on to the listeners
+    """
+
+    def __init__(self, debounce: float = 0.0,
+                 snapshot_interval: Optional[float] = None,
+                 dedup: bool = True,
+                 types: Iterable[Union[base.ResponseType, int]] = (
+                     base.ResponseType.STATE_CHANGE,)):
+        """
+        Constructor.
+
+        :param debounce: window in seconds to reduce messages to the last
+                         one (default: 0.0 = deliver immediately)
+        :param snapshot_interval: seconds between snapshots (default: None
+                                  = no snapshots)
+        :param dedup: drop messages repeating the last delivered one
+        :param types: message types to deduplicate and debounce
+        """
+        self.debounce = debounce
+        self.snapshot_interval = snapshot_interval
+        self.dedup = dedup
+        self.received = 0
+        self.delivered = 0
+        self._types = frozenset(t.value if isinstance(t, base.ResponseType)
+                                else t for t in types)
+        self._listeners: List[Callable] = []
+        self._snapshot_listeners: List[Callable] = []
+        self._delivered: Dict[tuple, bytes] = {}
+        self._latest: Dict[tuple, base.Message] = {}
+        self._pending: Dict[tuple, list] = {}
+        self._changed = False
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        if snapshot_interval is not None:
+            self._start()
+
+    def __repr__(self) -> str:
+        return '%s(debounce=%r, received=%d, delivered=%d)' % (
+            self.__class__.__name__, self.debounce, self.received,
+            self.delivered)
+
+    def add_listener(self, listener: Callable) -> None:
+        """
+        Add a listener for the reduced stream.
+
+        :param listener: callable taking the message and the arguments the
+                         receiver passed along with it
+        """
+        self._listeners.append(listener)
+
+    def add_snapshot_listener(self, listener: Callable) -> None:
+        """
+        Add a listener for periodic snapshots.
+
+        :param listener: callable taking a dict of the latest message by
+                         (type, *args) key
+        """
+        self._snapshot_listeners.append(listener)
+
+    def __call__(self, msg: base.Message, *args) -> None:
+        """Listener interface, feed a received message."""
+        self.received += 1
+        if msg.type not in self._types:
+            self._deliver(msg, args)
+            return
+        key = (msg.type,) + args
+        with self._cond:
+            self._latest[key] = msg
+            self._changed = True
+            if self.debounce:
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = [time.monotonic() + self.debounce,
+                                          msg, args]
+                    self._start()
+                    self._cond.notify()
+                else:
+                    pending[1] = msg
+                return
+            if not self._update(key, msg):
+                return
+        self._deliver(msg, args)
+
+    def _update(self, key: tuple, msg: base.Message) -> bool:
+        """Remember a message as delivered, False if it is a repeat."""
+        if self.dedup and self._delivered.get(key) == msg.raw_payload:
+            return False
+        self._delivered[key] = msg.raw_payload
+        return True
+
+    def _deliver(self, msg: base.Message, args: tuple) -> None:
+        """Call all listeners."""
+        self.delivered += 1
+        for listener in self._listeners:
+            try:
+                listener(msg, *args)
+            except Exception:
+                _log(logging.ERROR, 'Listener %r failed', listener,
+                     exc_info=True)
+
+    def _start(self) -> None:
+        """Start the background thread if necessary."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name='event-stream')
+            self._thread.start()
+
+    def _due(self, now: Optional[float]) -> list:
+        """Take pending messages due at now (None = all) to deliver."""
+        due = []
+        for (key, (deadline, msg, args)) in list(self._pending.items()):
+            if now is None or deadline <= now:
+                del self._pending[key]
+                if self._update(key, msg):
+                    due.append((msg, args))
+        return due
+
+    def _run(self) -> None:
+        """Deliver debounced messages and snapshots."""
+        next_snapshot = None
+        if self.snapshot_interval is not None:
+            next_snapshot = time.monotonic() + self.snapshot_interval
+        while True:
+            snapshot = None
+            with self._cond:
+                deadlines = [p[0] for p in self._pending.values()]
+                if next_snapshot is not None:
+                    deadlines.append(next_snapshot)
+                timeout = None
+                if deadlines:
+                    timeout = max(min(deadlines) - time.monotonic(), 0.0)
+                if not self._closed and timeout != 0.0:
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                now = time.monotonic()
+                due = self._due(now)
+                if next_snapshot is not None and next_snapshot <= now:
+                    next_snapshot = now + self.snapshot_interval
+                    if self._changed:
+                        snapshot = dict(self._latest)
+                        self._changed = False
+            for (msg, args) in due:
+                self._deliver(msg, args)
+            if snapshot is not None:
+                self._snapshot(snapshot)
+
+    def _snapshot(self, snapshot: Dict[tuple, base.Message]) -> None:
+        """Call all snapshot listeners."""
+        for listener in self._snapshot_listeners:
+            try:
+                listener(snapshot)
+            except Exception:
+                _log(logging.ERROR, 'Snapshot listener %r failed', listener,
+                     exc_info=True)
+
+    def flush(self) -> None:
+        """Deliver all debounced messages now."""
+        with self._cond:
+            due = self._due(None)
+        for (msg, args) in due:
+            self._deliver(msg, args)
+
+    def close(self) -> None:
+        """Deliver pending messages and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
@@ -14,10 +14,14 @@ setup(name='samsung',
       url='https://github.com/dpoisl/pySamsung/',
       platforms=('any',),
       packages=find_packages(),
+      extras_require={'yaml': ['PyYAML']},
       entry_points={
           'console_scripts': [
               'sstv_remote = samsung.cli:remote',
-              'sstv_listener = samsung.cli:listener',
+              'sstv_listener = samsung.cli:listen',
+              'sstv_discover = samsung.cli:discover',
+              'sstv_daemon = samsung.cli:run_daemon',
+              'sstv_scene = samsung.cli:scene',
           ]
       },
       classifiers=('Development Status :: 3 - Alpha',
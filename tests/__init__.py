@@ -0,0 +1,82 @@
+"""
+Tests running the client against samsung.fake.FakeSmartTV, no TV needed.
+
+Run from the repository root: python -m unittest discover -s tests -t .
+"""
+
+import base64
+import contextlib
+import io
+import time
+import unittest
+from typing import Callable, List, Tuple
+from unittest import mock
+
+from samsung import fake
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 5.0) -> bool:
+    """
+    Poll condition until it is true or timeout passed.
+
+    :param condition: callable returning True when done
+    :param timeout: maximum seconds to wait
+    :return: last result of condition
+    """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return condition()
+        time.sleep(0.005)
+    return True
+
+
+def received_keys(server: fake.FakeSmartTV) -> List[str]:
+    """
+    Get the key codes a FakeSmartTV received so far, in order.
+
+    :param server: FakeSmartTV instance
+    :return: list of key codes
+    """
+    # key payload: \x00\x00\x00, 2 byte length, base64 encoded key code
+    return [base64.b64decode(msg.raw_payload[5:]).decode()
+            for msg in list(server.received)
+            if msg.raw_payload.startswith(b'\x00\x00\x00')]
+
+
+def run_cli(entry_point: Callable, *args: str) -> Tuple[object, str, str]:
+    """
+    Run a command line entry point.
+
+    :param entry_point: function from samsung.cli
+    :param args: command line arguments
+    :return: return value, stdout and stderr of the entry point
+    """
+    (out, err) = (io.StringIO(), io.StringIO())
+    with mock.patch('sys.argv', [entry_point.__name__, *args]), \
+            contextlib.redirect_stdout(out), \
+            contextlib.redirect_stderr(err):
+        status = entry_point()
+    return (status, out.getvalue(), err.getvalue())
+
+
+class FakeDeviceTestCase(unittest.TestCase):
+    """
+    Test case with a FakeSmartTV started for every test.
+
+    :ivar server: running FakeSmartTV
+    :ivar address: (host, port) of the server
+    """
+    # keyword arguments for FakeSmartTV
+    server_options = {}
+
+    def setUp(self) -> None:
+        self.server = self.start_server(**self.server_options)
+        self.address = self.server.address
+
+    def start_server(self, **options) -> fake.FakeSmartTV:
+        """Start an additional FakeSmartTV stopped after the test."""
+        server = fake.FakeSmartTV(**options)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
@@ -0,0 +1,190 @@
+"""Tests for samsung.base: framing, authentication and acknowledgements."""
+
+import socket
+import time
+import unittest
+
+from samsung import base, cli, fake
+from samsung.base import ResponsePayload, ResponseType
+
+from tests import FakeDeviceTestCase, wait_until
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.frames = [
+            fake.encode_response(ResponseType.STATE_CHANGE,
+                                 ResponsePayload.STATUS_SHOWING_OVERLAY),
+            fake.encode_response(ResponseType.KEY_CONFIRM,
+                                 ResponsePayload.KEY_OK),
+            fake.encode_response(ResponseType.STATE_CHANGE,
+                                 ResponsePayload.STATUS_SHOWING_TV),
+        ]
+        self.expected = [base.Message.parse(f) for f in self.frames]
+
+    def test_coalesced(self):
+        decoder = base.FrameDecoder()
+        self.assertEqual(decoder.feed(b''.join(self.frames)), self.expected)
+
+    def test_split(self):
+        decoder = base.FrameDecoder()
+        data = b''.join(self.frames)
+        messages = []
+        for i in range(len(data)):
+            messages.extend(decoder.feed(data[i:i + 1]))
+        self.assertEqual(messages, self.expected)
+
+    def test_split_across_frames(self):
+        decoder = base.FrameDecoder()
+        data = b''.join(self.frames)
+        cut = len(self.frames[0]) + 3
+        self.assertEqual(decoder.feed(data[:cut]), self.expected[:1])
+        self.assertEqual(decoder.feed(data[cut:]), self.expected[1:])
+
+    def test_reset(self):
+        decoder = base.FrameDecoder()
+        decoder.feed(self.frames[0][:5])
+        decoder.reset()
+        self.assertEqual(decoder.feed(self.frames[1]), self.expected[1:2])
+
+
+class ReceiveTest(FakeDeviceTestCase):
+
+    def receive(self, device: base.SmartTV, count: int) -> list:
+        messages = []
+        while len(messages) < count:
+            messages.extend(device.recv_messages())
+        return messages
+
+    def test_coalesced_flood(self):
+        device = base.SmartTV('test', *self.address)
+        device.connect()
+        self.addCleanup(device.disconnect)
+        self.server.flood(500, coalesce=True)
+        messages = self.receive(device, 500)
+        self.assertEqual(len(messages), 500)
+        self.assertTrue(all(m.type == ResponseType.STATE_CHANGE.value
+                            for m in messages))
+
+    def test_split_flood(self):
+        device = base.SmartTV('test', *self.address)
+        device.connect()
+        self.addCleanup(device.disconnect)
+        self.server.flood(20, segment_size=1)
+        self.assertEqual(len(self.receive(device, 20)), 20)
+
+    def test_recv_until_reports_disconnect(self):
+        device = base.SmartTV('test', *self.address)
+        device.connect()
+        self.server.stop()
+        start = time.monotonic()
+        with self.assertRaises(ConnectionError):
+            device._recv_until(time.monotonic() + 2.0)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+
+class AuthenticationTest(FakeDeviceTestCase):
+
+    def connect(self, *responses, **options) -> base.SmartTV:
+        server = self.start_server(auth_responses=responses, **options)
+        device = base.SmartTV('test', *server.address, auth_timeout=1.0)
+        device.connect()
+        self.addCleanup(device.disconnect)
+        return device
+
+    def test_ok(self):
+        self.assertIsNotNone(self.connect(ResponsePayload.AUTH_OK)._sock)
+
+    def test_confirmation_then_ok(self):
+        device = self.connect(ResponsePayload.AUTH_NEED_CONFIRMATION,
+                              ResponsePayload.AUTH_OK, auth_delay=0.05)
+        self.assertIsNotNone(device._sock)
+
+    def test_denied(self):
+        with self.assertRaises(base.AuthenticationError):
+            self.connect(ResponsePayload.AUTH_ACCESS_DENIED)
+
+    def test_timeout(self):
+        with self.assertRaises(base.AuthenticationError):
+            self.connect(ResponsePayload.AUTH_TIMEOUT)
+
+
+class IPv6Test(FakeDeviceTestCase):
+
+    def setUp(self) -> None:
+        try:
+            self.server = self.start_server(host='::1')
+        except (OSError, socket.gaierror) as e:
+            self.skipTest('no IPv6: %s' % e)
+        self.address = self.server.address
+
+    def test_connect(self):
+        device = base.SmartTV('test', *self.address)
+        self.addCleanup(device.disconnect)
+        self.assertTrue(base.is_key_ack(
+            device.send_key('KEY_MUTE', ack=True).result(5)))
+        self.assertEqual(device._sock.family, socket.AF_INET6)
+
+    def test_command_file_line(self):
+        (device, command) = cli.parse_command_line(
+            '[::1]:%d KEY_MUTE' % self.address[1])
+        action = cli.command_action(command)
+        tv = base.SmartTV('test', *device)
+        self.addCleanup(tv.disconnect)
+        self.assertEqual(action(tv), (1, 1))
+
+
+class AckTest(FakeDeviceTestCase):
+
+    def device(self, server=None, **options) -> base.SmartTV:
+        server = server or self.server
+        device = base.SmartTV('test', *server.address, **options)
+        self.addCleanup(lambda: device._sock and device.disconnect())
+        return device
+
+    def test_key_future(self):
+        msg = self.device().send_key('KEY_MUTE', ack=True).result(5)
+        self.assertTrue(base.is_key_ack(msg))
+
+    def test_text_future(self):
+        msg = self.device().send_text('hello', ack=True).result(5)
+        self.assertTrue(base.is_key_ack(msg))
+
+    def test_timeout(self):
+        server = self.start_server(ack_keys=False)
+        future = self.device(server).send_key('KEY_MUTE', ack=True,
+                                              timeout=0.2)
+        self.assertTrue(wait_until(future.done, 2.0))
+        self.assertIsInstance(future.exception(), TimeoutError)
+
+    def test_disconnect_fails_futures(self):
+        device = self.device()
+        device.send_key('KEY_MUTE', ack=True).result(5)
+        self.server.stop()
+        for i in range(3):
+            future = device.send_key('KEY_MUTE', ack=True, timeout=30)
+            with self.assertRaises(ConnectionError):
+                future.result(5)
+
+    def test_send_keys_counts_acks(self):
+        device = self.device()
+        self.assertEqual(device.send_keys(['KEY_1', 'KEY_2', 'KEY_3']), 3)
+        self.assertEqual(device.send_keys(['KEY_4', 'KEY_5'], pacing=0.01),
+                         2)
+
+    def test_send_keys_ignores_earlier_acks(self):
+        device = self.device()
+        device.send_text('hello')
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 1))
+        time.sleep(0.05)
+        self.assertEqual(device.send_keys(['KEY_2']), 1)
+
+    def test_send_keys_with_ack_reader(self):
+        device = self.device()
+        device.send_key('KEY_1', ack=True).result(5)
+        self.assertEqual(device.send_keys(['KEY_2', 'KEY_3']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
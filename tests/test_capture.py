@@ -0,0 +1,149 @@
+"""Tests for samsung.capture: recording and replaying traffic."""
+
+import os
+import struct
+import tempfile
+import time
+import unittest
+
+from samsung import base, capture, fake
+from samsung.base import ResponsePayload, ResponseType
+
+from tests import FakeDeviceTestCase
+
+
+class RecorderTest(FakeDeviceTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        (fd, self.path) = tempfile.mkstemp(suffix='.sstvcap')
+        os.close(fd)
+        os.unlink(self.path)
+        self.addCleanup(lambda: os.path.exists(self.path) and
+                        os.unlink(self.path))
+
+    def records(self) -> list:
+        with capture.Capture(self.path) as recorded:
+            return [(r[1], r[2], bytes(r[3])) for r in recorded]
+
+    def device(self, recorder: capture.Recorder) -> base.SmartTV:
+        device = base.SmartTV('test', *self.address)
+        device.recorder = recorder
+        device.connect()
+        self.addCleanup(lambda: device._sock and device.disconnect())
+        return device
+
+    def receive(self, device: base.SmartTV, count: int) -> list:
+        messages = []
+        while len(messages) < count:
+            messages.extend(device.recv_messages())
+        return messages
+
+    def test_round_trip(self):
+        with capture.Recorder(self.path) as recorder:
+            device = self.device(recorder)
+            device.send_key('KEY_MUTE')
+            self.server.flood(20, segment_size=5)
+            expected = self.receive(device, 21)
+        replayed = []
+        replayer = capture.Replayer()
+        replayer.add_listener(replayed.append)
+        with capture.Capture(self.path) as recorded:
+            self.assertEqual(replayer.replay(recorded), len(expected) + 1)
+        self.assertIs(replayed[0].response_payload, ResponsePayload.AUTH_OK)
+        self.assertEqual(replayed[1:], expected)
+        sent = [r[2] for r in self.records() if r[0] == capture.SENT]
+        self.assertEqual(sent[-1], device._key_frame('KEY_MUTE'))
+
+    def test_stream_per_connection(self):
+        with capture.Recorder(self.path) as recorder:
+            device = self.device(recorder)
+            device.disconnect()
+            device.connect()
+            device.disconnect()
+            self.device(recorder)
+        self.assertEqual(sorted({r[1] for r in self.records()}), [0, 1, 2])
+
+    def test_append_continues_streams(self):
+        for _ in range(2):
+            with capture.Recorder(self.path) as recorder:
+                self.device(recorder).disconnect()
+        self.assertEqual(sorted({r[1] for r in self.records()}), [0, 1])
+
+    def test_replay_streams(self):
+        with capture.Recorder(self.path) as recorder:
+            for _ in range(2):
+                device = self.device(recorder)
+                self.server.flood(3)
+                self.receive(device, 3)
+                device.disconnect()
+        replayed = []
+        replayer = capture.Replayer(streams=True)
+        replayer.add_listener(lambda msg, stream: replayed.append(stream),
+                              type_=ResponseType.STATE_CHANGE)
+        with capture.Capture(self.path) as recorded:
+            replayer.replay(recorded)
+        self.assertEqual(replayed, [0, 0, 0, 1, 1, 1])
+
+    def write_v1(self, *records) -> None:
+        header = struct.Struct('<dBHI')
+        with open(self.path, 'wb') as fp:
+            fp.write(b'SSTVCAP\x01')
+            for (direction, stream, data) in records:
+                fp.write(header.pack(time.time(), direction, stream,
+                                     len(data)) + data)
+
+    def test_read_v1(self):
+        frame = fake.encode_response(ResponseType.STATE_CHANGE,
+                                     ResponsePayload.STATUS_SHOWING_MENU)
+        self.write_v1((capture.RECEIVED, 3, frame[:4]),
+                      (capture.SENT, 3, b'key'),
+                      (capture.RECEIVED, 3, frame[4:]))
+        self.assertEqual(self.records(), [
+            (capture.RECEIVED, 3, frame[:4]), (capture.SENT, 3, b'key'),
+            (capture.RECEIVED, 3, frame[4:])])
+        replayed = []
+        replayer = capture.Replayer()
+        replayer.add_listener(replayed.append)
+        with capture.Capture(self.path) as recorded:
+            self.assertEqual(replayer.replay(recorded), 1)
+        self.assertEqual(replayed, [base.Message.parse(frame)])
+
+    def test_recorder_refuses_v1(self):
+        self.write_v1()
+        with self.assertRaises(ValueError):
+            capture.Recorder(self.path)
+
+    def test_truncated_record_ignored(self):
+        with capture.Recorder(self.path) as recorder:
+            recorder.sent(b'first')
+            recorder.sent(b'second')
+        with open(self.path, 'r+b') as fp:
+            fp.truncate(os.path.getsize(self.path) - 1)
+        self.assertEqual(self.records(), [(capture.SENT, 0, b'first')])
+
+    def test_no_capture_file(self):
+        with open(self.path, 'wb') as fp:
+            fp.write(b'NOTACAPTURE')
+        with self.assertRaises(ValueError):
+            capture.Capture(self.path)
+        with self.assertRaises(ValueError):
+            capture.Recorder(self.path)
+
+    def test_failed_send_not_recorded(self):
+        with capture.Recorder(self.path) as recorder:
+            device = base.SmartTV('test', *self.address)
+            device.recorder = recorder
+            device.connect()
+            device._sock.close()
+            frame = device._key_frame('KEY_MUTE')
+            with self.assertRaises(OSError):
+                device.sendall(frame)
+            device._sock = None
+        sent = [r[2] for r in self.records() if r[0] == capture.SENT]
+        self.assertEqual(len(sent), 1)  # authentication only
+        self.assertNotIn(frame, sent)
+
+
+if __name__ == '__main__':
+    unittest.main()
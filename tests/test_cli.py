@@ -0,0 +1,133 @@
+"""Tests for samsung.cli: command parsing and sstv_remote."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from samsung import cli
+
+from tests import FakeDeviceTestCase, received_keys, run_cli, wait_until
+
+
+class CommandStepsTest(unittest.TestCase):
+
+    def test_keys_and_texts(self):
+        self.assertEqual(
+            cli.command_steps(['KEY_MENU', 'KEY_DOWN', 'hello world',
+                               'KEY_ENTER']),
+            [['keys', ['KEY_MENU', 'KEY_DOWN']], ['text', 'hello world'],
+             ['keys', ['KEY_ENTER']]])
+
+    def test_channel(self):
+        self.assertEqual(cli.command_steps(['CH101', 'KEY_ENTER']),
+                         [['keys', ['KEY_0', 'KEY_1', 'KEY_0', 'KEY_1',
+                                    'KEY_ENTER']]])
+
+    def test_empty(self):
+        self.assertEqual(cli.command_steps([]), [])
+
+
+class ParseCommandLineTest(unittest.TestCase):
+
+    def test_host(self):
+        self.assertEqual(cli.parse_command_line('10.0.0.5 KEY_MUTE\n'),
+                         (('10.0.0.5', 55000), 'KEY_MUTE'))
+
+    def test_host_and_port(self):
+        self.assertEqual(cli.parse_command_line('tv.local:55001 CH101', 1),
+                         (('tv.local', 55001), 'CH101'))
+
+    def test_default_port(self):
+        self.assertEqual(cli.parse_command_line('10.0.0.5 KEY_MUTE', 1234),
+                         (('10.0.0.5', 1234), 'KEY_MUTE'))
+
+    def test_text_with_spaces(self):
+        self.assertEqual(cli.parse_command_line('  10.0.0.5  hello  world'),
+                         (('10.0.0.5', 55000), 'hello  world'))
+
+    def test_ipv6(self):
+        self.assertEqual(cli.parse_command_line('[fe80::1]:55001 KEY_MUTE'),
+                         (('fe80::1', 55001), 'KEY_MUTE'))
+        self.assertEqual(cli.parse_command_line('[::1] KEY_MUTE'),
+                         (('::1', 55000), 'KEY_MUTE'))
+
+    def test_ipv6_needs_brackets(self):
+        with self.assertRaises(ValueError):
+            cli.parse_command_line('fe80::1 KEY_MUTE')
+
+    def test_invalid(self):
+        for line in ('10.0.0.5', '[fe80::1 KEY_MUTE', '[::1]x KEY_MUTE',
+                     '10.0.0.5:port KEY_MUTE'):
+            with self.assertRaises(ValueError, msg=line):
+                cli.parse_command_line(line)
+
+    def test_skipped(self):
+        for line in ('', '   \n', '# comment', '  # indented comment'):
+            self.assertIsNone(cli.parse_command_line(line))
+
+
+class RemoteTest(FakeDeviceTestCase):
+
+    def remote(self, *args) -> tuple:
+        """Run sstv_remote, return exit status, stdout and stderr."""
+        return run_cli(cli.remote, *args)
+
+    def test_direct(self):
+        (status, out, err) = self.remote(
+            '-n', '-i', self.address[0], '-p', str(self.address[1]),
+            '-d', '0', 'KEY_MUTE', 'KEY_1')
+        self.assertIsNone(status)
+        self.assertEqual(out, '2/2 keys confirmed\n')
+        self.assertEqual(received_keys(self.server), ['KEY_MUTE', 'KEY_1'])
+        self.assertTrue(wait_until(lambda: not self.server.clients))
+
+    def test_direct_unreachable(self):
+        self.server.stop()
+        (status, out, err) = self.remote(
+            '-n', '-i', self.address[0], '-p', str(self.address[1]),
+            'KEY_MUTE')
+        self.assertEqual(status, 1)
+        self.assertEqual(out, '')
+        self.assertIn('sstv_remote: %s:%d: ' % self.address, err)
+
+    def command_file(self, *lines) -> str:
+        (fd, path) = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(''.join(line + '\n' for line in lines))
+        self.addCleanup(os.unlink, path)
+        return path
+
+    def test_bulk(self):
+        other = self.start_server(ack_keys=False)
+        (host, port) = self.address
+        path = self.command_file(
+            '# two devices',
+            '%s KEY_1' % host,
+            '%s:%d KEY_1' % other.address,
+            '%s CH12' % host,
+            'fe80::1 KEY_1',
+            '%s hello' % host)
+        (status, out, err) = self.remote('-p', str(port), '-t', '0.1',
+                                         '-f', path)
+        results = sorted((json.loads(line) for line in out.splitlines()),
+                         key=lambda r: r['line'])
+        self.assertEqual(status, 1)
+        self.assertEqual([(r['line'], r['ok']) for r in results],
+                         [(2, True), (3, False), (4, True), (5, False),
+                          (6, True)])
+        self.assertEqual((results[1]['acked'], results[1]['sent']), (0, 1))
+        self.assertIn('brackets', results[3]['error'])
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 6))
+        self.assertEqual(received_keys(self.server),
+                         ['KEY_1', 'KEY_0', 'KEY_0', 'KEY_1', 'KEY_2'])
+
+    def test_bulk_missing_file(self):
+        with self.assertRaises(SystemExit) as raised:
+            self.remote('-f', os.path.join(tempfile.gettempdir(),
+                                           'no-such-commands.txt'))
+        self.assertEqual(raised.exception.code, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
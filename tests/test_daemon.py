@@ -0,0 +1,107 @@
+"""Tests for samsung.daemon: forwarding commands to pooled connections."""
+
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from samsung import cli, daemon, pool
+
+from tests import FakeDeviceTestCase, received_keys, run_cli, wait_until
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'no Unix sockets')
+class DaemonTest(FakeDeviceTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'sstv_daemon.sock')
+        self.daemon = self.start_daemon()
+
+    def start_daemon(self) -> daemon.ControlServer:
+        server = daemon.ControlServer(
+            self.path, pool.SmartTVPool('test', port=self.address[1]))
+        thread = threading.Thread(target=server.serve_forever,
+                                  kwargs={'poll_interval': 0.05})
+        thread.start()
+        self.thread = thread
+        self.addCleanup(server.server_close)
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def client(self) -> daemon.DaemonClient:
+        client = daemon.DaemonClient(self.path, timeout=5)
+        self.addCleanup(client.close)
+        return client
+
+    def test_send(self):
+        client = self.client()
+        steps = [['keys', ['KEY_1', 'KEY_2'], 0.0], ['text', 'hello']]
+        self.assertEqual(client.send(self.address[0], self.address[1],
+                                     steps)[0], 2)
+        self.assertEqual(client.send(self.address[0], self.address[1],
+                                     steps[:1]), [2])
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 5))
+        self.assertEqual(received_keys(self.server), ['KEY_1', 'KEY_2'] * 2)
+        # the connection is kept for later requests
+        self.assertEqual(self.server.clients, 1)
+        self.assertEqual(client.request('status'), [
+            {'host': self.address[0], 'port': self.address[1],
+             'app_label': 'test', 'connected': True}])
+
+    def test_errors(self):
+        client = self.client()
+        self.assertEqual(client.request('ping'), 'pong')
+        with self.assertRaises(daemon.DaemonError):
+            client.request('reboot')
+        self.server.stop()
+        with self.assertRaises(daemon.DaemonError):
+            client.send(*self.address, [['keys', ['KEY_1'], 0.0]])
+        self.assertTrue(client.running())
+
+    def test_single_instance(self):
+        with self.assertRaises(daemon.DaemonError):
+            daemon.ControlServer(self.path, pool.SmartTVPool('test'))
+
+    def test_stale_socket(self):
+        self.daemon.shutdown()
+        self.daemon.socket.close()
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(self.client().running())
+        self.start_daemon()
+        self.assertTrue(self.client().running())
+
+    def test_shutdown(self):
+        self.assertTrue(self.client().request('shutdown'))
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+
+    def test_remote_uses_daemon(self):
+        with mock.patch.dict(os.environ,
+                             {'SAMSUNG_DAEMON_SOCKET': self.path}):
+            (status, out, err) = run_cli(
+                cli.remote, '-i', self.address[0], '-p', str(self.address[1]),
+                '-d', '0', 'KEY_MUTE')
+        self.assertIsNone(status)
+        self.assertEqual(out, '1/1 keys confirmed\n')
+        # sent through the daemon, which keeps the connection open
+        self.assertEqual(self.server.clients, 1)
+
+    def test_remote_reports_daemon_errors(self):
+        self.server.stop()
+        with mock.patch.dict(os.environ,
+                             {'SAMSUNG_DAEMON_SOCKET': self.path}):
+            (status, out, err) = run_cli(
+                cli.remote, '-i', self.address[0], '-p', str(self.address[1]),
+                'KEY_MUTE')
+        self.assertEqual(status, 1)
+        self.assertTrue(err.startswith('sstv_daemon: '))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Tests for samsung.discovery: probing and fingerprinting devices."""
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from samsung import discovery
+from samsung.base import ResponsePayload
+
+from tests import FakeDeviceTestCase
+
+
+class ScanTest(FakeDeviceTestCase):
+
+    def test_probe(self):
+        self.assertTrue(asyncio.run(discovery.probe(*self.address)))
+        self.server.stop()
+        self.assertFalse(asyncio.run(discovery.probe(*self.address)))
+
+    def test_scan(self):
+        (host, port) = self.address
+        devices = asyncio.run(discovery.scan(host, port, timeout=0.5))
+        self.assertEqual([(d['host'], d['port']) for d in devices],
+                         [(host, port)])
+        self.assertNotIn('auth', devices[0])
+
+    def test_scan_network(self):
+        (host, port) = self.address
+        devices = asyncio.run(discovery.scan(
+            host + '/30', port, concurrency=2, timeout=0.5,
+            authenticate=True, app_label='test'))
+        self.assertEqual([(d['host'], d['auth']) for d in devices],
+                         [(host, 'approved')])
+
+    def test_inventory(self):
+        devices = [
+            {'host': '10.0.0.5', 'port': 55000, 'seen': 1.0,
+             'auth': 'approved'},
+            {'host': '10.0.0.6', 'port': 55001, 'seen': 1.0,
+             'auth': 'timeout'},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'inventory.json')
+            self.assertEqual(discovery.load_inventory(path), [])
+            discovery.save_inventory(path, devices)
+            loaded = discovery.load_inventory(path)
+        self.assertEqual(loaded, devices)
+        self.assertEqual(discovery.hosts(loaded),
+                         [('10.0.0.5', 55000), ('10.0.0.6', 55001)])
+        self.assertEqual(discovery.hosts(loaded, approved_only=True),
+                         [('10.0.0.5', 55000)])
+
+
+class FingerprintTest(FakeDeviceTestCase):
+
+    def fingerprint(self, *responses) -> str:
+        server = self.start_server(auth_responses=responses)
+        return asyncio.run(discovery.fingerprint(*server.address,
+                                                 app_label='test',
+                                                 timeout=0.2))
+
+    def test_approved(self):
+        self.assertEqual(self.fingerprint(ResponsePayload.AUTH_OK),
+                         'approved')
+
+    def test_denied(self):
+        self.assertEqual(self.fingerprint(ResponsePayload.AUTH_ACCESS_DENIED),
+                         'denied')
+
+    def test_unconfirmed(self):
+        self.assertEqual(
+            self.fingerprint(ResponsePayload.AUTH_NEED_CONFIRMATION),
+            'unconfirmed')
+
+    def test_no_response(self):
+        self.assertEqual(self.fingerprint(), 'timeout')
+
+    def test_closed_port(self):
+        self.server.stop()
+        self.assertEqual(asyncio.run(discovery.fingerprint(
+            *self.address, timeout=0.2)), 'error')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+"""Tests for samsung.listener: receivers, stop and ack timeouts."""
+
+import os
+import threading
+import time
+import unittest
+
+from samsung import base, listener
+from samsung.base import ResponsePayload, ResponseType
+
+from tests import FakeDeviceTestCase, wait_until
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on windows
+    resource = None
+
+
+class ThreadReceiverTest(FakeDeviceTestCase):
+
+    def receiver(self, **options) -> listener.ThreadReceiver:
+        receiver = listener.ThreadReceiver('test', *self.address, **options)
+        self.addCleanup(receiver.join, 5)
+        return receiver
+
+    def test_receive_flood(self):
+        received = []
+        receiver = self.receiver()
+        receiver.add_listener(received.append,
+                              type_=ResponseType.STATE_CHANGE)
+        receiver.start()
+        self.assertTrue(wait_until(lambda: self.server.authenticated_clients))
+        self.server.flood(200, coalesce=True)
+        self.assertTrue(wait_until(lambda: len(received) == 200))
+
+    def test_stop_is_immediate(self):
+        receiver = self.receiver(recv_timeout=30)
+        receiver.start()
+        self.assertTrue(wait_until(lambda: self.server.authenticated_clients))
+        start = time.monotonic()
+        receiver.join(5)
+        self.assertFalse(receiver.is_alive())
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_acks(self):
+        receiver = self.receiver()
+        receiver.start()
+        self.assertTrue(wait_until(lambda: self.server.authenticated_clients))
+        futures = [receiver.send_key('KEY_%d' % i, ack=True)
+                   for i in range(20)]
+        for future in futures:
+            self.assertTrue(base.is_key_ack(future.result(5)))
+
+    def test_ack_timeout(self):
+        server = self.start_server(ack_keys=False)
+        receiver = listener.ThreadReceiver('test', *server.address)
+        self.addCleanup(receiver.join, 5)
+        receiver.start()
+        self.assertTrue(wait_until(lambda: server.authenticated_clients))
+        future = receiver.send_key('KEY_MUTE', ack=True, timeout=0.2)
+        self.assertTrue(wait_until(future.done))
+        self.assertIsInstance(future.exception(), TimeoutError)
+
+    def test_device_closes_connection(self):
+        receiver = self.receiver()
+        receiver.start()
+        self.assertTrue(wait_until(lambda: self.server.authenticated_clients))
+        self.server.stop()
+        receiver.join(5)
+        self.assertFalse(receiver.is_alive())
+
+
+class IterReceiverTest(FakeDeviceTestCase):
+
+    def test_iterate(self):
+        receiver = listener.IterReceiver(
+            'test', *self.address,
+            filter_=lambda m: m.type == ResponseType.STATE_CHANGE.value)
+        self.addCleanup(receiver.close)
+        receiver.connect()
+        self.server.flood(10, segment_size=3)
+        messages = [next(receiver) for _ in range(10)]
+        self.assertEqual(len(messages), 10)
+
+    def test_timeout(self):
+        with listener.IterReceiver('test', *self.address,
+                                   timeout=0.1) as receiver:
+            self.assertEqual(list(receiver), [])
+
+    def test_close_from_other_thread(self):
+        receiver = listener.IterReceiver('test', *self.address)
+        receiver.connect()
+        timer = threading.Timer(0.1, receiver.close)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        start = time.monotonic()
+        self.assertEqual(list(receiver), [])
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_device_closes_connection(self):
+        receiver = listener.IterReceiver('test', *self.address)
+        self.addCleanup(receiver.close)
+        receiver.connect()
+        self.server.stop()
+        self.assertEqual(list(receiver), [])
+
+    def test_unreachable_device(self):
+        self.server.stop()
+        receiver = listener.IterReceiver('test', *self.address)
+        with self.assertRaises(ConnectionRefusedError):
+            list(receiver)
+
+    def test_authentication_denied(self):
+        server = self.start_server(
+            auth_responses=(ResponsePayload.AUTH_ACCESS_DENIED,))
+        receiver = listener.IterReceiver('test', *server.address)
+        with self.assertRaises(base.AuthenticationError):
+            list(receiver)
+
+
+class MultiReceiverTest(FakeDeviceTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.receiver = listener.MultiReceiver()
+        self.addCleanup(self.receiver.join, 5)
+        self.receiver.start()
+
+    def test_multiple_devices(self):
+        servers = [self.server] + [self.start_server() for _ in range(2)]
+        received = {}
+        self.receiver.add_listener(
+            lambda msg, device: received.setdefault(id(device), []).append(
+                msg), type_=ResponseType.STATE_CHANGE)
+        for server in servers:
+            self.receiver.add_device(base.SmartTV('test', *server.address))
+        for server in servers:
+            server.flood(50, coalesce=False)
+        self.assertTrue(wait_until(
+            lambda: sorted(len(m) for m in received.values()) == [50] * 3))
+
+    def test_acks(self):
+        device = base.SmartTV('test', *self.address)
+        self.receiver.add_device(device)
+        futures = [device.send_key('KEY_%d' % i, ack=True)
+                   for i in range(20)]
+        for future in futures:
+            self.assertTrue(base.is_key_ack(future.result(5)))
+
+    def test_ack_timeout(self):
+        server = self.start_server(ack_keys=False)
+        device = base.SmartTV('test', *server.address)
+        self.receiver.add_device(device)
+        first = device.send_key('KEY_1', ack=True, timeout=0.1)
+        second = device.send_key('KEY_2', ack=True, timeout=0.3)
+        third = device.send_key('KEY_3', ack=True)
+        for future in (first, second):
+            self.assertTrue(wait_until(future.done))
+            self.assertIsInstance(future.exception(), TimeoutError)
+        self.assertFalse(third.done())
+
+    def test_stop(self):
+        device = base.SmartTV('test', *self.address)
+        self.receiver.add_device(device)
+        start = time.monotonic()
+        self.receiver.join(5)
+        self.assertFalse(self.receiver.is_alive())
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertIsNone(device._sock)
+
+    def test_remove_while_receiving(self):
+        devices = [base.SmartTV('test', *self.address) for _ in range(5)]
+        for device in devices:
+            self.receiver.add_device(device)
+        self.server.flood(200, coalesce=False)
+        for device in devices:
+            self.receiver.remove_device(device)
+        self.assertEqual(self.receiver.devices, [])
+        device = base.SmartTV('test', *self.address)
+        self.receiver.add_device(device)
+        self.assertTrue(base.is_key_ack(
+            device.send_key('KEY_MUTE', ack=True).result(5)))
+        self.assertTrue(self.receiver.is_alive())
+
+    def test_device_closes_connection(self):
+        device = base.SmartTV('test', *self.address)
+        self.receiver.add_device(device)
+        self.server.stop()
+        self.assertTrue(wait_until(lambda: not self.receiver.devices))
+        self.assertTrue(self.receiver.is_alive())
+
+
+@unittest.skipIf(resource is None, 'resource module not available')
+class HighFileDescriptorTest(FakeDeviceTestCase):
+    """Sockets numbered above FD_SETSIZE (1024) must still work."""
+
+    def setUp(self) -> None:
+        limits = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = 2048
+        if limits[0] < wanted:
+            if limits[1] != resource.RLIM_INFINITY and limits[1] < wanted:
+                self.skipTest('cannot open %d files' % wanted)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, limits[1]))
+            self.addCleanup(resource.setrlimit, resource.RLIMIT_NOFILE,
+                            limits)
+        padding = []
+        while not padding or padding[-1] < 1100:
+            padding.append(os.open(os.devnull, os.O_RDONLY))
+        for fd in padding:
+            self.addCleanup(os.close, fd)
+        super().setUp()
+
+    def test_ack_future(self):
+        device = base.SmartTV('test', *self.address)
+        self.addCleanup(device.disconnect)
+        future = device.send_key('KEY_MUTE', ack=True)
+        self.assertGreater(device._sock.fileno(), 1024)
+        self.assertTrue(base.is_key_ack(future.result(5)))
+
+    def test_thread_receiver(self):
+        received = []
+        receiver = listener.ThreadReceiver('test', *self.address)
+        self.addCleanup(receiver.join, 5)
+        receiver.add_listener(received.append,
+                              payload=ResponsePayload.STATUS_SHOWING_TV)
+        receiver.start()
+        self.assertTrue(wait_until(lambda: self.server.authenticated_clients))
+        self.server.flood(10, payloads=(ResponsePayload.STATUS_SHOWING_TV,))
+        self.assertTrue(wait_until(lambda: len(received) == 10))
+        self.assertTrue(receiver.is_alive())
+
+    def test_iter_receiver(self):
+        with listener.IterReceiver('test', *self.address,
+                                   timeout=5) as receiver:
+            receiver.connect()
+            self.assertGreater(receiver._sock.fileno(), 1024)
+            self.server.flood(1)
+            self.assertIsNotNone(next(receiver))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""Tests for samsung.macro: compiling and running scenes."""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from samsung import base, fake, macro, pool, state
+from samsung.base import ResponsePayload, ResponseType
+
+from tests import FakeDeviceTestCase, received_keys, wait_until
+
+
+def key(name: str) -> bytes:
+    return base.build_key_message('test', name)
+
+
+class CompileTest(unittest.TestCase):
+
+    def test_merge_unpaced_sends(self):
+        scene = macro.compile_scene({'steps': [
+            {'key': 'KEY_1'}, {'key': 'KEY_2'},
+            {'text': 'hi'}, {'sleep': 0.5}, {'key': 'KEY_3'}]}, 'test')
+        self.assertEqual(scene.ops, [
+            ('send', [key('KEY_1') + key('KEY_2') +
+                      base.build_text_message('test', 'hi')], 0.0),
+            ('sleep', 0.5),
+            ('send', [key('KEY_3')], 0.0)])
+
+    def test_paced_keys_not_merged(self):
+        scene = macro.compile_scene({'pacing': 0.2, 'steps': [
+            {'key': 'KEY_1'}, {'keys': ['KEY_2', 'KEY_3']},
+            {'channel': 5, 'pacing': 0}]}, 'test')
+        self.assertEqual(scene.ops, [
+            ('send', [key('KEY_1')], 0.0),
+            ('send', [key('KEY_2'), key('KEY_3')], 0.2),
+            ('send', [key('KEY_0') + key('KEY_0') + key('KEY_0') +
+                      key('KEY_5')], 0.0)])
+
+    def test_merge_helper(self):
+        ops = [('send', [b'a'], 0.0), ('send', [b'b', b'c'], 0.0),
+               ('send', [b'd', b'e'], 0.1), ('send', [b'f'], 0.0)]
+        self.assertEqual(macro._merge(ops), [
+            ('send', [b'abc'], 0.0), ('send', [b'd', b'e'], 0.1),
+            ('send', [b'f'], 0.0)])
+
+    def test_wait_and_delay(self):
+        scene = macro.compile_scene({'steps': [
+            {'key': 'KEY_MENU', 'delay': 1},
+            {'wait_for': 'menu', 'timeout': 2, 'optional': True}]}, 'test')
+        self.assertEqual(scene.ops[1:], [
+            ('sleep', 1.0), ('wait', state.UIMode.MENU, 2.0, True)])
+        self.assertTrue(scene.waits)
+
+    def test_invalid_steps(self):
+        for step in ({'press': 'KEY_1'}, {'wait_for': 'nowhere'},
+                     {'channel': 'one'}, {'sleep': 'long'}):
+            with self.assertRaises(ValueError, msg=repr(step)):
+                macro.compile_scene({'steps': [step]}, 'test')
+
+    def test_load_json(self):
+        definition = {'name': 'mute', 'steps': [{'key': 'KEY_MUTE'}]}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'mute.json')
+            with open(path, 'w') as fp:
+                json.dump(definition, fp)
+            self.assertEqual(macro.load_scene(path), definition)
+
+
+class RunTest(FakeDeviceTestCase):
+
+    def device(self) -> base.SmartTV:
+        device = base.SmartTV('test', *self.address)
+        device.connect()
+        self.addCleanup(device.disconnect)
+        return device
+
+    def test_schedule(self):
+        scene = macro.compile_scene({'pacing': 0.05, 'steps': [
+            {'keys': ['KEY_1', 'KEY_2', 'KEY_3']}, {'sleep': 0.1},
+            {'key': 'KEY_4'}]}, 'test')
+        elapsed = scene.run(self.device())
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertLess(elapsed, 0.5)
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 4))
+        self.assertEqual(received_keys(self.server),
+                         ['KEY_1', 'KEY_2', 'KEY_3', 'KEY_4'])
+
+    def test_wait_for(self):
+        scene = macro.compile_scene({'steps': [
+            {'key': 'KEY_MENU'}, {'wait_for': 'MENU', 'timeout': 5},
+            {'key': 'KEY_ENTER'}]}, 'test')
+        device_state = state.DeviceState()
+        timer = threading.Timer(0.1, self.server.broadcast, (
+            fake.encode_response(ResponseType.STATE_CHANGE,
+                                 ResponsePayload.STATUS_SHOWING_MENU),))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        scene.run(self.device(), device_state)
+        self.assertIs(device_state.mode, state.UIMode.MENU)
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 2))
+
+    def test_wait_for_timeout(self):
+        scene = macro.compile_scene({'steps': [
+            {'wait_for': 'MENU', 'timeout': 0.1}, {'key': 'KEY_ENTER'}]},
+            'test')
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            scene.run(self.device())
+        self.assertLess(time.monotonic() - start, 1.0)
+        optional = macro.compile_scene({'steps': [
+            {'wait_for': 'MENU', 'timeout': 0.1, 'optional': True},
+            {'key': 'KEY_ENTER'}]}, 'test')
+        optional.run(self.device())
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 1))
+
+
+class RunManyTest(FakeDeviceTestCase):
+
+    def test_more_devices_than_pool_workers(self):
+        servers = [self.server] + [self.start_server() for _ in range(5)]
+        scene = macro.compile_scene(
+            {'steps': [{'sleep': 0.3}, {'key': 'KEY_MUTE'}]}, 'test')
+        with pool.SmartTVPool('test', max_workers=2) as devices:
+            result = scene.run_many(devices, [s.address for s in servers])
+        self.assertEqual(len(result.succeeded), 6)
+        # all devices start together instead of 2 at a time
+        self.assertLess(result.elapsed, 0.6)
+        for server in servers:
+            self.assertTrue(wait_until(lambda: server.keys_received == 1))
+            self.assertEqual(received_keys(server), ['KEY_MUTE'])
+
+    def test_unreachable_device_reported(self):
+        other = self.start_server()
+        address = other.address
+        other.stop()
+        scene = macro.compile_scene({'steps': [{'key': 'KEY_MUTE'}]},
+                                    'test')
+        with pool.SmartTVPool('test') as devices:
+            result = scene.run_many(devices, [self.address, address])
+        self.assertEqual(len(result.results), 2)
+        self.assertEqual(list(result.failed), [address + ('test',)])
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
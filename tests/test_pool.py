@@ -0,0 +1,121 @@
+"""Tests for samsung.pool and samsung.fleet against fake devices."""
+
+import socket
+import threading
+import unittest
+
+from samsung import fleet, pool
+
+from tests import FakeDeviceTestCase, received_keys, wait_until
+
+
+class SmartTVPoolTest(FakeDeviceTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.pool = pool.SmartTVPool('test', port=self.address[1])
+        self.addCleanup(self.pool.close)
+        self.host = self.address[0]
+
+    def test_fanout(self):
+        servers = [self.server] + [self.start_server() for _ in range(3)]
+        result = self.pool.send_key([s.address for s in servers], 'KEY_MUTE')
+        self.assertEqual(len(result.succeeded), 4)
+        self.assertEqual(result.failed, {})
+        for server in servers:
+            self.assertTrue(wait_until(
+                lambda server=server: server.keys_received == 1))
+        self.assertEqual([received_keys(s) for s in servers],
+                         [['KEY_MUTE']] * 4)
+
+    def test_connection_reused(self):
+        self.pool.send_key([self.host], 'KEY_1')
+        self.pool.send_key([self.host], 'KEY_2')
+        self.assertEqual(self.server.clients, 1)
+
+    def test_submit_keeps_order(self):
+        keys = ['KEY_%d' % i for i in range(30)]
+        futures = [self.pool.submit(self.host,
+                                    lambda tv, key=key: tv.send_key(key))
+                   for key in keys]
+        for future in futures:
+            self.assertIsNone(future.result(5).error)
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 30))
+        self.assertEqual(received_keys(self.server), keys)
+
+    def test_retry_before_write(self):
+        calls = []
+
+        def action(tv):
+            calls.append(tv._sock)
+            if len(calls) == 1:
+                raise ConnectionResetError('reset before sending')
+            tv.send_key('KEY_MUTE')
+
+        self.pool.call(self.host, action)
+        self.assertEqual(len(calls), 2)
+        self.assertIsNot(calls[0], calls[1])
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 1))
+
+    def test_no_retry_after_write(self):
+        calls = []
+
+        def action(tv):
+            calls.append(tv)
+            tv.send_key('KEY_MUTE')
+            raise socket.timeout('no answer')
+
+        with self.assertRaises(socket.timeout):
+            self.pool.call(self.host, action)
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(self.pool.get(self.host)._sock)
+
+    def test_discard_while_calling(self):
+        errors = []
+
+        def send():
+            for _ in range(50):
+                try:
+                    self.pool.call(self.host, lambda tv: tv.send_key('KEY_1'))
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=send) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for _ in range(50):
+            self.pool.discard(self.host)
+        for thread in threads:
+            thread.join(10)
+        self.assertFalse([e for e in errors if isinstance(e, KeyError)])
+
+
+class FleetTest(FakeDeviceTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.fleet = fleet.Fleet('test', workers=2, port=self.address[1],
+                                 threads=4)
+        self.addCleanup(self.fleet.close)
+
+    def test_commands_keep_order(self):
+        device = self.address
+        self.fleet.add_device(device).result(10)
+        keys = ['KEY_%d' % i for i in range(10)]
+        futures = [self.fleet.send_key(device, key) for key in keys]
+        for future in futures:
+            future.result(10)
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 10))
+        self.assertEqual(received_keys(self.server), keys)
+
+    def test_events(self):
+        received = []
+        self.fleet.add_listener(lambda msg, device: received.append(device))
+        self.fleet.add_device(self.address).result(10)
+        self.assertTrue(wait_until(lambda: self.server.authenticated_clients))
+        self.server.flood(5)
+        self.assertTrue(wait_until(lambda: len(received) >= 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
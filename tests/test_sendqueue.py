@@ -0,0 +1,138 @@
+"""Tests for samsung.sendqueue: rate limiting, coalescing and overflow."""
+
+import queue
+import threading
+import time
+import unittest
+
+from samsung import base, sendqueue
+
+from tests import FakeDeviceTestCase, received_keys, wait_until
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = sendqueue.TokenBucket(10.0, 3)
+        self.assertEqual([bucket.take() for _ in range(3)], [0.0] * 3)
+        self.assertAlmostEqual(bucket.take(), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket.take(), 0.2, delta=0.01)
+
+    def test_refill(self):
+        bucket = sendqueue.TokenBucket(100.0, 1)
+        bucket.take()
+        time.sleep(0.02)
+        self.assertEqual(bucket.take(), 0.0)
+
+    def test_rate_limit_by_model(self):
+        self.assertEqual(sendqueue.rate_limit(), sendqueue.RATE_LIMITS[''])
+        self.assertEqual(sendqueue.rate_limit('UE40D5720'),
+                         sendqueue.RATE_LIMITS[''])
+
+
+class SendQueueTest(FakeDeviceTestCase):
+
+    def queue(self, **options) -> sendqueue.SendQueue:
+        device = base.SmartTV('test', *self.address)
+        result = sendqueue.SendQueue(device, **options)
+        self.addCleanup(lambda: device._sock and device.disconnect())
+        self.addCleanup(result.close, False)
+        return result
+
+    def test_rate_limited(self):
+        tv_queue = self.queue(rate=20.0, burst=2)
+        start = time.monotonic()
+        for i in range(6):
+            tv_queue.put_key('KEY_%d' % i)
+        self.assertTrue(tv_queue.join(5))
+        # 2 keys right away, 4 more at 20 keys per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 6))
+        self.assertEqual(received_keys(self.server),
+                         ['KEY_%d' % i for i in range(6)])
+        self.assertEqual(tv_queue.sent, 6)
+
+    def test_coalesce(self):
+        tv_queue = self.queue(rate=1000.0, burst=1)
+        tv_queue.put_text('hello')
+        for key in ('KEY_VOLUP',) * 5 + ('KEY_MUTE', 'KEY_VOLUP'):
+            self.assertTrue(tv_queue.put_key(key))
+        self.assertLessEqual(len(tv_queue), 4)
+        self.assertTrue(tv_queue.join(5))
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 8))
+        self.assertEqual(received_keys(self.server),
+                         ['KEY_VOLUP'] * 5 + ['KEY_MUTE', 'KEY_VOLUP'])
+
+    def test_max_repeat(self):
+        tv_queue = self.queue(rate=1.0, burst=1, max_repeat=2)
+        tv_queue.put_key('KEY_1')
+        self.assertTrue(wait_until(lambda: tv_queue.sent == 1))
+        results = [tv_queue.put_key('KEY_VOLUP') for _ in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual((tv_queue.coalesced, tv_queue.dropped), (1, 2))
+
+    def test_drop_newest(self):
+        tv_queue = self.queue(rate=1.0, burst=1, maxsize=2,
+                              overflow=sendqueue.SendQueue.DROP_NEWEST)
+        tv_queue.put_key('KEY_0')
+        self.assertTrue(wait_until(lambda: tv_queue.sent == 1))
+        results = [tv_queue.put_key('KEY_%d' % i) for i in range(1, 4)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual([e[0] for e in tv_queue._queue], ['KEY_1', 'KEY_2'])
+        self.assertEqual(tv_queue.dropped, 1)
+
+    def test_drop_oldest(self):
+        tv_queue = self.queue(rate=1.0, burst=1, maxsize=2,
+                              overflow=sendqueue.SendQueue.DROP_OLDEST)
+        tv_queue.put_key('KEY_0')
+        self.assertTrue(wait_until(lambda: tv_queue.sent == 1))
+        results = [tv_queue.put_key('KEY_%d' % i) for i in range(1, 4)]
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual([e[0] for e in tv_queue._queue], ['KEY_2', 'KEY_3'])
+        self.assertEqual(tv_queue.dropped, 1)
+
+    def test_block(self):
+        tv_queue = self.queue(rate=5.0, burst=1, maxsize=1)
+        tv_queue.put_key('KEY_0')
+        tv_queue.put_key('KEY_1')
+        # KEY_1 is taken off the queue and waits for a token
+        self.assertTrue(wait_until(lambda: not len(tv_queue)))
+        tv_queue.put_key('KEY_2')
+        with self.assertRaises(queue.Full):
+            tv_queue.put_key('KEY_3', timeout=0.01)
+        blocked = threading.Thread(target=tv_queue.put_key, args=('KEY_4',))
+        blocked.start()
+        blocked.join(5)
+        self.assertTrue(tv_queue.join(5))
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 4))
+        self.assertEqual(received_keys(self.server),
+                         ['KEY_0', 'KEY_1', 'KEY_2', 'KEY_4'])
+
+    def test_reconnect_after_error(self):
+        tv_queue = self.queue(rate=1000.0, burst=1)
+        tv_queue.put_key('KEY_0')
+        self.assertTrue(tv_queue.join(5))
+        tv_queue.device._sock.close()
+        tv_queue.put_key('KEY_1')
+        self.assertTrue(tv_queue.join(5))
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 2))
+        self.assertEqual(tv_queue.dropped, 0)
+
+    def test_close_discards(self):
+        tv_queue = self.queue(rate=1.0, burst=1)
+        for i in range(5):
+            tv_queue.put_key('KEY_%d' % i)
+        tv_queue.close(flush=False)
+        self.assertEqual(len(tv_queue), 0)
+        with self.assertRaises(RuntimeError):
+            tv_queue.put_key('KEY_5')
+        self.assertLessEqual(self.server.keys_received, 1)
+
+    def test_unknown_overflow(self):
+        device = base.SmartTV('test', *self.address)
+        with self.assertRaises(ValueError):
+            sendqueue.SendQueue(device, overflow='wait')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Tests for samsung.session: reconnects and queued sends."""
+
+import os
+import queue
+import tempfile
+import unittest
+
+from samsung import base, session
+from samsung.base import ResponsePayload
+
+from tests import FakeDeviceTestCase, received_keys, wait_until
+
+
+class ApprovalCacheTest(unittest.TestCase):
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'approvals.json')
+            cache = session.ApprovalCache(path)
+            self.assertEqual(len(cache), 0)
+            cache.add(('10.0.0.5', 'test', '00:11:22:33:44:55'))
+            cache.add(('10.0.0.6', 'test', '00:11:22:33:44:55'))
+            cache.discard(('10.0.0.6', 'test', '00:11:22:33:44:55'))
+            loaded = session.ApprovalCache(path)
+            self.assertEqual(list(loaded),
+                             [('10.0.0.5', 'test', '00:11:22:33:44:55')])
+            self.assertIn(['10.0.0.5', 'test', '00:11:22:33:44:55'], loaded)
+
+
+class SessionTest(FakeDeviceTestCase):
+
+    def session(self, **options) -> session.Session:
+        device = base.SmartTV('test', *self.address)
+        result = session.Session(device, session.ApprovalCache(),
+                                 backoff=(0.01, 0.1), **options)
+        self.addCleanup(result.close)
+        return result
+
+    def test_resend_after_device_closed_connection(self):
+        tv = self.session()
+        tv.connect()
+        self.assertTrue(tv.send_key('KEY_1'))
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 1))
+        self.server.disconnect_clients()
+        self.assertTrue(wait_until(lambda: not self.server.clients))
+        for i in range(2, 6):
+            tv.send_key('KEY_%d' % i)
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 5))
+        self.assertEqual(received_keys(self.server),
+                         ['KEY_%d' % i for i in range(1, 6)])
+        self.assertEqual(tv.reconnects, 1)
+        self.assertTrue(tv.connected)
+
+    def test_unexpected_auth_response_retried(self):
+        tv = self.session()
+        tv.connect()
+        self.server.auth_responses = (ResponsePayload.KEY_OK,)
+        self.server.disconnect_clients()
+        self.assertTrue(wait_until(lambda: not self.server.clients))
+        tv.send_key('KEY_1')
+        tv.send_key('KEY_2')
+        attempts = len(self.server.received)
+        self.assertTrue(wait_until(
+            lambda: len(self.server.received) >= attempts + 2))
+        self.server.auth_responses = (ResponsePayload.AUTH_OK,)
+        self.assertTrue(wait_until(lambda: tv.connected))
+        self.assertTrue(wait_until(lambda: self.server.keys_received == 2))
+
+    def test_close_stops_reconnecting(self):
+        tv = self.session()
+        tv.connect()
+        self.server.auth_responses = (ResponsePayload.KEY_OK,)
+        self.server.disconnect_clients()
+        self.assertTrue(wait_until(lambda: not self.server.clients))
+        tv.send_key('KEY_1')
+        tv.send_key('KEY_2')
+        self.server.auth_responses = (ResponsePayload.AUTH_OK,)
+        tv.close()
+        self.assertEqual(tv.queued, 0)
+        self.assertFalse(tv.connected)
+        self.assertIsNone(tv.device._sock)
+        self.assertEqual(self.server.keys_received, 0)
+
+    def test_approval_remembered(self):
+        tv = self.session()
+        tv.connect()
+        self.assertIn(tv.key, tv.approvals)
+        tv.close()
+        self.server.auth_responses = (ResponsePayload.AUTH_ACCESS_DENIED,)
+        with self.assertRaises(base.AuthenticationError):
+            tv.connect()
+        self.assertNotIn(tv.key, tv.approvals)
+        self.assertFalse(tv.connected)
+
+    def test_queue_limit(self):
+        tv = self.session(max_queue=3)
+        tv.connect()
+        self.server.stop()
+        sent = [tv.send_key('KEY_%d' % i) for i in range(3)]
+        self.assertEqual(sent, [False] * 3)
+        self.assertEqual(tv.queued, 3)
+        with self.assertRaises(queue.Full):
+            tv.send_key('KEY_3')
+        self.assertFalse(tv.connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
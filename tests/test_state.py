@@ -0,0 +1,119 @@
+"""Tests for samsung.state: UI modes reported by the device."""
+
+import threading
+import unittest
+
+from samsung import base, fake, listener
+from samsung.base import ResponsePayload, ResponseType
+from samsung.state import DeviceState, DeviceStates, UIMode, ui_mode
+
+from tests import FakeDeviceTestCase, wait_until
+
+
+def status(payload) -> base.Message:
+    if isinstance(payload, ResponsePayload):
+        payload = payload.value
+    return base.Message(ResponseType.STATE_CHANGE.value, payload)
+
+
+class UIModeTest(unittest.TestCase):
+
+    def test_known_payloads(self):
+        self.assertEqual(
+            [ui_mode(status(p)) for p in (
+                ResponsePayload.STATUS_SHOWING_TV,
+                ResponsePayload.STATUS_SHOWING_MENU,
+                ResponsePayload.STATUS_SHOWING_TTX,
+                ResponsePayload.STATUS_SHOWING_OVERLAY)],
+            [UIMode.TV, UIMode.MENU, UIMode.TTX, UIMode.OVERLAY])
+
+    def test_mode_byte(self):
+        self.assertIs(ui_mode(status('\x10\x00\x02\x01\x00\x00')),
+                      UIMode.MENU)
+        self.assertIs(ui_mode(status('\x10\x00\x7f\x00\x00\x00')),
+                      UIMode.UNKNOWN)
+        self.assertIs(ui_mode(status('\x10')), UIMode.UNKNOWN)
+
+    def test_timeshift(self):
+        self.assertIs(ui_mode(base.Message(ResponseType.TIMESHIFT.value,
+                                           '\x00')), UIMode.TIMESHIFT)
+
+    def test_other_messages(self):
+        self.assertIsNone(ui_mode(base.Message(
+            ResponseType.KEY_CONFIRM.value, ResponsePayload.KEY_OK.value)))
+
+
+class DeviceStateTest(unittest.TestCase):
+
+    def test_feed(self):
+        state = DeviceState()
+        self.assertIs(state.mode, UIMode.UNKNOWN)
+        self.assertIsNone(state.age)
+        self.assertTrue(state.feed(status(ResponsePayload.STATUS_SHOWING_TV)))
+        self.assertFalse(state.feed(
+            status(ResponsePayload.STATUS_SHOWING_TV)))
+        self.assertFalse(state.feed(base.Message(
+            ResponseType.KEY_CONFIRM.value, ResponsePayload.KEY_OK.value)))
+        self.assertIs(state.mode, UIMode.TV)
+        self.assertGreaterEqual(state.age, 0.0)
+
+    def test_wait_for(self):
+        state = DeviceState()
+        self.assertFalse(state.wait_for(UIMode.MENU, timeout=0.01))
+        timer = threading.Timer(0.05, state, (
+            status(ResponsePayload.STATUS_SHOWING_MENU),))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertTrue(state.wait_for(UIMode.MENU, timeout=5))
+        self.assertTrue(state.wait_for(UIMode.MENU, timeout=0))
+
+    def test_wait_change(self):
+        state = DeviceState()
+        self.assertIsNone(state.wait_change(timeout=0.01))
+        timer = threading.Timer(0.05, state, (
+            status(ResponsePayload.STATUS_SHOWING_TTX),))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertIs(state.wait_change(timeout=5), UIMode.TTX)
+
+
+class ReceiverStateTest(FakeDeviceTestCase):
+
+    def test_module_example(self):
+        state = DeviceState()
+        receiver = listener.ThreadReceiver('test', *self.address)
+        self.addCleanup(receiver.join, 5)
+        receiver.add_listener(state, type_=ResponseType.STATE_CHANGE)
+        receiver.add_listener(state, type_=ResponseType.TIMESHIFT)
+        receiver.start()
+        self.assertTrue(wait_until(lambda: self.server.authenticated_clients))
+        self.server.broadcast(fake.encode_response(
+            ResponseType.STATE_CHANGE, ResponsePayload.STATUS_SHOWING_MENU))
+        self.assertTrue(state.wait_for(UIMode.MENU, timeout=5))
+        self.server.broadcast(fake.encode_response(
+            ResponseType.TIMESHIFT, ResponsePayload.STATUS_SHOWING_TV))
+        self.assertTrue(state.wait_for(UIMode.TIMESHIFT, timeout=5))
+
+    def test_device_states(self):
+        other = self.start_server()
+        states = DeviceStates()
+        receiver = listener.MultiReceiver()
+        self.addCleanup(receiver.join, 5)
+        receiver.add_listener(states)
+        receiver.start()
+        devices = [base.SmartTV('test', *server.address)
+                   for server in (self.server, other)]
+        for device in devices:
+            receiver.add_device(device)
+        self.server.broadcast(fake.encode_response(
+            ResponseType.STATE_CHANGE, ResponsePayload.STATUS_SHOWING_MENU))
+        other.broadcast(fake.encode_response(
+            ResponseType.STATE_CHANGE, ResponsePayload.STATUS_SHOWING_TV))
+        self.assertTrue(states[devices[0]].wait_for(UIMode.MENU, 5))
+        self.assertTrue(states[devices[1]].wait_for(UIMode.TV, 5))
+        self.assertEqual(states.modes(), {devices[0]: UIMode.MENU,
+                                          devices[1]: UIMode.TV})
+
+
+if __name__ == '__main__':
+    unittest.main()
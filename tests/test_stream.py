@@ -0,0 +1,119 @@
+"""Tests for samsung.stream: deduplicating and debouncing messages."""
+
+import time
+import unittest
+
+from samsung import base, fake, listener, stream
+from samsung.base import ResponsePayload, ResponseType
+
+from tests import FakeDeviceTestCase, wait_until
+
+
+def status(payload: ResponsePayload) -> base.Message:
+    return base.Message(ResponseType.STATE_CHANGE.value, payload.value)
+
+
+TV = status(ResponsePayload.STATUS_SHOWING_TV)
+MENU = status(ResponsePayload.STATUS_SHOWING_MENU)
+OVERLAY = status(ResponsePayload.STATUS_SHOWING_OVERLAY)
+ACK = base.Message(ResponseType.KEY_CONFIRM.value,
+                   ResponsePayload.KEY_OK.value)
+
+
+class EventStreamTest(unittest.TestCase):
+
+    def stream(self, **options) -> tuple:
+        events = stream.EventStream(**options)
+        self.addCleanup(events.close)
+        delivered = []
+        events.add_listener(lambda msg, *args: delivered.append((msg, args)))
+        return (events, delivered)
+
+    def test_dedup(self):
+        (events, delivered) = self.stream()
+        for msg in (TV, TV, MENU, MENU, TV):
+            events(msg)
+        self.assertEqual([m for (m, _) in delivered], [TV, MENU, TV])
+        self.assertEqual((events.received, events.delivered), (5, 3))
+
+    def test_no_dedup(self):
+        (events, delivered) = self.stream(dedup=False)
+        for msg in (TV, TV):
+            events(msg)
+        self.assertEqual(len(delivered), 2)
+
+    def test_other_types_pass_through(self):
+        (events, delivered) = self.stream()
+        for msg in (ACK, ACK):
+            events(msg)
+        self.assertEqual([m for (m, _) in delivered], [ACK, ACK])
+
+    def test_per_device(self):
+        (events, delivered) = self.stream()
+        events(TV, 'a')
+        events(TV, 'b')
+        events(TV, 'a')
+        self.assertEqual([args for (_, args) in delivered], [('a',), ('b',)])
+
+    def test_debounce(self):
+        (events, delivered) = self.stream(debounce=0.1)
+        for msg in (OVERLAY, TV, OVERLAY, MENU):
+            events(msg)
+        self.assertEqual(delivered, [])
+        self.assertTrue(wait_until(lambda: delivered))
+        time.sleep(0.15)
+        self.assertEqual([m for (m, _) in delivered], [MENU])
+
+    def test_debounce_drops_repeat_of_delivered(self):
+        (events, delivered) = self.stream(debounce=0.05)
+        events(MENU)
+        self.assertTrue(wait_until(lambda: delivered))
+        events(TV)
+        events(MENU)
+        time.sleep(0.15)
+        self.assertEqual([m for (m, _) in delivered], [MENU])
+
+    def test_close_delivers_pending(self):
+        (events, delivered) = self.stream(debounce=10)
+        events(MENU)
+        events.close()
+        self.assertEqual([m for (m, _) in delivered], [MENU])
+
+    def test_snapshot(self):
+        (events, delivered) = self.stream(snapshot_interval=0.05)
+        snapshots = []
+        events.add_snapshot_listener(snapshots.append)
+        events(TV, 'a')
+        events(MENU, 'b')
+        self.assertTrue(wait_until(lambda: snapshots))
+        self.assertEqual(snapshots[0], {
+            (ResponseType.STATE_CHANGE.value, 'a'): TV,
+            (ResponseType.STATE_CHANGE.value, 'b'): MENU})
+        time.sleep(0.15)
+        # nothing changed since
+        self.assertEqual(len(snapshots), 1)
+
+
+class ReceiverStreamTest(FakeDeviceTestCase):
+
+    def test_flood(self):
+        events = stream.EventStream()
+        self.addCleanup(events.close)
+        delivered = []
+        events.add_listener(delivered.append)
+        receiver = listener.ThreadReceiver('test', *self.address)
+        self.addCleanup(receiver.join, 5)
+        receiver.add_listener(events)
+        receiver.start()
+        self.assertTrue(wait_until(lambda: self.server.authenticated_clients))
+        self.server.flood(100, payloads=(ResponsePayload.STATUS_SHOWING_TV,))
+        self.server.broadcast(fake.encode_response(
+            ResponseType.STATE_CHANGE, ResponsePayload.STATUS_SHOWING_MENU))
+        self.assertTrue(wait_until(lambda: events.received == 101))
+        self.assertEqual([m.response_payload for m in delivered],
+                         [ResponsePayload.STATUS_SHOWING_TV,
+                          ResponsePayload.STATUS_SHOWING_MENU])
+
+
+if __name__ == '__main__':
+    unittest.main()